@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werewolf.checkpoints import ShardCheckpoint
+from werewolf.results import ResultWriter
+from werewolf.simulation import simulate
+from werewolf.werewolf import WerewolfGame
+
+PLAYERS = ["alice", "bob", "carol", "dave", "erin"]
+ROLES = [WerewolfGame.CARD_SEER, WerewolfGame.CARD_ROBBER, WerewolfGame.CARD_TROUBLEMAKER]
+
+def run(directory, games, seed, interval=None, stop_after=None):
+    """
+    Returns (winners, seconds) for `games` games, checkpointing every
+    `interval` seconds if given.  With `stop_after`, a first run is
+    interrupted after that many games and then resumed.
+    """
+    checkpoint = None
+    if interval is not None:
+        checkpoint = ShardCheckpoint(os.path.join(directory, "shard.ckpt"), interval)
+    sink = ResultWriter(directory, shard="bench", rows=0)
+    start = time.time()
+    if stop_after is not None:
+        simulate(stop_after, PLAYERS, 2, ROLES, seed=seed, sink=sink, checkpoint=checkpoint)
+        sink.close()
+        # Pretend the first run wrote games after its last checkpoint.
+        sink = ResultWriter(directory, shard="bench")
+        simulate(10, PLAYERS, 2, ROLES, seed=seed + 1, sink=sink)
+        sink.close()
+        state = checkpoint.load()
+        sink = ResultWriter(directory, shard="bench", rows=state.result_rows)
+    winners = simulate(games, PLAYERS, 2, ROLES, seed=seed, sink=sink, checkpoint=checkpoint)
+    sink.close()
+    elapsed = time.time() - start
+    assert sink.rows == games
+    return winners, elapsed
+
+def main(args):
+    directory = tempfile.mkdtemp()
+    try:
+        def fresh():
+            shutil.rmtree(directory)
+            os.mkdir(directory)
+            return directory
+
+        def best(interval=None):
+            # The fastest of several runs, to see past timing noise.
+            results = [run(fresh(), args.games, args.seed, interval)
+                       for n in range(args.repeat)]
+            return results[0][0], min(elapsed for winners, elapsed in results)
+
+        # Warm up before timing the baseline.
+        run(fresh(), args.games // 10, args.seed)
+        baseline, base_time = best()
+        print("{}{:>14}{:>12}".format("Checkpoint every".ljust(20), "games/second", "overhead"))
+        print("{}{:>14.0f}{:>12}".format("never".ljust(20), args.games / base_time, "-"))
+        for interval in args.intervals:
+            winners, elapsed = best(interval)
+            assert winners == baseline
+            print("{}{:>14.0f}{:>11.1f}%".format(
+                "{}s".format(interval).ljust(20),
+                args.games / elapsed,
+                100.0 * (elapsed - base_time) / base_time))
+        winners, elapsed = run(
+            fresh(), args.games, args.seed, 0.0, stop_after=args.games // 2)
+        print("Resumed run matches an uninterrupted one: {}".format(winners == baseline))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure the cost of checkpointing simulations, and check '
+                    'that a resumed simulation matches an uninterrupted one.')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        default=20000,
+        help='The number of games to simulate (default 20000).')
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        default=1,
+        help='Seed for the random number generator (default 1).')
+    parser.add_argument(
+        '-i',
+        '--intervals',
+        action="store",
+        type=float,
+        nargs='+',
+        default=[60.0, 1.0, 0.1],
+        help='Checkpoint intervals in seconds to try (default 60 1 0.1).')
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        action="store",
+        type=int,
+        default=3,
+        help='Runs of each configuration; the fastest is reported '
+             '(default 3).')
+    args = parser.parse_args()
+    main(args)
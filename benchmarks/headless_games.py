@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import game
+from werewolf.frontends import HeadlessFrontend
+
+PLAYERS = ["alice", "bob", "carol", "dave", "erin"]
+
+def make_chooser(rng):
+    """
+    Returns a chooser that presses a random key the prompt accepts.
+    """
+
+    def chooser(screen, keys):
+        if keys is None:
+            return ord(" ")
+        return rng.choice(sorted(keys))
+
+    return chooser
+
+def main(args):
+    rng = random.Random(args.seed)
+    argv = ["-M", "-I", "-H", "-T"] + PLAYERS
+    game_args = game.make_parser().parse_args(argv)
+    prompts = 0
+    start = time.time()
+    for n in range(args.games):
+        ui = HeadlessFrontend(chooser=make_chooser(rng), capture=args.capture)
+        game.main(ui, game_args)
+        prompts += len(ui.screens)
+    elapsed = time.time() - start
+    print("{} games in {:.2f}s: {:.0f} games/minute".format(
+        args.games, elapsed, 60 * args.games / max(elapsed, 1e-9)))
+    if args.capture:
+        print("{:.1f} screens per game".format(prompts / float(args.games)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Play games through the UI code with a headless frontend.')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        default=1000,
+        help='The number of games to play (default 1000).')
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        help='Seed for the key presses.')
+    parser.add_argument(
+        '--no-capture',
+        action="store_false",
+        dest="capture",
+        help="Don't keep the rendered screens.")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Budgets in milliseconds for the time spent in the package's own modules.
+# The cumulative time, dominated by attrs and automat, is only reported: it
+# varies too much from run to run to check against a budget.
+BUDGETS = [
+    ("werewolf.werewolf", 20),
+    ("werewolf.simulation", 25),
+    ("werewolf.tables", 25),
+]
+
+# Modules that should only be imported when the feature using them is.
+DEFERRED = {
+    "werewolf.werewolf": ["curses", "pickle", "numpy"],
+    "werewolf.simulation": ["numpy", "http.server", "BaseHTTPServer"],
+    "werewolf.tables": ["numpy", "http.server", "BaseHTTPServer"],
+}
+
+def import_time(module):
+    """
+    Returns (cumulative microseconds, microseconds spent in the `werewolf`
+    package's own modules, set of modules imported) for importing `module`
+    in a fresh interpreter, as reported by `-X importtime`.
+    """
+    output = subprocess.check_output(
+        [sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+        cwd=ROOT,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True)
+    total = None
+    own = 0
+    imported = set()
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        imported.add(name)
+        if name == "werewolf" or name.startswith("werewolf."):
+            own += int(fields[0])
+        if name == module:
+            total = int(fields[1])
+    return total, own, imported
+
+def main(args):
+    failed = False
+    print("{}{:>13}{:>13}{:>13}".format("Module".ljust(24), "total", "own", "budget"))
+    for module, budget in BUDGETS:
+        # Take the best of several runs to allow for a noisy machine.
+        best_total = best_own = None
+        for n in range(args.runs):
+            total, own, imported = import_time(module)
+            if best_total is None or total < best_total:
+                best_total = total
+            if best_own is None or own < best_own:
+                best_own = own
+        ms = best_own / 1000.0
+        status = "ok"
+        if ms > budget * args.scale:
+            status = "OVER BUDGET"
+            failed = True
+        print("{}{:>10.1f} ms{:>10.1f} ms{:>10} ms  {}".format(
+            module.ljust(24), best_total / 1000.0, ms, budget * args.scale, status))
+        for name in DEFERRED.get(module, []):
+            if name in imported:
+                print("    {} imports {}".format(module, name))
+                failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    if sys.version_info < (3, 7):
+        sys.exit("-X importtime requires Python 3.7 or later.")
+    parser = argparse.ArgumentParser(
+        description='Check module import times against their budgets.')
+    parser.add_argument(
+        '-r',
+        '--runs',
+        action="store",
+        type=int,
+        default=5,
+        help='Take the best of RUNS imports of each module (default 5).')
+    parser.add_argument(
+        '--scale',
+        action="store",
+        type=float,
+        default=1.0,
+        help='Multiply every budget by SCALE, for slow machines.')
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werewolf.scenarios import distinct_deals
+from werewolf.search import MODE_BEST, MODE_RANDOM, POLICIES, NightSearch
+
+def measure(players, capacity, deals, policy, mode):
+    """
+    Returns (deals searched, positions searched, transposition table hit
+    rate, seconds) for searching the first `deals` deals, or all of them.
+    """
+    search = NightSearch(players, policy=POLICIES[policy], mode=mode, capacity=capacity)
+    count = 0
+    start = time.time()
+    for deal in itertools.islice(distinct_deals(search.deck), deals):
+        search.analyze(deal)
+        count += 1
+    elapsed = time.time() - start
+    table = search.table
+    lookups = table.hits + table.misses
+    return count, search.nodes, table.hits / max(lookups, 1), elapsed
+
+def main(args):
+    print("{}{:>12}{:>8}{:>12}{:>10}{:>10}".format(
+        "Players".ljust(10), "capacity", "deals", "positions", "hit rate", "seconds"))
+    for players in args.players:
+        for capacity in args.capacities:
+            deals, nodes, hit_rate, elapsed = measure(
+                players, capacity, args.deals, args.policy, args.mode)
+            print("{}{:>12}{:>8}{:>12}{:>9.1f}%{:>10.2f}".format(
+                str(players).ljust(10), capacity, deals, nodes, 100 * hit_rate, elapsed))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure how the transposition table speeds up searching '
+                    'the night actions of every deal.')
+    parser.add_argument(
+        '-n',
+        '--players',
+        action="store",
+        type=int,
+        nargs='+',
+        default=[5, 10],
+        help='The table sizes to try (default 5 10).')
+    parser.add_argument(
+        '-c',
+        '--capacities',
+        action="store",
+        type=int,
+        nargs='+',
+        default=[0, 10000, 1000000],
+        help='Transposition table capacities to try; 0 disables the table '
+             '(default 0 10000 1000000).')
+    parser.add_argument(
+        '-d',
+        '--deals',
+        action="store",
+        type=int,
+        default=5000,
+        help='The number of deals to search (default 5000).')
+    parser.add_argument(
+        '--policy',
+        action="store",
+        choices=sorted(POLICIES),
+        default="informed",
+        help='The voting policy (default informed).')
+    parser.add_argument(
+        '--mode',
+        action="store",
+        choices=[MODE_RANDOM, MODE_BEST],
+        default=MODE_RANDOM,
+        help='How the night roles choose (default random).')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,221 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werewolf.server import NEW_GAME_INPUTS, Router
+from werewolf.tables import Overloaded
+
+SEATS = list(range(5))
+
+class Load(object):
+    """
+    What the games saw: the latency of every input, split into the inputs
+    starting games and the inputs to games under way.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        self.turned_away = 0
+        self.start_latencies = []
+        self.game_latencies = []
+
+async def play_game(router, load, rng, think):
+    """
+    Play a game, waiting a random time with mean `think` seconds before
+    each night phase and the vote, as players would.
+    """
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    try:
+        table_id = await router.create_table()
+    except Overloaded:
+        load.turned_away += 1
+        return
+    load.start_latencies.append(loop.time() - start)
+    load.started += 1
+
+    async def send(input_name, *args):
+        start = loop.time()
+        result = await router.send(table_id, input_name, *args)
+        latencies = load.start_latencies if input_name in NEW_GAME_INPUTS else load.game_latencies
+        latencies.append(loop.time() - start)
+        return result
+
+    try:
+        await send("add_players", SEATS)
+        await send("deal_cards")
+        while True:
+            await send("advance_phase")
+            if await send("query_active_role") is None:
+                break
+            await asyncio.sleep(rng.expovariate(1.0 / think))
+        await asyncio.sleep(rng.expovariate(1.0 / think))
+        await send("eliminate_players", SEATS[:1])
+        await send("query_post_game_results")
+        load.completed += 1
+    except Overloaded:
+        load.turned_away += 1
+    finally:
+        await router.remove_table(table_id)
+
+async def measure_capacity(workers, tables, duration):
+    """
+    Returns the games per second `tables` tables playing one game after
+    another, without pausing, complete.
+    """
+    router = await Router(workers, admission_latency=None, queue_limit=None).start()
+    load = Load()
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + duration
+
+    async def player():
+        while loop.time() < deadline:
+            await play_game(router, load, random.Random(), 1e-6)
+
+    try:
+        start = loop.time()
+        await asyncio.gather(*[player() for n in range(tables)])
+        elapsed = loop.time() - start
+    finally:
+        await router.stop()
+    return load.completed / elapsed
+
+async def offer_load(workers, rate, duration, think, admission, seed):
+    """
+    Start games at random at `rate` games per second for `duration`
+    seconds and let them finish.  Returns (`Load`, seconds).
+    """
+    if admission is None:
+        router = Router(workers, admission_latency=None, queue_limit=None)
+    else:
+        router = Router(workers, admission_latency=admission)
+    await router.start()
+    load = Load()
+    rng = random.Random(seed)
+    loop = asyncio.get_event_loop()
+    games = []
+    try:
+        start = loop.time()
+        deadline = start + duration
+        next_game = start
+        while True:
+            next_game += rng.expovariate(rate)
+            if next_game >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_game - loop.time()))
+            games.append(asyncio.ensure_future(
+                play_game(router, load, random.Random(rng.random()), think)))
+        await asyncio.gather(*games)
+        elapsed = loop.time() - start
+    finally:
+        await router.stop()
+    return load, elapsed
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100.0))]
+
+def main(args):
+    capacity = args.capacity
+    if capacity is None:
+        capacity = asyncio.run(measure_capacity(args.workers, args.tables, args.duration))
+        print("Capacity: {:.0f} games/second".format(capacity))
+    print("{}{:>11}{:>10}{:>10}{:>10}{:>12}{:>12}{:>12}".format(
+        "Load".ljust(6), "admission", "started", "away", "games/s",
+        "start p99", "game p50", "game p99"))
+    runs = [(1.0, None)]
+    for load in args.loads:
+        runs.append((load, None))
+        runs.append((load, args.admission_latency))
+    for multiple, admission in runs:
+        load, elapsed = asyncio.run(offer_load(
+            args.workers, capacity * multiple, args.duration, args.think,
+            admission, args.seed))
+        print("{}{:>11}{:>10}{:>10}{:>10.0f}{:>10.1f}ms{:>10.1f}ms{:>10.1f}ms".format(
+            "{:g}x".format(multiple).ljust(6),
+            "off" if admission is None else "{:g}s".format(admission),
+            load.started, load.turned_away, load.completed / elapsed,
+            percentile(load.start_latencies, 99) * 1000,
+            percentile(load.game_latencies, 50) * 1000,
+            percentile(load.game_latencies, 99) * 1000))
+    print("Latencies are from sending an input to the router to its answer; "
+          "\"start\" inputs create and deal games, \"game\" inputs play them.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Start games faster than the server can play them, with "
+                    "and without admission control, and compare the latency "
+                    "of the inputs to games under way.")
+    parser.add_argument(
+        '-w',
+        '--workers',
+        action="store",
+        type=int,
+        default=1,
+        help='The number of worker processes (default 1).')
+    parser.add_argument(
+        '-c',
+        '--capacity',
+        action="store",
+        type=float,
+        metavar="GAMES",
+        help='The games per second that saturate the server.  Measured '
+             'first if not given.')
+    parser.add_argument(
+        '-t',
+        '--tables',
+        action="store",
+        type=int,
+        default=64,
+        help='Tables playing at once while measuring the capacity '
+             '(default 64).')
+    parser.add_argument(
+        '-l',
+        '--loads',
+        action="store",
+        type=float,
+        nargs='+',
+        default=[2.0],
+        help='Offered loads to try, as multiples of the capacity (default 2).')
+    parser.add_argument(
+        '-a',
+        '--admission-latency',
+        action="store",
+        type=float,
+        default=0.02,
+        metavar="SECONDS",
+        help="The router's admission latency (default 0.02).")
+    parser.add_argument(
+        '--think',
+        action="store",
+        type=float,
+        default=0.5,
+        metavar="SECONDS",
+        help='Mean think time before each night phase and the vote '
+             '(default 0.5).')
+    parser.add_argument(
+        '-d',
+        '--duration',
+        action="store",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help='How long to start games for (default 10).')
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        help='Seed for the arrivals and think times.')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werewolf import protocol
+
+NAMES = ["alice", "bob", "carol", "dave", "erin"]
+
+# The messages one player sees and sends in a typical five player game.
+GAME_MESSAGES = [
+    protocol.Join(5, "alice"),
+    protocol.Seated(b"\x00" * 16, 0, NAMES),
+    protocol.Dealt(1),
+    protocol.Phase(0, False),
+    protocol.Phase(1, True),
+    protocol.NightAction(protocol.ACTION_VIEW_TABLE, 0, 2),
+    protocol.Reveal(protocol.REVEAL_TABLE, 0, 4, 2, 0),
+    protocol.Phase(2, False),
+    protocol.Phase(3, False),
+    protocol.Phase(protocol.PHASE_DAYBREAK),
+    protocol.VotePrompt(300),
+    protocol.Vote(3),
+    protocol.Results(1, 0b1000, [1, 0, 2, 0, 3, 4, 4, 4], [1, 0, 3, 0, 2, 4, 4, 4]),
+]
+
+def measure(codec, repeat):
+    """
+    Returns (bytes per game, encode usec per game, decode usec per game).
+    """
+    encoded = [codec.encode(m) for m in GAME_MESSAGES]
+    if isinstance(codec, protocol.BinaryCodec):
+        # The stream reader strips the length prefix before decoding.
+        payloads = [e[2:] for e in encoded]
+    else:
+        payloads = encoded
+    for message, payload in zip(GAME_MESSAGES, payloads):
+        assert codec.decode(payload) == message
+    encode = codec.encode
+    decode = codec.decode
+
+    def encode_game():
+        for message in GAME_MESSAGES:
+            encode(message)
+
+    def decode_game():
+        for payload in payloads:
+            decode(payload)
+
+    encode_time = min(timeit.repeat(encode_game, number=repeat, repeat=3)) / repeat
+    decode_time = min(timeit.repeat(decode_game, number=repeat, repeat=3)) / repeat
+    return sum(len(e) for e in encoded), encode_time * 1e6, decode_time * 1e6
+
+def main(args):
+    print("{}{:>14}{:>14}{:>14}".format(
+        "Codec".ljust(10), "bytes/game", "encode usec", "decode usec"))
+    for codec in (protocol.BinaryCodec(), protocol.JsonCodec()):
+        size, encode_time, decode_time = measure(codec, args.repeat)
+        print("{}{:>14}{:>14.1f}{:>14.1f}".format(
+            codec.name.ljust(10), size, encode_time, decode_time))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compare the binary and JSON protocol encodings.')
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        action="store",
+        type=int,
+        default=2000,
+        help='Games to encode per measurement (default 2000).')
+    args = parser.parse_args()
+    main(args)
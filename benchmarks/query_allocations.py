@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werewolf.werewolf import WerewolfGame
+
+PLAYERS = ["alice", "bob", "carol", "dave", "erin", "frank", "grace"]
+
+def play_game(read_only_views, queries, results):
+    """
+    Play a game, querying the cards and the results `queries` times each as
+    a spectator would.  Every query result is kept in `results`.
+    """
+    game = WerewolfGame(read_only_views=read_only_views)
+    game.add_players(PLAYERS)
+    game.deal_cards()
+    for n in range(queries):
+        results.append(game.query_player_cards())
+        results.append(game.query_table_cards())
+    while True:
+        game.advance_phase()
+        if game.query_active_role() is None:
+            break
+    game.eliminate_players(PLAYERS[:1])
+    for n in range(queries):
+        results.append(game.query_post_game_results())
+
+def measure(read_only_views, games, queries):
+    """
+    Returns (bytes retained per game, microseconds per game).
+    """
+    results = []
+    tracemalloc.start()
+    start_size, _ = tracemalloc.get_traced_memory()
+    for n in range(games):
+        play_game(read_only_views, queries, results)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results[:]
+    start = time.time()
+    for n in range(games):
+        play_game(read_only_views, queries, results)
+        del results[:]
+    elapsed = time.time() - start
+    return ((size - start_size) / float(games), elapsed * 1e6 / games)
+
+def main(args):
+    print("{} games, {} spectator queries of each kind per game".format(
+        args.games, args.queries))
+    for label, read_only_views in (("copies", False), ("read-only views", True)):
+        retained, usec = measure(read_only_views, args.games, args.queries)
+        print("{}: {:.0f} bytes retained per game, {:.1f} usec per game".format(
+            label.rjust(16), retained, usec))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure the memory used by game query results.')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        default=1000,
+        help='The number of games to play (default 1000).')
+    parser.add_argument(
+        '-q',
+        '--queries',
+        action="store",
+        type=int,
+        default=20,
+        help='The number of queries of each kind per game (default 20).')
+    args = parser.parse_args()
+    main(args)
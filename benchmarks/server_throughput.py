@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werewolf.server import Router
+
+PLAYERS = ["alice", "bob", "carol", "dave", "erin"]
+
+async def play_games(router, games):
+    """
+    Play `games` games one after another at a new table.  Returns the
+    number of inputs sent.
+    """
+    inputs = 0
+    table_id = await router.create_table()
+    for n in range(games):
+        await router.send(table_id, "add_players", PLAYERS)
+        await router.send(table_id, "deal_cards")
+        inputs += 2
+        while True:
+            await router.send(table_id, "advance_phase")
+            role = await router.send(table_id, "query_active_role")
+            inputs += 2
+            if role is None:
+                break
+        await router.send(table_id, "eliminate_players", PLAYERS[:1])
+        await router.send(table_id, "query_post_game_results")
+        inputs += 2
+        await router.remove_table(table_id)
+        table_id = await router.create_table()
+    await router.remove_table(table_id)
+    return inputs
+
+async def measure(workers, tables, games, threads=0):
+    """
+    Returns inputs per second with `tables` tables playing at once.
+    """
+    router = await Router(workers, threads=threads).start()
+    try:
+        start = time.time()
+        inputs = await asyncio.gather(
+            *[play_games(router, games) for n in range(tables)])
+        elapsed = time.time() - start
+    finally:
+        await router.stop()
+    return sum(inputs) / elapsed
+
+def main(args):
+    print("{} cores".format(os.cpu_count()))
+    for workers in args.workers:
+        rate = asyncio.run(measure(workers, args.tables, args.games, args.threads))
+        print("{:>3} workers: {:8.0f} inputs/second".format(workers, rate))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure server throughput for different numbers of '
+                    'worker processes.')
+    parser.add_argument(
+        '-w',
+        '--workers',
+        action="store",
+        type=int,
+        nargs='+',
+        default=[1, 2, 4],
+        help='The numbers of workers to try (default 1 2 4).')
+    parser.add_argument(
+        '-t',
+        '--tables',
+        action="store",
+        type=int,
+        default=200,
+        help='The number of tables playing at once (default 200).')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        default=10,
+        help='The number of games played at each table (default 10).')
+    parser.add_argument(
+        '--threads',
+        action="store",
+        type=int,
+        default=0,
+        help='Threads running inputs in each worker (default 0, none).')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,147 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werewolf import protocol
+from werewolf.instrumentation import clock
+from werewolf.spectators import KEY_PHASE, KEY_RESULTS, KEY_TABLE, SpectatorHub
+
+NAMES = ["alice", "bob", "carol", "dave", "erin"]
+
+# The public events of a typical five player game.
+GAME_EVENTS = [
+    (KEY_TABLE, protocol.Seated(b"\x00" * 16, protocol.NO_SEAT, NAMES)),
+    (KEY_PHASE, protocol.Phase(0)),
+    (KEY_PHASE, protocol.Phase(1)),
+    (KEY_PHASE, protocol.Phase(2)),
+    (KEY_PHASE, protocol.Phase(3)),
+    (KEY_PHASE, protocol.Phase(protocol.PHASE_DAYBREAK)),
+    (KEY_RESULTS, protocol.Results(
+        1, 0b1000, [1, 0, 2, 0, 3, 4, 4, 4], [1, 0, 3, 0, 2, 4, 4, 4])),
+]
+
+async def consume(subscription, codec, delay, counts):
+    while True:
+        event = await subscription.get()
+        if event is None:
+            return
+        event.encode(codec)
+        counts[0] += 1
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def measure(spectators, games, batch, slow, delay):
+    """
+    Returns (events delivered, events dropped, usec per publish, longest
+    event loop stall in msec) for `games` games watched by `spectators`
+    spectators, `slow` of whom take `delay` seconds to read each event.
+    """
+    hub = SpectatorHub(maxsize=4, batch=batch)
+    codec = protocol.BinaryCodec()
+    counts = [0]
+    stall = [0.0]
+    measuring = []
+    done = []
+    subscriptions = []
+    consumers = []
+
+    async def player():
+        # Stands in for a player's input: it should get a turn promptly no
+        # matter how many spectators are watching.
+        while not done:
+            start = clock()
+            await asyncio.sleep(0)
+            if measuring:
+                stall[0] = max(stall[0], clock() - start)
+
+    ticker = asyncio.ensure_future(player())
+    publish_time = 0.0
+    published = 0
+    for game in range(games):
+        for n in range(spectators):
+            subscription = hub.subscribe()
+            subscriptions.append(subscription)
+            consumers.append(asyncio.ensure_future(
+                consume(subscription, codec, delay if n < slow else 0.0, counts)))
+        # Let the new consumers start before measuring.
+        await asyncio.sleep(0.01)
+        measuring.append(True)
+        channel = hub.open(game)
+        for key, message in GAME_EVENTS:
+            start = clock()
+            channel.publish(key, message)
+            publish_time += clock() - start
+            published += 1
+            await asyncio.sleep(0.001)
+        hub.close(game)
+        await asyncio.gather(*consumers)
+        del measuring[:]
+        del consumers[:]
+    done.append(True)
+    await ticker
+    dropped = sum(s.dropped for s in subscriptions)
+    return counts[0], dropped, publish_time / published * 1e6, stall[0] * 1000
+
+def main(args):
+    print("{}{:>8}{:>12}{:>10}{:>14}{:>12}".format(
+        "Spectators".ljust(12), "batch", "delivered", "dropped",
+        "publish usec", "stall msec"))
+    for spectators in args.spectators:
+        for batch in (args.batch, spectators):
+            delivered, dropped, publish, stall = asyncio.run(measure(
+                spectators, args.games, batch, spectators * args.slow // 100,
+                args.delay))
+            print("{}{:>8}{:>12}{:>10}{:>14.1f}{:>12.2f}".format(
+                str(spectators).ljust(12), batch, delivered, dropped,
+                publish, stall))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure how fanning out table events to spectators '
+                    'holds up the event loop.')
+    parser.add_argument(
+        '-s',
+        '--spectators',
+        action="store",
+        type=int,
+        nargs='+',
+        default=[100, 1000, 10000],
+        help='The numbers of spectators to try (default 100 1000 10000).')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        default=3,
+        help='The number of games watched (default 3).')
+    parser.add_argument(
+        '-b',
+        '--batch',
+        action="store",
+        type=int,
+        default=256,
+        help='Spectators served between yields to the event loop, compared '
+             'with serving them all at once (default 256).')
+    parser.add_argument(
+        '--slow',
+        action="store",
+        type=int,
+        default=10,
+        metavar="PERCENT",
+        help='The percentage of slow spectators (default 10).')
+    parser.add_argument(
+        '--delay',
+        action="store",
+        type=float,
+        default=0.01,
+        metavar="SECONDS",
+        help='How long a slow spectator takes to read an event '
+             '(default 0.01).')
+    args = parser.parse_args()
+    main(args)
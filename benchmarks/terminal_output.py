@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import errno
+import os
+import pty
+import select
+import struct
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PLAYERS = ["alice", "bob", "carol", "dave", "erin"]
+
+# Run a game script with the random number generator seeded so every run
+# deals the same cards.
+RUNNER = """\
+import os, random, runpy, sys
+random.seed(int(sys.argv[1]))
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(sys.argv[0]))
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+# Keys are cycled through, one per prompt.  Prompts ignore keys they don't
+# accept, so every prompt is eventually answered.
+KEYS = b"1\n2\n"
+
+def set_window_size(fd, rows, cols):
+    import fcntl
+    import termios
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+def play_game(script, seed, rows, cols, quiet):
+    """
+    Play a game in a pseudo-terminal, pressing a key whenever the screen has
+    been quiet for `quiet` seconds.  Returns (bytes written to the terminal,
+    keys pressed).
+    """
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.environ["TERM"] = "xterm"
+        os.execv(sys.executable, [
+            sys.executable, "-c", RUNNER, str(seed), script] + PLAYERS)
+    set_window_size(fd, rows, cols)
+    written = 0
+    presses = 0
+    while True:
+        ready, _, _ = select.select([fd], [], [], quiet)
+        if not ready:
+            os.write(fd, KEYS[presses % len(KEYS):][:1])
+            presses += 1
+            continue
+        try:
+            data = os.read(fd, 65536)
+        except OSError as ex:
+            if ex.errno != errno.EIO:
+                raise
+            break
+        if not data:
+            break
+        written += len(data)
+    os.close(fd)
+    pid, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise Exception("The game exited with status {}.".format(status))
+    return written, presses
+
+def main(args):
+    script = os.path.abspath(args.game or os.path.join(ROOT, "game.py"))
+    total_written = 0
+    total_presses = 0
+    start = time.time()
+    for n in range(args.games):
+        written, presses = play_game(
+            script, args.seed + n, args.rows, args.cols, args.quiet)
+        total_written += written
+        total_presses += presses
+    elapsed = time.time() - start
+    print("{} games ({:.1f}s): {:.0f} bytes per game, {:.0f} bytes per key press".format(
+        args.games,
+        elapsed,
+        total_written / float(args.games),
+        total_written / float(max(total_presses, 1))))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure the bytes a game writes to the terminal.')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        default=5,
+        help='The number of games to play (default 5).')
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        default=0,
+        help='Seed for the first game (default 0).')
+    parser.add_argument(
+        '--game',
+        action="store",
+        metavar="SCRIPT",
+        help='The game script to measure (default game.py), e.g. an older '
+             'revision to compare against.')
+    parser.add_argument(
+        '--rows',
+        action="store",
+        type=int,
+        default=40,
+        help='Terminal height (default 40).')
+    parser.add_argument(
+        '--cols',
+        action="store",
+        type=int,
+        default=120,
+        help='Terminal width (default 120).')
+    parser.add_argument(
+        '--quiet',
+        action="store",
+        type=float,
+        default=0.02,
+        help='Seconds the screen must be quiet before a key is pressed '
+             '(default 0.02).')
+    args = parser.parse_args()
+    main(args)
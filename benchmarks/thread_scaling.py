@@ -0,0 +1,203 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import os
+import platform
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from werewolf.executors import TableExecutor
+from werewolf.tables import TableManager
+from werewolf.werewolf import WerewolfGame
+
+PLAYERS = ["alice", "bob", "carol", "dave", "erin"]
+
+def gil_enabled():
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+def make_manager(tables):
+    manager = TableManager()
+    table_ids = [
+        manager.create_table("table-{}".format(n), WerewolfGame(read_only_views=True))
+        for n in range(tables)]
+    return manager, table_ids
+
+def play_game(send):
+    """
+    Play one game by calling `send(input_name, *args)`.  Returns the number
+    of inputs sent.
+    """
+    send("add_players", PLAYERS)
+    send("deal_cards")
+    inputs = 2
+    while True:
+        send("advance_phase")
+        role = send("query_active_role")
+        inputs += 2
+        if role is None:
+            break
+    send("eliminate_players", PLAYERS[:1])
+    send("query_post_game_results")
+    return inputs + 2
+
+def reset(manager, table_id):
+    manager.remove_table(table_id)
+    manager.create_table(table_id, WerewolfGame(read_only_views=True))
+
+def measure_locks(threads, tables, games):
+    """
+    Returns inputs per second with `threads` threads each playing `games`
+    games, sharing `tables` tables.  A thread holds a table's lock for a
+    whole game, so threads wait for each other when there are fewer tables
+    than threads.
+    """
+    manager, table_ids = make_manager(tables)
+    counts = [0] * threads
+
+    def run(index):
+        inputs = 0
+        for n in range(games):
+            table_id = table_ids[(index + n) % tables]
+            with manager.table_lock(table_id):
+                inputs += play_game(
+                    lambda input_name, *args: manager.send(table_id, input_name, *args))
+                reset(manager, table_id)
+        counts[index] = inputs
+
+    workers = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / (time.time() - start)
+
+def measure_executor(threads, tables, games):
+    """
+    Returns inputs per second for `tables` tables each playing `games`
+    games, with every input run by a `TableExecutor` with `threads`
+    threads.  Each table's next input is sent as soon as the last one
+    returns, from the thread that ran it.
+    """
+    manager, table_ids = make_manager(tables)
+    executor = TableExecutor(manager, threads)
+    done = threading.Event()
+    lock = threading.Lock()
+    totals = {"inputs": 0, "tables": tables}
+
+    def send(table_id, input_name, args):
+        if input_name == "reset":
+            return reset(manager, table_id)
+        return manager.send(table_id, input_name, *args)
+
+    def script():
+        for n in range(games):
+            yield "add_players", (PLAYERS,)
+            yield "deal_cards", ()
+            while True:
+                yield "advance_phase", ()
+                role = yield "query_active_role", ()
+                if role is None:
+                    break
+            yield "eliminate_players", (PLAYERS[:1],)
+            yield "query_post_game_results", ()
+            yield "reset", ()
+
+    def drive(table_id):
+        # The script's next input is sent from the callback of the last
+        # one, on the thread that ran it.
+        steps = script()
+        inputs = [0]
+
+        def step(value):
+            try:
+                input_name, args = steps.send(value)
+            except StopIteration:
+                with lock:
+                    totals["inputs"] += inputs[0]
+                    totals["tables"] -= 1
+                    if totals["tables"] == 0:
+                        done.set()
+                return
+            if input_name != "reset":
+                inputs[0] += 1
+            future = executor.call(table_id, send, table_id, input_name, args)
+            future.add_done_callback(lambda f: step(f.result()))
+
+        step(None)
+
+    start = time.time()
+    for table_id in table_ids:
+        drive(table_id)
+    done.wait()
+    elapsed = time.time() - start
+    executor.shutdown()
+    return totals["inputs"] / elapsed
+
+MODES = {
+    "locks": measure_locks,
+    "executor": measure_executor,
+}
+
+def main(args):
+    print("Python {} ({}), {} cores, GIL {}".format(
+        platform.python_version(), platform.python_implementation(), os.cpu_count(),
+        "enabled" if gil_enabled() else "disabled"))
+    print("{}{:>8}{:>8}{:>16}{:>10}".format(
+        "Mode".ljust(10), "threads", "tables", "inputs/second", "speedup"))
+    for mode in args.modes:
+        for tables in args.tables:
+            base = None
+            for threads in args.threads:
+                rate = MODES[mode](threads, tables, args.games)
+                if base is None:
+                    base = rate
+                print("{}{:>8}{:>8}{:>16.0f}{:>9.2f}x".format(
+                    mode.ljust(10), threads, tables, rate, rate / base))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure how game throughput scales with threads, with '
+                    'tables locked per game or inputs run by a table '
+                    'executor.  Run it on a free-threaded build of Python to '
+                    'see the threads run in parallel.')
+    parser.add_argument(
+        '-t',
+        '--threads',
+        action="store",
+        type=int,
+        nargs='+',
+        default=[1, 2, 4, 8],
+        help='The numbers of threads to try (default 1 2 4 8).')
+    parser.add_argument(
+        '-T',
+        '--tables',
+        action="store",
+        type=int,
+        nargs='+',
+        default=[4, 256],
+        help='The numbers of tables to try; fewer tables than threads makes '
+             'the threads contend for them (default 4 256).')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        default=50,
+        help='Games per thread with locks, or per table with the executor '
+             '(default 50).')
+    parser.add_argument(
+        '-m',
+        '--modes',
+        action="store",
+        nargs='+',
+        choices=sorted(MODES),
+        default=["locks", "executor"],
+        help='How tables are shared between threads (default locks executor).')
+    args = parser.parse_args()
+    main(args)
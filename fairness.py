@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import sys
+from werewolf import roles
+from werewolf.fairness import BACKENDS, count_deals, test_fairness
+from werewolf.werewolf import WerewolfGame
+
+def main(args):
+    """
+    Deal games and test that every position is equally likely to get each
+    card.  Returns 1 if a family of tests fails.
+    """
+    deck_roles = frozenset(roles.registry.get_role_by_tag(tag).card for tag in args.role)
+    try:
+        counts, elapsed = count_deals(
+            args.deals, args.players, args.werewolves, deck_roles,
+            backend=args.rng,
+            seed=args.seed,
+            workers=args.workers,
+            engine=args.engine,
+            batch=args.batch)
+    except (ImportError, AttributeError, ValueError) as ex:
+        print(ex, file=sys.stderr)
+        return 2
+    print("{} deals in {:.2f}s: {:.0f} deals/second".format(
+        counts.deals, elapsed, counts.deals / max(elapsed, 1e-9)))
+    deck = WerewolfGame.build_deck(args.players, args.werewolves, deck_roles)
+    print("{}{:>7}{:>22}{:>12}{:>6}{:>12}  {}".format(
+        "Test".ljust(20), "tests", "worst", "chi-square", "df", "p-value", "result"))
+    failed = False
+    for family in test_fairness(counts, deck, args.players):
+        name, statistic, df, p = family.worst
+        passed = family.p_value >= args.alpha
+        failed = failed or not passed
+        print("{}{:>7}{:>22}{:>12.1f}{:>6}{:>12.3g}  {}".format(
+            family.name.ljust(20), family.tests, name, statistic, df, family.p_value,
+            "ok" if passed else "FAILED"))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Check that Werewolves! deals are fair with chi-square '
+                    'tests of which cards each seat and table position gets, '
+                    'alone and in pairs.')
+    parser.add_argument(
+        '-g',
+        '--deals',
+        action="store",
+        type=int,
+        default=10000000,
+        help='The number of deals (default 10000000).')
+    parser.add_argument(
+        '-n',
+        '--players',
+        action="store",
+        type=int,
+        choices=range(3, 11),
+        default=5,
+        help='The number of players (default 5).')
+    parser.add_argument(
+        '-W',
+        '--werewolves',
+        action="store",
+        default=2,
+        type=int,
+        help='The number of werewolves to include (default 2).')
+    parser.add_argument(
+        '-r',
+        '--role',
+        action="append",
+        choices=[r.tag for r in roles.registry.roles()
+                 if r.card not in (WerewolfGame.CARD_WEREWOLF, WerewolfGame.CARD_VILLAGER)],
+        help='Include a role.  May be given more than once '
+             '(default seer, robber and troublemaker).')
+    parser.add_argument(
+        '--rng',
+        action="store",
+        default="random",
+        metavar="BACKEND",
+        help='The random number generator to shuffle with: one of {}, or '
+             '"module:factory" for a factory taking a seed '
+             '(default random).'.format(", ".join(sorted(BACKENDS))))
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        help='Seed for the random number generator.')
+    parser.add_argument(
+        '-w',
+        '--workers',
+        action="store",
+        type=int,
+        default=1,
+        help='The number of worker processes (default 1).')
+    parser.add_argument(
+        '--engine',
+        action="store_true",
+        help='Deal every game with the game engine rather than shuffling '
+             'decks in batches.  Much slower.')
+    parser.add_argument(
+        '--batch',
+        action="store",
+        type=int,
+        default=100000,
+        help='Deals counted at a time (default 100000).')
+    parser.add_argument(
+        '--alpha',
+        action="store",
+        type=float,
+        default=0.001,
+        help='The significance level, after correcting for the number of '
+             'tests in each family (default 0.001).')
+    args = parser.parse_args()
+    if args.role is None:
+        args.role = ["seer", "robber", "troublemaker"]
+    sys.exit(main(args))
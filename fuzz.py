@@ -0,0 +1,60 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import sys
+from werewolf.fuzz import fuzz
+
+def main(args):
+    """
+    Fire random inputs at the game engine and check its invariants.
+    """
+    report = fuzz(
+        seed=args.seed,
+        games=args.games,
+        duration=args.duration,
+        max_steps=args.max_steps)
+    print("{} games, {} inputs ({} rejected) in {:.2f}s: {:.0f} inputs/second".format(
+        report.games,
+        report.inputs,
+        report.rejected,
+        report.elapsed,
+        report.inputs_per_second))
+    if report.failure is None:
+        return 0
+    print("Invariant '{}' failed: {}".format(
+        report.failure.kind, report.failure.message))
+    print("Minimal failing sequence (deal seed {}):".format(report.seed))
+    for step in report.steps:
+        print("* {}{!r}".format(step.input, step.args))
+    return 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Werewolves! engine fuzzer')
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        help='Seed for the random number generator.')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        help='Stop after this many games.')
+    parser.add_argument(
+        '-t',
+        '--duration',
+        action="store",
+        type=float,
+        default=10.0,
+        help='Stop after this many seconds (default 10).')
+    parser.add_argument(
+        '--max-steps',
+        action="store",
+        type=int,
+        default=200,
+        help='The maximum number of inputs fired at each game (default 200).')
+    args = parser.parse_args()
+    sys.exit(main(args))
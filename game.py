@@ -3,59 +3,74 @@
 from __future__ import print_function
 import argparse
 import collections
-import curses
 import itertools
 import sys
 import textwrap
 import six
-from werewolf.werewolf import WerewolfGame
+from werewolf.frontends import (
+    CursesFrontend, DEFAULT_KEY_MESSAGE, ENTER_KEYS, HeadlessFrontend)
+from werewolf.werewolf import WerewolfGame, tally_votes
 
-def main(stdscr, args):
+def main(ui, args, ratings=None):
     """
-    Configure and run the werewolf game.
+    Configure and run the werewolf game.  If `ratings` is a
+    `werewolf.ratings.RatingService`, the results are recorded in it.
     """
     players = args.player
     werewolf_count, other_roles = parse_roles(args)
     game = WerewolfGame()
     game.add_players(players)
     game.deal_cards(werewolf_count, other_roles)
-    display_title(stdscr)
+    display_title(ui)
     msg = """The village has been invaded by ghastly werewolves!  These bloodthirsty shape changers want to take over the village.  But the villagers know they are weakest at daybreak, and that is when they will strike at their enemy.  In this game, you will take on the role of a villager or a werewolf.  At daybreak, the entire village votes on who lives and who dies.  If a werewolf is slain, the villagers win.  If no werewolves are slain, the werewolf team wins.  If no players are werewolves, the villagers only win if no one dies."""
-    display_text(stdscr, msg, title="Instructions for Play")
+    display_text(ui, msg, title="Instructions for Play")
     if args.debug:
-        debug(game, stdscr)
-    show_cards_in_game(stdscr, game)
-    show_roles_to_players(game, players, stdscr)
-    phase = None
+        debug(game, ui)
+    show_cards_in_game(ui, game)
+    show_roles_to_players(game, players, ui)
     while True:
         game.advance_phase()
-        phase = game.query_phase()
+        role = game.query_active_role()
         clear_screen()
-        if phase == "Daybreak":
+        if role is None:
             break
-        if not game.is_role_active():
-            continue
+        phase = role.phase_name
+        night_action = NIGHT_ACTIONS[role.tag]
         for player in players:
-            start_player_turn(stdscr, player, phase)
+            start_player_turn(ui, player, phase)
             if not game.is_player_active(player):
-                show_player_asleep(stdscr, player, phase)
-            elif phase == "Werewolf Phase":
-                show_werewolves_to_player(stdscr, game, player, phase)
-            elif phase == "Minion Phase":
-                show_werewolves_to_player(stdscr, game, player, phase)
-            elif phase == "Seer Phase":
-                choose_seer_power(stdscr, game, players, player) 
-            elif phase == "Robber Phase":
-                use_robber_power(stdscr, game, players, player)
-            elif phase == "Troublemaker Phase":
-                use_troublemaker_power(stdscr, game, players, player)
-            elif phase == "Insomniac Phase":
-                wake_up_insomniac(stdscr, game, player)
+                show_player_asleep(ui, player, phase)
             else:
-                raise Exception("Unknown phase, {}".format(phase))
-    show_daybreak_message(stdscr)
-    vote_to_eliminate(stdscr, game, players)
-    display_post_game_results(stdscr, game, players)
+                night_action(ui, game, players, player, phase)
+    show_daybreak_message(ui, args.discussion)
+    vote_to_eliminate(ui, game, players)
+    display_post_game_results(ui, game, players)
+    record_results(game, args, ratings)
+
+def record_results(game, args, ratings=None):
+    """
+    Append the results to the game journal and record them in `ratings`.
+    """
+    if args.journal is None and ratings is None:
+        return
+    results = game.query_post_game_results()
+    if args.journal is not None:
+        from werewolf.ratings import write_journal_entry
+        with open(args.journal, "a") as f:
+            write_journal_entry(f, results)
+    if ratings is not None:
+        ratings.record_results(results)
+
+def load_ratings(args):
+    """
+    Returns a `RatingService` with the ratings in the `--ratings` file, or
+    None if there is no ratings file.  The ratings are kept in memory and
+    saved once, when the program exits.
+    """
+    if args.ratings is None:
+        return None
+    from werewolf.ratings import RatingService
+    return RatingService.load(args.ratings)
 
 def parse_roles(args):
     """
@@ -86,7 +101,7 @@ def parse_roles(args):
         deck.add(wg.CARD_TANNER)
     return (args.werewolves, deck)
 
-def show_cards_in_game(stdscr, game):
+def show_cards_in_game(ui, game):
     """
     Show what cards will be used in the game.
     """
@@ -95,8 +110,7 @@ def show_cards_in_game(stdscr, game):
     for card in cards:
         card_name = WerewolfGame.get_card_name(card)
         card_counts[card_name] += 1
-    card_counts = card_counts.items()
-    card_counts.sort()
+    card_counts = sorted(card_counts.items())
     col_width = max(len(n) for n, c in card_counts) + 3 
     count_width = 3
     lines = []
@@ -108,35 +122,35 @@ def show_cards_in_game(stdscr, game):
         lines.append("* {} x{}".format(card_name.rjust(col_width), str(count).rjust(3)))
     msg = '\n'.join(lines)
     display_text(
-        stdscr, 
+        ui, 
         msg,
         title="= Setup =", 
-        keys=[curses.KEY_ENTER, 10, 13],
+        keys=ENTER_KEYS,
         key_message="= Press ENTER =")
 
-def start_player_turn(stdscr, player, phase):
+def start_player_turn(ui, player, phase):
     """
     Start a player's turn.
     """
     display_text(
-        stdscr, 
+        ui, 
         "Press ENTER to start {}'s turn.".format(player), 
         title=phase, 
-        keys=[curses.KEY_ENTER, 10, 13],
+        keys=ENTER_KEYS,
         key_message="= Press ENTER =")
 
-def show_player_asleep(stdscr, player, phase):
+def show_player_asleep(ui, player, phase):
     """
     Notify the player that (s)he is asleep.
     """
     display_text(
-        stdscr, 
+        ui, 
         "Zzzzzzzzzz ... {}, you are asleep.".format(player), 
         title=phase, 
-        keys=[curses.KEY_ENTER, 10, 13],
+        keys=ENTER_KEYS,
         key_message="= Press ENTER =")
 
-def show_werewolves_to_player(stdscr, game, player, phase):
+def show_werewolves_to_player(ui, game, players, player, phase):
     """
     Notify a werewolf player who else is looking around.
     """
@@ -150,16 +164,30 @@ def show_werewolves_to_player(stdscr, game, player, phase):
         lines.append("* {}".format(ww))
     msg = '\n'.join(lines)
     display_text(
-        stdscr, 
+        ui, 
         msg, 
         title=phase, 
-        keys=[curses.KEY_ENTER, 10, 13],
+        keys=ENTER_KEYS,
         key_message="= Press ENTER =")
 
-def show_daybreak_message(stdscr):
+def show_daybreak_message(ui, seconds):
     """
-    Show the daybreak phases.
+    Show the daybreak phases.  Discussion ends after `seconds` seconds, or
+    when a key is pressed.
     """
+    if seconds > 0:
+        msg = textwrap.dedent("""\
+        You've made it to daybreak!  It's time to discuss what happened during the
+        night and vote for which player should be eliminated.  Voting will start
+        when the time runs out.  If all players are finished talking before
+        then, press any key to start voting.
+        """)
+        ui.countdown(
+            msg,
+            seconds,
+            title="Daybreak",
+            key_message="= {} left, PRESS A KEY to vote =")
+        return
     msg = textwrap.dedent("""\
     You've made it to daybreak!  It's time to discuss what happened during the
     night and vote for which player should be eliminated.  It is recommended
@@ -167,17 +195,16 @@ def show_daybreak_message(stdscr):
     talking, press any key to start voting.
     """)
     display_text(
-        stdscr,
+        ui,
         msg,
         title="Daybreak")
 
-def vote_to_eliminate(stdscr, game, players):
+def vote_to_eliminate(ui, game, players):
     """
     Vote to eliminate a player.
     """
-    votes = collections.Counter()
+    votes = {}
     hunter = game.query_hunter()
-    hunter_victim = None
     for player in players:
         lines = []
         player_map = {}
@@ -193,30 +220,14 @@ def vote_to_eliminate(stdscr, game, players):
             keys.append(ord(str(n)))
             n += 1
         rval = display_text(
-            stdscr,
+            ui,
             '\n'.join(lines),
             title="Daybreak",
             keys=keys,
             key_message="= Choose a player =")
         choice = int(chr(rval))
-        oplayer = player_map[choice]
-        if player == hunter:
-            hunter_victim = oplayer
-        votes[oplayer] += 1
-    rank = votes.most_common()
-    most_votes = []
-    top_score = 0
-    for player, count in rank:
-        if count == 1:
-            break
-        if count < top_score:
-            break
-        top_score = count
-        most_votes.append(player)
-    if hunter in most_votes:
-        most_votes.append(hunter_victim)
-        most_votes = list(set(most_votes))
-        most_votes.sort()
+        votes[player] = player_map[choice]
+    most_votes = tally_votes(players, votes, hunter)
     game.eliminate_players(most_votes)
     if len(most_votes) == 0:
         msg = "No one was eliminated!"
@@ -227,12 +238,12 @@ def vote_to_eliminate(stdscr, game, players):
     else:
         msg = "{} and {} have been eliminated!".format(', '.join(most_votes[:-1]), most_votes[-1])
     display_text(
-        stdscr,
+        ui,
         msg,
         title="Daybreak"
     )
 
-def display_post_game_results(stdscr, game, players):
+def display_post_game_results(ui, game, players):
     """
     Display post-game results.
     """
@@ -297,11 +308,11 @@ def display_post_game_results(stdscr, game, players):
             dealt.ljust(col_width),
             final.ljust(col_width)))
     display_text(
-        stdscr,
+        ui,
         '\n'.join(lines),
         title=title)
 
-def choose_seer_power(stdscr, game, players, player):
+def choose_seer_power(ui, game, players, player, phase):
     msg = textwrap.dedent("""\
     {}, choose:
 
@@ -309,7 +320,7 @@ def choose_seer_power(stdscr, game, players, player):
     2) Look at 2 table cards.
     """).format(player)
     rval = display_text(
-        stdscr,
+        ui,
         msg,
         title="Seer Phase",
         keys=[ord("1"), ord("2")],
@@ -330,7 +341,7 @@ def choose_seer_power(stdscr, game, players, player):
             oplayer_map[key_code] = oplayer
             n += 1
         rval = display_text(
-            stdscr,
+            ui,
             '\n'.join(lines),
             title="Seer Phase",
             keys=keys,
@@ -339,7 +350,7 @@ def choose_seer_power(stdscr, game, players, player):
         card_code = game.seer_view_player_card(oplayer)
         card_name = WerewolfGame.get_card_name(card_code)
         display_text(
-            stdscr,
+            ui,
             "{}'s card is {}.".format(oplayer, card_name),
             title="Seer Phase")
     elif rval == ord("2"):
@@ -353,7 +364,7 @@ def choose_seer_power(stdscr, game, players, player):
             keys = [k for k in all_choices if k not in chosen]
             key_message = "= Choose {} =".format(', '.join(chr(k) for k in keys))
             rval = display_text(
-                stdscr,
+                ui,
                 msg,
                 title="Seer Phase",
                 keys=keys,
@@ -369,11 +380,11 @@ def choose_seer_power(stdscr, game, players, player):
         * Card {} is {}.
         """).format(choices[0]+1, card_names[0], choices[1]+1, card_names[1])
         display_text(
-            stdscr,
+            ui,
             msg,
             title="Seer Phase")
 
-def use_robber_power(stdscr, game, players, player):
+def use_robber_power(ui, game, players, player, phase):
     """
     Use the Robber's power to steal a card.
     """
@@ -393,7 +404,7 @@ def use_robber_power(stdscr, game, players, player):
     player_map[1] = player
     keys = [ord("{}".format(n)) for n in player_map.keys()]
     rval = display_text(
-        stdscr,
+        ui,
         msg,
         title="Robber Phase", 
         keys=keys,
@@ -404,13 +415,13 @@ def use_robber_power(stdscr, game, players, player):
     stolen_card = game.robber_steal_card(oplayer)
     card_name = WerewolfGame.get_card_name(stolen_card)
     display_text(
-        stdscr,
+        ui,
         "{}, you stole the {} card from {}!".format(player, card_name, oplayer),
         title="Robber Phase", 
-        keys=[curses.KEY_ENTER, 10, 13],
+        keys=ENTER_KEYS,
         key_message="= Press ENTER =")
 
-def use_troublemaker_power(stdscr, game, players, player):
+def use_troublemaker_power(ui, game, players, player, phase):
     """
     Use the Troublemaker's power to switch 2 player's cards.
     """
@@ -430,7 +441,7 @@ def use_troublemaker_power(stdscr, game, players, player):
     player_map[1] = player
     keys = [ord("{}".format(n)) for n in player_map.keys()]
     rval = display_text(
-        stdscr,
+        ui,
         msg,
         title="Troublemaker Phase", 
         keys=keys,
@@ -453,7 +464,7 @@ def use_troublemaker_power(stdscr, game, players, player):
         n += 1
     msg = '\n'.join(lines)
     rval = display_text(
-        stdscr,
+        ui,
         msg,
         title="Troublemaker Phase", 
         keys=[ord("{}".format(n)) for n in player_map.keys()],
@@ -462,11 +473,11 @@ def use_troublemaker_power(stdscr, game, players, player):
     oplayer_b = player_map[choice]
     game.troublemaker_switch_cards(oplayer_a, oplayer_b)
     display_text(
-        stdscr,
+        ui,
         "{}, you switched cards for {} and {}.".format(player, oplayer_a, oplayer_b),
         title="Troublemaker Phase")
 
-def wake_up_insomniac(stdscr, game, player):
+def wake_up_insomniac(ui, game, players, player, phase):
     """
     Notify insomniac what her current card is.
     """
@@ -476,72 +487,23 @@ def wake_up_insomniac(stdscr, game, player):
     {}, your card is {}.
     """).format(player, card_name)
     display_text(
-        stdscr, 
+        ui, 
         msg, 
         title="Insomniac Phase", 
-        keys=[curses.KEY_ENTER, 10, 13],
+        keys=ENTER_KEYS,
         key_message="= Press ENTER =")
 
-def display_title(stdscr):
+def display_title(ui):
     """
     Display the title.
     """
-    h, w = stdscr.getmaxyx()
-    stdscr.border()
-    title = "Werewolves!"
-    x = int(((w-2) - len(title)) / 2)
-    stdscr.addstr(1, x, "Werewolves!", curses.A_REVERSE)
-    stdscr.refresh()
+    ui.show_title("Werewolves!")
 
-def display_text(stdscr, msg, title=None, keys=None, key_message="= PRESS A KEY ="):
+def display_text(ui, msg, title=None, keys=None, key_message=DEFAULT_KEY_MESSAGE):
     """
     Display a message in the message area and wait for a keypress.
     """
-    h, w = stdscr.getmaxyx()
-    dialog_w = int(w * 0.67)
-    lines = []
-    paras = msg.split('\n')
-    for para in paras:
-        lines.extend(textwrap.wrap(para, dialog_w - 4, drop_whitespace=False))
-    line_count = len(lines)
-    max_width = max(len(l) for l in lines)
-    if key_message is not None:
-        max_width = max(max_width, len(key_message))
-    dialog_w = min(max_width + 4, dialog_w)
-    dialog_h = line_count + 3
-    if key_message is not None:
-        dialog_h += 2
-    dialog_size = (line_count + 5, dialog_w)
-    dialog_h, dialog_w = dialog_size
-    dialog_h = min(h, dialog_h)
-    dialog_w = min(w, dialog_w)
-    x = int((w - dialog_w) / 2)
-    y = int((h - dialog_h) / 2)
-    win = curses.newwin(dialog_h, dialog_w, y, x)
-    win.border()
-    for n, line in enumerate(lines):
-        win.addstr((n + 2), 2, line)
-    if key_message is not None: 
-        press = key_message
-        press_size = len(press)
-        press_x = int((dialog_w - press_size) / 2)
-        win.addstr(dialog_h-2, press_x, press, curses.A_BOLD)
-    if title is not None:
-        title_size = len(title)
-        title_x = int((dialog_w - title_size) / 2)
-        win.addstr(0, title_x, title, curses.A_STANDOUT)
-    win.refresh()
-    if keys is not None:
-        keys = set(keys)
-    while True:
-        c = stdscr.getch(1, 0)
-        if keys is None:
-            break
-        if c in keys:
-            break
-    win.clear()
-    win.refresh()
-    return c
+    return ui.prompt(msg, title=title, keys=keys, key_message=key_message)
 
 def clear_screen():
     pass
@@ -552,7 +514,7 @@ def show_active_players(game, players):
         if game.is_player_active(player):
             print("* {}".format(player))
 
-def debug(game, stdscr):
+def debug(game, ui):
     """
     Dump state for debugging.
     """
@@ -566,27 +528,37 @@ def debug(game, stdscr):
     for n, card in enumerate(table_cards):
         lines.append("Table {} -> {}".format(n+1, WerewolfGame.get_card_name(card)))
     text = '\n'.join(lines)
-    display_text(stdscr, text, title="DEBUG Info") 
+    display_text(ui, text, title="DEBUG Info") 
 
-def show_roles_to_players(game, players, stdscr):
+def show_roles_to_players(game, players, ui):
     """
     Show each player the role he or she was dealt.
     """
     player_cards = game.query_player_cards()
     for player in players:
         display_text(
-            stdscr, 
+            ui, 
             "{}'s turn.".format(player), 
             title="The Deal", 
-            keys=[curses.KEY_ENTER, 10, 13], 
+            keys=ENTER_KEYS, 
             key_message="= Press ENTER =") 
         display_text(
-            stdscr, 
+            ui, 
             "{} was dealt {}".format(player, WerewolfGame.get_card_name(player_cards[player])), 
             title="The Deal", 
-            keys=[curses.KEY_ENTER, 10, 13], 
+            keys=ENTER_KEYS, 
             key_message="= Press ENTER =") 
 
+# Night action for each night role, keyed by role tag.
+NIGHT_ACTIONS = {
+    "werewolf": show_werewolves_to_player,
+    "minion": show_werewolves_to_player,
+    "seer": choose_seer_power,
+    "robber": use_robber_power,
+    "troublemaker": use_troublemaker_power,
+    "insomniac": wake_up_insomniac,
+}
+
 def required_length(nmin, nmax):
 
 
@@ -604,7 +576,10 @@ def required_length(nmin, nmax):
 
     return RequiredLength
 
-if __name__ == "__main__":
+def make_parser():
+    """
+    Returns the command line parser.
+    """
     parser = argparse.ArgumentParser(description='Werewolves! game')
     parser.add_argument(
         'player', 
@@ -656,9 +631,63 @@ if __name__ == "__main__":
         '--tanner',
         action="store_true",
         help='Include the tanner role.')
+    parser.add_argument(
+        '--discussion',
+        action="store",
+        type=int,
+        default=300,
+        metavar="SECONDS",
+        help='Time limit for the discussion at daybreak (default 300).  Use 0 '
+             'to wait for a key press instead.')
+    parser.add_argument(
+        '--journal',
+        action="store",
+        metavar="FILE",
+        help='Append the game results to a journal file.')
+    parser.add_argument(
+        '--ratings',
+        action="store",
+        metavar="FILE",
+        help='Update the player ratings stored in FILE.')
+    parser.add_argument(
+        '--script',
+        action="store",
+        metavar="FILE",
+        help="Play without a terminal, reading key presses from FILE ('-' "
+             "for stdin) and printing every screen.")
+    return parser
+
+def curses_main(stdscr, args, ratings=None):
+    main(CursesFrontend(stdscr), args, ratings)
+
+def script_main(args, ratings=None):
+    """
+    Play the game headless with the key presses in the script file.
+    """
+    if args.script == '-':
+        script = sys.stdin.read()
+    else:
+        with open(args.script) as f:
+            script = f.read()
+    ui = HeadlessFrontend(script)
+    try:
+        main(ui, args, ratings)
+    finally:
+        print('\n\n'.join(ui.screens))
+
+if __name__ == "__main__":
+    parser = make_parser()
     try:
         args = parser.parse_args()
     except argparse.ArgumentTypeError as ex:
         parser.error(str(ex))
-    curses.wrapper(main, args)
-
+    ratings = load_ratings(args)
+    try:
+        if args.script is not None:
+            script_main(args, ratings)
+        else:
+            import curses
+            curses.wrapper(curses_main, args, ratings)
+    finally:
+        if ratings is not None:
+            ratings.save(args.ratings)
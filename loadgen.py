@@ -0,0 +1,273 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from werewolf import protocol
+from werewolf.loadgen import POLICIES, Think, run_load
+
+LATENCY_METRIC = "werewolf_request_latency_seconds"
+
+def scrape(host, port):
+    """
+    Returns the server's request latency histograms by phase.
+    """
+    from six.moves.urllib.request import urlopen
+    from werewolf.metrics import parse_histograms
+    url = "http://{}:{}/metrics".format(host, port)
+    text = urlopen(url, timeout=10).read().decode("utf-8")
+    return parse_histograms(text, LATENCY_METRIC, "phase")
+
+def subtract(after, before):
+    """
+    Remove the observations in `before` from the histograms in `after`.
+    """
+    for phase, histogram in after.items():
+        earlier = before.get(phase)
+        if earlier is None:
+            continue
+        for n, count in enumerate(earlier.counts):
+            histogram.counts[n] -= count
+        histogram.count -= earlier.count
+        histogram.sum -= earlier.sum
+    return after
+
+def wait_for_port(host, port, timeout):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            asyncio.run(_try_connect(host, port))
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+async def _try_connect(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.close()
+
+def spawn_server(args):
+    """
+    Start a local server to test.
+    """
+    command = [
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+        "--host", args.host,
+        "--port", str(args.port),
+        "--metrics-port", str(args.metrics_port),
+    ]
+    if args.workers is not None:
+        command.extend(["--workers", str(args.workers)])
+    process = subprocess.Popen(command)
+    try:
+        wait_for_port(args.host, args.port, 30)
+        wait_for_port(args.host, args.metrics_port, 30)
+    except OSError:
+        process.terminate()
+        raise
+    return process
+
+def print_report(args, stats, latencies):
+    print("{} clients connected, {} failed to connect, {} disconnected.".format(
+        stats.connected, stats.connect_failures, stats.disconnects))
+    print("{} games played at {} tables, {} errors, {} turned away.".format(
+        stats.games, stats.tables, stats.errors, stats.overloaded))
+    if args.spectators:
+        print("Spectators watched {} games and received {} events.".format(
+            stats.spectator_games, stats.spectator_events))
+    print("Table completion throughput: {:.1f} tables/second.".format(
+        stats.window_tables / args.duration))
+    if latencies is None:
+        return
+    print("")
+    print("Server latency (ms):")
+    print("{}{:>10}{:>10}{:>10}{:>10}{:>10}".format(
+        "Phase".ljust(14), "count", "mean", "p50", "p90", "p99"))
+    for phase in sorted(latencies):
+        histogram = latencies[phase]
+        if histogram.count == 0:
+            continue
+        print("{}{:>10}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}".format(
+            phase.ljust(14),
+            histogram.count,
+            histogram.mean * 1000,
+            histogram.percentile(50) * 1000,
+            histogram.percentile(90) * 1000,
+            histogram.percentile(99) * 1000))
+    print("Percentiles are the upper bounds of their histogram buckets.")
+
+def main(args):
+    think = Think(args.think)
+    rng = random.Random(args.seed)
+    codec_factory = None
+    if args.json:
+        codec_factory = protocol.JsonCodec
+    server = None
+    if args.spawn:
+        server = spawn_server(args)
+    try:
+        before = None
+        if args.metrics_port is not None:
+            before = scrape(args.host, args.metrics_port)
+        stats = asyncio.run(run_load(
+            args.host,
+            args.port,
+            args.clients,
+            args.table_size,
+            args.policy,
+            think,
+            rng,
+            args.duration,
+            args.ramp,
+            args.drain,
+            codec_factory,
+            args.spectators,
+            args.spectator_delay,
+            args.backoff))
+        latencies = None
+        if before is not None:
+            latencies = subtract(scrape(args.host, args.metrics_port), before)
+    finally:
+        if server is not None:
+            # The server stops its workers when interrupted.
+            server.send_signal(signal.SIGINT)
+            server.wait()
+    print_report(args, stats, latencies)
+
+def think_time(spec):
+    try:
+        Think(spec)
+    except ValueError as ex:
+        raise argparse.ArgumentTypeError(str(ex))
+    return spec
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Play games against a Werewolves! server with simulated '
+                    'clients and report its latency and throughput.')
+    parser.add_argument(
+        '--host',
+        action="store",
+        default="127.0.0.1",
+        help='The server address (default 127.0.0.1).')
+    parser.add_argument(
+        '-p',
+        '--port',
+        action="store",
+        type=int,
+        default=7000,
+        help='The server port (default 7000).')
+    parser.add_argument(
+        '--metrics-port',
+        action="store",
+        type=int,
+        metavar="PORT",
+        help="Read the server's latencies from its Prometheus metrics on "
+             "PORT.")
+    parser.add_argument(
+        '--spawn',
+        action="store_true",
+        help='Start a local server to test.  Requires --metrics-port.')
+    parser.add_argument(
+        '-w',
+        '--workers',
+        action="store",
+        type=int,
+        help='The number of worker processes for a spawned server.')
+    parser.add_argument(
+        '-c',
+        '--clients',
+        action="store",
+        type=int,
+        default=1000,
+        help='The number of simulated clients (default 1000).')
+    parser.add_argument(
+        '-n',
+        '--table-size',
+        action="store",
+        type=int,
+        default=5,
+        help='The number of players at each table (default 5).')
+    parser.add_argument(
+        '--policy',
+        action="store",
+        choices=sorted(POLICIES),
+        default="random",
+        help='How the clients choose night actions and votes '
+             '(default random).')
+    parser.add_argument(
+        '--think',
+        action="store",
+        type=think_time,
+        default="exp:0.5",
+        metavar="DIST",
+        help='Think time before each action and vote, in seconds: N, '
+             'const:N, uniform:A,B, exp:MEAN or lognormal:MEDIAN,SIGMA '
+             '(default exp:0.5).')
+    parser.add_argument(
+        '-d',
+        '--duration',
+        action="store",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help='How long to generate load (default 30).')
+    parser.add_argument(
+        '--ramp',
+        action="store",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help='Spread the client connections over SECONDS (default 5).')
+    parser.add_argument(
+        '--drain',
+        action="store",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help='How long to let games in progress finish (default 30).')
+    parser.add_argument(
+        '--spectators',
+        action="store",
+        type=int,
+        default=0,
+        help='The number of simulated spectators watching the games '
+             '(default 0).')
+    parser.add_argument(
+        '--spectator-delay',
+        action="store",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help='How long a spectator takes to read each event, to simulate '
+             'slow spectators (default 0).')
+    parser.add_argument(
+        '--backoff',
+        action="store",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help='How long a client turned away by a busy server waits, at '
+             'most, before joining again (default 1).')
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        help='Seed for the clients\' choices and think times.')
+    parser.add_argument(
+        '--json',
+        action="store_true",
+        help='Use the JSON encoding of the protocol.')
+    args = parser.parse_args()
+    if args.spawn and args.metrics_port is None:
+        parser.error("--spawn requires --metrics-port.")
+    main(args)
@@ -0,0 +1,116 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import sys
+from werewolf import roles
+from werewolf.scenarios import ScenarioError, generate_scenarios, open_corpus, run_corpus
+from werewolf.werewolf import WerewolfGame
+
+def generate(args):
+    """
+    Write a corpus of random scenarios with the outcomes the engine gives
+    them now.
+    """
+    deck = set(roles.registry.get_role_by_tag(tag).card for tag in args.role)
+    with open_corpus(args.corpus, "w") as f:
+        for scenario in generate_scenarios(
+                args.scenarios, args.players, args.werewolves, deck, args.seed):
+            f.write(scenario.to_json())
+            f.write(u"\n")
+    return 0
+
+def replay(args):
+    """
+    Replay corpora of scenarios and report those that don't end as
+    expected.
+    """
+    try:
+        report = run_corpus(args.corpus, args.show, args.workers)
+    except ScenarioError as ex:
+        print(ex, file=sys.stderr)
+        return 2
+    print("{} scenarios in {:.2f}s: {:.0f} scenarios/second".format(
+        report.scenarios, report.elapsed, report.scenarios_per_second))
+    if report.mismatch_count == 0:
+        return 0
+    print("{} scenarios did not end as expected:".format(report.mismatch_count))
+    for path, number, problem in report.mismatches:
+        print("* {}:{}: {}".format(path, number, problem))
+    return 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Generate and replay corpora of Werewolves! games with '
+                    'predetermined deals.')
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    gen_parser = subparsers.add_parser(
+        'generate', help='Write a corpus of random scenarios.')
+    gen_parser.set_defaults(func=generate)
+    gen_parser.add_argument(
+        'corpus',
+        action="store",
+        help='The corpus file to write; compressed if it ends with .gz.')
+    gen_parser.add_argument(
+        '-g',
+        '--scenarios',
+        action="store",
+        type=int,
+        default=100000,
+        help='The number of scenarios (default 100000).')
+    gen_parser.add_argument(
+        '-n',
+        '--players',
+        action="store",
+        type=int,
+        nargs='+',
+        choices=range(3, 11),
+        default=[3, 4, 5, 6, 7, 8, 9, 10],
+        help='The table sizes to mix (default 3-10).')
+    gen_parser.add_argument(
+        '-W',
+        '--werewolves',
+        action="store",
+        default=2,
+        type=int,
+        help='The number of werewolves to include (default 2).')
+    gen_parser.add_argument(
+        '-r',
+        '--role',
+        action="append",
+        choices=[r.tag for r in roles.registry.roles()
+                 if r.card not in (WerewolfGame.CARD_WEREWOLF, WerewolfGame.CARD_VILLAGER)],
+        help='Include a role.  May be given more than once '
+             '(default seer, robber and troublemaker).')
+    gen_parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        help='Seed for the random number generator.')
+    run_parser = subparsers.add_parser(
+        'run', help='Replay corpora and report mismatches.')
+    run_parser.set_defaults(func=replay)
+    run_parser.add_argument(
+        'corpus',
+        action="store",
+        nargs='+',
+        help='The corpus files to replay.')
+    run_parser.add_argument(
+        '--show',
+        action="store",
+        type=int,
+        default=20,
+        help='The number of mismatches to list (default 20).')
+    run_parser.add_argument(
+        '-w',
+        '--workers',
+        action="store",
+        type=int,
+        default=1,
+        help='The number of worker processes (default 1).')
+    args = parser.parse_args()
+    if getattr(args, "role", False) is None:
+        args.role = ["seer", "robber", "troublemaker"]
+    sys.exit(args.func(args))
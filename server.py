@@ -0,0 +1,176 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import asyncio
+from werewolf.profiling import DEFAULT_OUTPUT, ProfileSettings
+from werewolf.protocol import MAX_VOTE_SECONDS
+from werewolf.server import serve
+
+def main(args):
+    # The profiler can always be toggled with SIGUSR2, so a running server
+    # can be profiled without a restart.
+    profile = ProfileSettings(
+        path=args.profile_output,
+        window=args.profile_window,
+        start=args.profile)
+    try:
+        asyncio.run(serve(
+            args.host,
+            args.port,
+            args.workers,
+            args.rebalance_interval,
+            args.metrics_port,
+            profile=profile,
+            threads=args.threads,
+            max_in_flight=args.max_in_flight,
+            queue_limit=None if args.no_admission else args.queue_limit,
+            admission_latency=None if args.no_admission else args.admission_latency,
+            hibernate_path=args.hibernate_dir,
+            idle_timeout=args.idle_timeout,
+            action_timeout=args.action_timeout,
+            vote_timeout=args.vote_timeout,
+            spectator_buffer=args.spectator_buffer,
+            reveal_delay=args.reveal_delay))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Werewolves! game server')
+    parser.add_argument(
+        '--host',
+        action="store",
+        default="127.0.0.1",
+        help='The address to listen on (default 127.0.0.1).')
+    parser.add_argument(
+        '-p',
+        '--port',
+        action="store",
+        type=int,
+        default=7000,
+        help='The port to listen on (default 7000).')
+    parser.add_argument(
+        '-w',
+        '--workers',
+        action="store",
+        type=int,
+        help='The number of worker processes (default one per core).')
+    parser.add_argument(
+        '-t',
+        '--threads',
+        action="store",
+        type=int,
+        default=0,
+        help="Run each worker's table inputs on a pool of THREADS threads, "
+             "keeping each table's inputs in order (default 0, one at a "
+             "time on the worker's main thread).")
+    parser.add_argument(
+        '--max-in-flight',
+        action="store",
+        type=int,
+        default=32,
+        metavar="REQUESTS",
+        help='The most requests a worker works on at once; the rest wait, '
+             'with inputs to games under way ahead of new games (default 32).')
+    parser.add_argument(
+        '--queue-limit',
+        action="store",
+        type=int,
+        default=1024,
+        metavar="REQUESTS",
+        help='Turn away new tables when this many requests are waiting for '
+             'a worker (default 1024).')
+    parser.add_argument(
+        '--admission-latency',
+        action="store",
+        type=float,
+        default=0.02,
+        metavar="SECONDS",
+        help='Turn away new tables while a request to the least busy worker '
+             'is expected to take longer than SECONDS (default 0.02).')
+    parser.add_argument(
+        '--no-admission',
+        action="store_true",
+        help='Never turn away new tables or inputs.')
+    parser.add_argument(
+        '--hibernate-dir',
+        action="store",
+        metavar="DIR",
+        help='Write games left idle to snapshots in DIR and drop them from '
+             'memory until their next input.')
+    parser.add_argument(
+        '--idle-timeout',
+        action="store",
+        type=float,
+        default=300.0,
+        metavar="SECONDS",
+        help='How long a game must be idle before it is hibernated to '
+             '--hibernate-dir (default 300).')
+    parser.add_argument(
+        '--rebalance-interval',
+        action="store",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help='How often to rebalance tables across workers (default 10).')
+    parser.add_argument(
+        '--action-timeout',
+        action="store",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help='How long a player has to use a night action (default 60).')
+    parser.add_argument(
+        '--vote-timeout',
+        action="store",
+        type=float,
+        default=300.0,
+        metavar="SECONDS",
+        help='How long the players have to discuss and vote (default 300).')
+    parser.add_argument(
+        '--spectator-buffer',
+        action="store",
+        type=int,
+        default=32,
+        metavar="EVENTS",
+        help='How many events to hold for a slow spectator before dropping '
+             'stale phases (default 32).')
+    parser.add_argument(
+        '--reveal-delay',
+        action="store",
+        type=float,
+        metavar="SECONDS",
+        help="Reveal every player's card to spectators SECONDS after the "
+             "deal.")
+    parser.add_argument(
+        '--metrics-port',
+        action="store",
+        type=int,
+        metavar="PORT",
+        help='Serve Prometheus metrics, including how long the server takes '
+             'to answer actions and votes in each phase, on PORT.')
+    parser.add_argument(
+        '--profile',
+        action="store_true",
+        help='Profile the server from startup.  Sending the processes '
+             'SIGUSR2 starts or stops a profile at any time.')
+    parser.add_argument(
+        '--profile-window',
+        action="store",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help='How long each profile lasts, unless stopped sooner (default 30).')
+    parser.add_argument(
+        '--profile-output',
+        action="store",
+        default=DEFAULT_OUTPUT,
+        metavar="PATH",
+        help='Write collapsed stacks for flame graphs to PATH, and PATH.N '
+             'for worker N (default {}).'.format(DEFAULT_OUTPUT))
+    args = parser.parse_args()
+    if not 0 < args.vote_timeout <= MAX_VOTE_SECONDS:
+        parser.error(
+            "--vote-timeout must be more than 0 and at most {} seconds.".format(
+                MAX_VOTE_SECONDS))
+    main(args)
@@ -0,0 +1,307 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+import uuid
+from werewolf import roles
+from werewolf.profiling import DEFAULT_OUTPUT, ProfileSettings, install_toggle
+from werewolf.simulation import simulate
+from werewolf.werewolf import WerewolfGame
+
+PLAYER_NAMES = [
+    "Player {}".format(n + 1) for n in range(10)
+]
+
+WINNER_NAMES = {
+    WerewolfGame.WINNER_VILLAGE: "village",
+    WerewolfGame.WINNER_WEREWOLVES: "werewolves",
+    WerewolfGame.WINNER_NO_ONE: "no one",
+    WerewolfGame.WINNER_TANNER: "tanner",
+    WerewolfGame.WINNER_TANNER_AND_VILLAGE: "tanner and village",
+}
+
+def parse_roles(args):
+    """
+    Returns tuple (werewolf count, roles).
+    """
+    deck = set()
+    for tag in args.role:
+        deck.add(roles.registry.get_role_by_tag(tag).card)
+    return (args.werewolves, deck)
+
+def run_worker(job):
+    """
+    Simulate a shard of the games in a worker process.
+    """
+    (shard, count, players, werewolf_count, deck, seed, results_path,
+        phase_times, metrics_port, metrics_file, checkpoint_path,
+        checkpoint_interval, run_id, profile) = job
+    # The first shard writes to the unsuffixed path.
+    recorder = profile.recorder(shard or None, "shard {}".format(shard))
+    histograms = None
+    if phase_times:
+        histograms = {}
+    metrics = None
+    exporters = []
+    # The exporters and the result store are only imported when they are
+    # used, so plain runs start quickly.
+    if metrics_port is not None or metrics_file is not None:
+        from werewolf.metrics import GameMetrics
+        metrics = GameMetrics()
+    if metrics_port is not None:
+        from werewolf.metrics import MetricsServer
+        exporters.append(MetricsServer(metrics.registry, metrics_port + shard).start())
+    if metrics_file is not None:
+        if shard > 0:
+            metrics_file = "{}.{}".format(metrics_file, shard)
+        from werewolf.metrics import TextfileWriter
+        exporters.append(TextfileWriter(metrics.registry, metrics_file).start())
+    checkpoint = None
+    result_rows = None
+    resumed = 0
+    if checkpoint_path is not None:
+        from werewolf.checkpoints import CheckpointDir
+        checkpoint = CheckpointDir(checkpoint_path).shard(shard, checkpoint_interval)
+        state = checkpoint.load()
+        if state is not None:
+            resumed = state.games
+            result_rows = state.result_rows
+        if result_rows is None:
+            result_rows = 0
+    sink = None
+    if results_path is not None:
+        from werewolf.results import ResultWriter
+        if checkpoint is None:
+            sink = ResultWriter(results_path)
+        else:
+            # A resumed shard appends to the rows it wrote before.
+            sink = ResultWriter(
+                results_path, shard="{}-{}".format(run_id, shard), rows=result_rows)
+    try:
+        winners = simulate(
+            count, players, werewolf_count, deck, seed=seed, sink=sink,
+            phase_histograms=histograms, metrics=metrics, checkpoint=checkpoint)
+    finally:
+        if sink is not None:
+            sink.close()
+        for exporter in exporters:
+            exporter.stop()
+        recorder.close()
+    return (winners, histograms, count - resumed)
+
+def main(args):
+    """
+    Simulate games and report how often each team wins.
+    """
+    players = PLAYER_NAMES[:args.players]
+    werewolf_count, deck = parse_roles(args)
+    workers = args.workers
+    shards = args.shards
+    if shards is None:
+        shards = workers
+    base_seed = args.seed
+    run_id = None
+    # Each shard can be profiled by sending the workers SIGUSR2, even
+    # without --profile.
+    profile = ProfileSettings(
+        path=args.profile_output, window=args.profile_window, start=args.profile)
+    if args.checkpoint is not None:
+        from werewolf.checkpoints import CheckpointDir, CheckpointMismatch
+        checkpoints = CheckpointDir(args.checkpoint)
+        config = {
+            "games": args.games,
+            "players": args.players,
+            "werewolves": werewolf_count,
+            "roles": sorted(args.role),
+            "shards": args.shards,
+            "seed": base_seed,
+        }
+        try:
+            saved = checkpoints.resume(config)
+        except CheckpointMismatch as ex:
+            print(ex, file=sys.stderr)
+            sys.exit(1)
+        if saved is None:
+            # A checkpointed run always has a seed, so the shards that had
+            # not started when it was interrupted play the same games on
+            # resuming.
+            if config["seed"] is None:
+                config["seed"] = random.randrange(2 ** 31)
+            config["shards"] = shards
+            config["run"] = uuid.uuid4().hex[:8]
+            checkpoints.start(config)
+        else:
+            config = saved
+            print("Resuming the run in {}.".format(args.checkpoint))
+        base_seed = config["seed"]
+        shards = config["shards"]
+        run_id = config["run"]
+    jobs = []
+    for n in range(shards):
+        count = args.games // shards
+        if n < args.games % shards:
+            count += 1
+        seed = None
+        if base_seed is not None:
+            seed = base_seed + n
+        jobs.append((
+            n, count, players, werewolf_count, deck, seed, args.results,
+            args.phase_times, args.metrics_port, args.metrics_file,
+            args.checkpoint, args.checkpoint_interval, run_id, profile))
+    start = time.time()
+    if workers == 1:
+        outcomes = [run_worker(job) for job in jobs]
+    else:
+        # The toggle is installed before the pool starts, and in each pool
+        # process until its shard's recorder takes over, so SIGUSR2 never
+        # finds a process with the default handler, which would kill it.
+        install_toggle()
+        pool = multiprocessing.Pool(
+            workers, initializer=install_toggle, initargs=(None, False))
+        outcomes = pool.map(run_worker, jobs, chunksize=1)
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start
+    winners, histograms, played = outcomes[0]
+    for outcome_winners, outcome_histograms, outcome_played in outcomes[1:]:
+        played += outcome_played
+        winners.update(outcome_winners)
+        if histograms is not None:
+            for phase, histogram in outcome_histograms.items():
+                if phase in histograms:
+                    histograms[phase].merge(histogram)
+                else:
+                    histograms[phase] = histogram
+    print("{} games in {:.2f}s: {:.0f} games/second".format(
+        played, elapsed, played / max(elapsed, 1e-9)))
+    for code, name in sorted(WINNER_NAMES.items()):
+        print("{}{:>10} {:6.2f}%".format(
+            name.ljust(20), winners[code], 100.0 * winners[code] / max(args.games, 1)))
+    if histograms is not None:
+        show_phase_times(histograms)
+
+def show_phase_times(histograms):
+    """
+    Print the time spent in each phase.
+    """
+    print("")
+    print("{}{:>12}{:>12}{:>12}".format(
+        "Phase".ljust(20), "mean usec", "p50 usec", "p99 usec"))
+    for phase, histogram in sorted(histograms.items()):
+        print("{}{:>12.1f}{:>12.1f}{:>12.1f}".format(
+            phase.ljust(20),
+            histogram.mean * 1e6,
+            histogram.percentile(50) * 1e6,
+            histogram.percentile(99) * 1e6))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Werewolves! game simulator')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action="store",
+        type=int,
+        default=10000,
+        help='The number of games to simulate (default 10000).')
+    parser.add_argument(
+        '-n',
+        '--players',
+        action="store",
+        type=int,
+        choices=range(3, 11),
+        default=5,
+        help='The number of players (3-10, default 5).')
+    parser.add_argument(
+        '-W',
+        '--werewolves',
+        action="store",
+        default=2,
+        type=int,
+        help='The number of werewolves to include (default 2).')
+    parser.add_argument(
+        '-r',
+        '--role',
+        action="append",
+        choices=[r.tag for r in roles.registry.roles()
+                 if r.card not in (WerewolfGame.CARD_WEREWOLF, WerewolfGame.CARD_VILLAGER)],
+        help='Include a role.  May be given more than once '
+             '(default seer, robber and troublemaker).')
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        help='Seed for the random number generator.')
+    parser.add_argument(
+        '-w',
+        '--workers',
+        action="store",
+        type=int,
+        default=1,
+        help='The number of worker processes (default 1).')
+    parser.add_argument(
+        '--results',
+        action="store",
+        metavar="DIR",
+        help='Append every game to the columnar result store in DIR.')
+    parser.add_argument(
+        '--phase-times',
+        action="store_true",
+        help='Report the time spent in each game phase.')
+    parser.add_argument(
+        '--metrics-port',
+        action="store",
+        type=int,
+        metavar="PORT",
+        help='Serve Prometheus metrics on PORT.  Shard N uses PORT + N.')
+    parser.add_argument(
+        '--metrics-file',
+        action="store",
+        metavar="FILE",
+        help='Periodically write Prometheus metrics to FILE.  Shard N > 0 '
+             'writes FILE.N.')
+    parser.add_argument(
+        '--shards',
+        action="store",
+        type=int,
+        help='Split the games into this many shards, each with its own seed '
+             '(default one per worker).')
+    parser.add_argument(
+        '--checkpoint',
+        action="store",
+        metavar="DIR",
+        help='Save the progress of each shard to DIR, and resume the run '
+             'saved there if there is one.')
+    parser.add_argument(
+        '--checkpoint-interval',
+        action="store",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help='How often each shard saves its progress (default 60).')
+    parser.add_argument(
+        '--profile',
+        action="store_true",
+        help='Profile each shard with a sampling profiler.  Sending the '
+             'processes SIGUSR2 starts or stops a profile at any time.')
+    parser.add_argument(
+        '--profile-window',
+        action="store",
+        type=float,
+        metavar="SECONDS",
+        help='Stop profiling after SECONDS (default the whole shard).')
+    parser.add_argument(
+        '--profile-output',
+        action="store",
+        default=DEFAULT_OUTPUT,
+        metavar="PATH",
+        help='Write collapsed stacks for flame graphs to PATH, and PATH.N '
+             'for shard N (default {}).'.format(DEFAULT_OUTPUT))
+    args = parser.parse_args()
+    if args.role is None:
+        args.role = ["seer", "robber", "troublemaker"]
+    main(args)
@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import json
+import sys
+from werewolf import roles
+from werewolf.cfr import CFRSolver
+from werewolf.werewolf import WerewolfGame
+
+def write_strategy(solver, path):
+    """
+    Write the average strategy, one JSON information set per line.
+    """
+    with open(path, "w") as f:
+        for key, choices in solver.strategy_table():
+            obj = {
+                "phase": key[0],
+                "seat": key[1],
+                "card": WerewolfGame.get_card_name(key[2]),
+                "strategy": dict((label, round(p, 6)) for label, p in choices),
+            }
+            if key[0] == "vote":
+                obj["saw"] = [list(seen) for seen in key[3]]
+            f.write(json.dumps(obj, sort_keys=True))
+            f.write("\n")
+
+def main(args):
+    deck = set(roles.registry.get_role_by_tag(tag).card for tag in args.role)
+    try:
+        solver = CFRSolver(
+            args.players, args.werewolves, deck,
+            plus=not args.vanilla,
+            sample=args.sample,
+            workers=args.workers,
+            seed=args.seed)
+    except ValueError as ex:
+        print(ex, file=sys.stderr)
+        return 2
+    tree = solver.tree
+    print("{} deals, {} information sets, {} leaves".format(
+        len(tree.deals), tree.infosets, tree.leaves))
+    print("{}{:>16}{:>10}".format("Iteration".ljust(12), "exploitability", "seconds"))
+    try:
+        for iteration, nashconv, values, elapsed in solver.run(
+                args.iterations, args.report_every):
+            print("{}{:>16.6f}{:>10.1f}".format(
+                str(iteration).ljust(12), nashconv, elapsed))
+    finally:
+        solver.close()
+    print("Seat win rates: {}".format(
+        " ".join("{:.3f}".format(value) for value in values)))
+    for tag, kinds in sorted(solver.night_summary().items()):
+        print("{}: {}".format(tag, ", ".join(
+            "{} {:.1%}".format(kind, p) for kind, p in sorted(kinds.items()))))
+    if args.output is not None:
+        write_strategy(solver, args.output)
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Find near-equilibrium night and voting strategies for a '
+                    'small game of Werewolves! with counterfactual regret '
+                    'minimization.')
+    parser.add_argument(
+        '-n',
+        '--players',
+        action="store",
+        type=int,
+        choices=range(3, 6),
+        default=3,
+        help='The number of players (default 3).')
+    parser.add_argument(
+        '-W',
+        '--werewolves',
+        action="store",
+        default=2,
+        type=int,
+        help='The number of werewolves to include (default 2).')
+    parser.add_argument(
+        '-r',
+        '--role',
+        action="append",
+        choices=[r.tag for r in roles.registry.roles()
+                 if r.card not in (WerewolfGame.CARD_WEREWOLF, WerewolfGame.CARD_VILLAGER)],
+        help='Include a role.  May be given more than once '
+             '(default seer, robber and troublemaker).')
+    parser.add_argument(
+        '-i',
+        '--iterations',
+        action="store",
+        type=int,
+        default=1000,
+        help='The number of iterations (default 1000).')
+    parser.add_argument(
+        '--report-every',
+        action="store",
+        type=int,
+        default=1,
+        metavar="ITERATIONS",
+        help='How often to report the exploitability of the average '
+             'strategy, which takes about as long as an iteration '
+             '(default every iteration).')
+    parser.add_argument(
+        '--sample',
+        action="store",
+        type=int,
+        metavar="DEALS",
+        help='Walk this many random deals each iteration instead of all '
+             'of them.')
+    parser.add_argument(
+        '--vanilla',
+        action="store_true",
+        help='Use plain CFR rather than CFR+.')
+    parser.add_argument(
+        '-w',
+        '--workers',
+        action="store",
+        type=int,
+        default=1,
+        help='The number of worker processes (default 1).')
+    parser.add_argument(
+        '-s',
+        '--seed',
+        action="store",
+        type=int,
+        help='Seed for sampling deals.')
+    parser.add_argument(
+        '-o',
+        '--output',
+        action="store",
+        help='Write the average strategy to this file, one JSON '
+             'information set per line.')
+    args = parser.parse_args()
+    if args.role is None:
+        args.role = ["seer", "robber", "troublemaker"]
+    sys.exit(main(args))
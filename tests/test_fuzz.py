@@ -0,0 +1,10 @@
+from __future__ import print_function
+from werewolf.fuzz import fuzz
+
+
+def test_seeded_fuzz_run_keeps_invariants():
+    report = fuzz(seed=20240101, games=50)
+    assert report.failure is None, "{}: {} after {}".format(
+        report.failure.kind, report.failure.message, report.steps)
+    assert report.games == 50
+    assert report.inputs > report.rejected > 0
@@ -0,0 +1,25 @@
+from __future__ import print_function
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+import import_time
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 7), reason="-X importtime requires Python 3.7 or later.")
+
+
+@pytest.mark.parametrize("module,budget", import_time.BUDGETS)
+def test_import_time_within_budget(module, budget):
+    # Take the best of several runs to allow for a noisy machine.
+    runs = [import_time.import_time(module) for n in range(3)]
+    own = min(own for total, own, imported in runs)
+    assert own / 1000.0 <= budget
+
+
+@pytest.mark.parametrize("module", sorted(import_time.DEFERRED))
+def test_deferred_modules_not_imported(module):
+    total, own, imported = import_time.import_time(module)
+    assert not imported.intersection(import_time.DEFERRED[module])
@@ -0,0 +1,87 @@
+from __future__ import print_function
+import asyncio
+import socket
+import time
+from six.moves.urllib.request import urlopen
+from werewolf import protocol
+from werewolf.metrics import parse_histograms
+from werewolf.server import serve
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+async def connect(port):
+    deadline = time.time() + 30
+    while True:
+        try:
+            return await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.time() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def play(port, name):
+    """
+    Play a game, sending an action no role has and a vote for no one.
+    """
+    reader, writer = await connect(port)
+    codec = protocol.JsonCodec()
+    writer.write(codec.encode(protocol.Join(3, name)))
+    while True:
+        message = await codec.read(reader)
+        if isinstance(message, protocol.Phase) and message.active:
+            writer.write(codec.encode(protocol.NightAction(99)))
+            writer.write(codec.encode(protocol.NightAction(protocol.ACTION_PASS)))
+        elif isinstance(message, protocol.VotePrompt):
+            writer.write(codec.encode(protocol.Vote("nobody")))
+        elif message is None or isinstance(message, protocol.Results):
+            break
+    writer.close()
+
+
+def scrape(port):
+    return urlopen("http://127.0.0.1:{}/metrics".format(port), timeout=10).read().decode("utf-8")
+
+
+def counter(text, series):
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_scraped_metrics_after_game():
+    port = free_port()
+    metrics_port = free_port()
+
+    async def run():
+        server = asyncio.ensure_future(serve(
+            "127.0.0.1", port, workers=1, metrics_port=metrics_port,
+            action_timeout=5.0, vote_timeout=5.0))
+        try:
+            await asyncio.gather(*[play(port, "player{}".format(n)) for n in range(3)])
+            loop = asyncio.get_event_loop()
+            deadline = time.time() + 10
+            while True:
+                # The router collects the workers' metrics every second.
+                text = await loop.run_in_executor(None, scrape, metrics_port)
+                phases = parse_histograms(text, "werewolf_phase_duration_seconds", "phase")
+                if sum(h.count for h in phases.values()) > 0 or time.time() > deadline:
+                    return text
+                await asyncio.sleep(0.2)
+        finally:
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+
+    text = asyncio.run(run())
+    phases = parse_histograms(text, "werewolf_phase_duration_seconds", "phase")
+    assert sum(h.count for h in phases.values()) > 0
+    assert counter(text, 'werewolf_invalid_inputs_total{input="vote"}') == 3
+    assert counter(text, "werewolf_games_started_total") == 1
@@ -0,0 +1,39 @@
+from __future__ import print_function
+from werewolf.ratings import RatingService
+from werewolf.werewolf import WerewolfGame
+
+
+def total(service):
+    return sum(r.rating for r in service.ratings().values())
+
+
+def test_even_teams_move_by_elo_delta():
+    service = RatingService()
+    service.record_game(
+        {"alice": WerewolfGame.CARD_VILLAGER, "bob": WerewolfGame.CARD_WEREWOLF},
+        WerewolfGame.WINNER_VILLAGE)
+    assert service.get_rating("alice").rating == 1516.0
+    assert service.get_rating("bob").rating == 1484.0
+
+
+def test_lone_winner_gains_at_most_elo_delta():
+    service = RatingService()
+    cards = {"wolf": WerewolfGame.CARD_WEREWOLF}
+    for n in range(9):
+        cards["villager{}".format(n)] = WerewolfGame.CARD_VILLAGER
+    service.record_game(cards, WerewolfGame.WINNER_WEREWOLVES)
+    # Evenly rated, so the expected score is 0.5 and the delta is K / 2.
+    assert service.get_rating("wolf").rating == 1516.0
+    for n in range(9):
+        assert abs(service.get_rating("villager{}".format(n)).rating - (1500.0 - 16.0 / 9)) < 1e-9
+    assert abs(total(service) - 10 * 1500.0) < 1e-9
+
+
+def test_lone_loser_loses_at_most_elo_delta():
+    service = RatingService()
+    cards = {"wolf": WerewolfGame.CARD_WEREWOLF}
+    for n in range(9):
+        cards["villager{}".format(n)] = WerewolfGame.CARD_VILLAGER
+    service.record_game(cards, WerewolfGame.WINNER_VILLAGE)
+    assert service.get_rating("wolf").rating == 1484.0
+    assert abs(total(service) - 10 * 1500.0) < 1e-9
@@ -0,0 +1,84 @@
+from __future__ import print_function
+import asyncio
+import os
+import time
+from werewolf import protocol
+from werewolf.server import GameServer, Router
+
+PLAYERS = ["alice", "bob", "carol", "dave", "erin"]
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "Timed out."
+        time.sleep(0.05)
+
+
+def test_idle_table_hibernates_and_restores(tmp_path):
+    snapshot = []
+
+    async def play():
+        router = await Router(
+            1, hibernate_path=str(tmp_path), idle_timeout=0.2).start()
+        try:
+            table_id = await router.create_table()
+            await router.send(table_id, "add_players", PLAYERS)
+            await router.send(table_id, "deal_cards")
+            cards = await router.send(table_id, "query_player_cards")
+            path = os.path.join(str(tmp_path), "worker-0", "{}.snap".format(table_id))
+            wait_for(lambda: os.path.exists(path))
+            snapshot.append(path)
+            # The next input restores the game where it left off.
+            assert await router.send(table_id, "query_player_cards") == cards
+            assert not os.path.exists(path)
+            await router.send(table_id, "advance_phase")
+            await router.send(table_id, "query_active_role")
+        finally:
+            await router.stop()
+
+    asyncio.run(play())
+    assert snapshot
+
+
+class Writer(object):
+
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+
+def test_over_long_first_json_line_is_rejected():
+    writer = Writer()
+
+    async def connect():
+        reader = asyncio.StreamReader(limit=64)
+        reader.feed_data(b'{"type": "Join", "name": "' + b"x" * 200 + b'", "players": 5}\n')
+        reader.feed_eof()
+        await GameServer(None).handle_client(reader, writer)
+
+    asyncio.run(connect())
+    assert writer.closed
+
+
+def test_over_long_json_message_is_rejected():
+    writer = Writer()
+
+    async def connect():
+        reader = asyncio.StreamReader(limit=64)
+        reader.feed_data(b'{"type": "Vote", "seat": 1}\n')
+        reader.feed_data(b'{"type": "Vote", "seat": "' + b"x" * 200 + b'"}\n')
+        reader.feed_eof()
+        await GameServer(None).handle_client(reader, writer)
+
+    asyncio.run(connect())
+    lines = writer.data.splitlines()
+    assert protocol.JsonCodec().decode(lines[-1]) == protocol.Error(
+        protocol.ERROR_BAD_MESSAGE)
+    assert writer.closed
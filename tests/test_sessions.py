@@ -0,0 +1,95 @@
+from __future__ import print_function
+import asyncio
+from werewolf import protocol
+from werewolf.instrumentation import clock
+from werewolf.sessions import Player, TableSession
+from werewolf.tables import TableManager
+
+
+class LocalRouter(object):
+    """
+    Plays a session's tables in this process.
+    """
+
+    def __init__(self):
+        self.manager = TableManager()
+
+    async def create_table(self):
+        return self.manager.create_table()
+
+    async def send(self, table_id, input_name, *args):
+        return self.manager.send(table_id, input_name, *args)
+
+    async def remove_table(self, table_id):
+        self.manager.remove_table(table_id)
+
+    def __len__(self):
+        return len(self.manager)
+
+
+class Codec(object):
+
+    def encode(self, message):
+        return message
+
+
+class Writer(list):
+
+    def write(self, data):
+        self.append(data)
+
+
+def start_session(ballots, codec=Codec, vote_timeout=1.0):
+    """
+    Returns a session at daybreak, and its players, who have cast `ballots`.
+    """
+    router = LocalRouter()
+    players = [Player(codec(), Writer(), "player{}".format(n)) for n in range(len(ballots))]
+    session = TableSession(router, players, vote_timeout=vote_timeout)
+    session.table_id = router.manager.create_table()
+    seats = list(range(len(players)))
+    router.manager.send(session.table_id, "add_players", seats)
+    router.manager.send(session.table_id, "deal_cards")
+    while True:
+        router.manager.send(session.table_id, "advance_phase")
+        if router.manager.send(session.table_id, "query_active_role") is None:
+            break
+    for player, ballot in zip(players, ballots):
+        player.inbox.put_nowait((protocol.Vote(ballot), clock()))
+    return session, players
+
+
+def eliminated(ballots):
+    """
+    Returns the seats eliminated by `ballots`.
+    """
+    session, players = start_session(ballots)
+    asyncio.run(session.daybreak())
+    results = [m for m in players[0].writer if isinstance(m, protocol.Results)]
+    assert len(results) == 1
+    mask = results[0].eliminated
+    return [seat for seat in range(len(players)) if mask & (1 << seat)]
+
+
+def test_valid_ballots_eliminate():
+    # A hunter may take their target with them.
+    assert 1 in eliminated([1, 2, 1, 1, 0])
+
+
+def test_invalid_ballots_count_as_votes_for_self():
+    # Each player votes for themself, so no one is eliminated.
+    assert eliminated(["1", 1.0, True, None, [1]]) == []
+
+
+def test_out_of_range_ballots_count_as_votes_for_self():
+    assert eliminated([5, -1, 99, 2 ** 40, -5]) == []
+
+
+def test_long_vote_timeout_fits_prompt():
+    session, players = start_session(
+        [0, 1, 2, 3, 4], protocol.BinaryCodec, vote_timeout=1e6)
+    asyncio.run(session.daybreak())
+    codec = protocol.BinaryCodec()
+    prompts = [codec.decode(frame[2:]) for frame in players[0].writer]
+    prompts = [m for m in prompts if isinstance(m, protocol.VotePrompt)]
+    assert prompts == [protocol.VotePrompt(protocol.MAX_VOTE_SECONDS)]
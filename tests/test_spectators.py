@@ -0,0 +1,70 @@
+from __future__ import print_function
+import asyncio
+from werewolf import protocol
+from werewolf.spectators import KEY_PHASE, KEY_RESULTS, KEY_TABLE, SpectatorHub
+
+TABLE = protocol.Seated(b"\x00" * 16, protocol.NO_SEAT, ["alice", "bob", "carol"])
+RESULTS = protocol.Results(1, 0b100, [1, 0, 2, 4, 4, 4], [1, 0, 2, 4, 4, 4])
+
+
+async def publish_game(channel, phases):
+    channel.publish(KEY_TABLE, TABLE)
+    for card in range(phases):
+        channel.publish(KEY_PHASE, protocol.Phase(card))
+        await asyncio.sleep(0)
+    channel.publish(KEY_RESULTS, RESULTS)
+    channel.close()
+    # Let the fan out finish.
+    for n in range(10):
+        await asyncio.sleep(0)
+
+
+async def read_all(subscription):
+    messages = []
+    while True:
+        event = await subscription.get()
+        if event is None:
+            return messages
+        messages.append(event.message)
+
+
+def test_spectator_keeping_up_gets_every_event():
+
+    async def run():
+        hub = SpectatorHub(maxsize=4)
+        subscription = hub.subscribe()
+        reader = asyncio.ensure_future(read_all(subscription))
+        await publish_game(hub.open("table"), 10)
+        return await reader, subscription
+
+    messages, subscription = asyncio.run(run())
+    assert len(messages) == 12
+    assert [m.card for m in messages[1:-1]] == list(range(10))
+    assert subscription.dropped == 0
+
+
+def test_slow_spectator_buffer_is_bounded():
+
+    async def run():
+        hub = SpectatorHub(maxsize=4)
+        subscription = hub.subscribe()
+        channel = hub.open("table")
+        channel.publish(KEY_TABLE, TABLE)
+        sizes = []
+        for card in range(10):
+            channel.publish(KEY_PHASE, protocol.Phase(card))
+            await asyncio.sleep(0)
+            sizes.append(len(subscription._events))
+        channel.publish(KEY_RESULTS, RESULTS)
+        channel.close()
+        await asyncio.sleep(0)
+        return sizes, await read_all(subscription), subscription
+
+    sizes, messages, subscription = asyncio.run(run())
+    assert max(sizes) == 4
+    assert len(messages) == 4
+    # The oldest phases are dropped, the table and results never are.
+    assert messages[0] == TABLE
+    assert [m.card for m in messages[1:-1]] == [8, 9]
+    assert messages[-1] == RESULTS
+    assert subscription.dropped == 8
@@ -0,0 +1,459 @@
+from __future__ import division, print_function
+import itertools
+import multiprocessing
+import random
+import time
+import numpy
+from werewolf import roles
+from werewolf.scenarios import WINNING_TEAMS, OutcomeTable, distinct_deals, make_deck
+from werewolf.werewolf import WerewolfGame, tally_votes
+
+# Night roles whose actions the solver models.  Roles that only learn
+# something are played out for them; the others choose among their actions.
+_INFORMED_ROLES = frozenset(["werewolf", "minion", "insomniac"])
+_CHOOSING_ROLES = frozenset(["seer", "robber", "troublemaker"])
+
+# Leaves processed per block, to bound the size of the payoff tensors.
+_BLOCK_VALUES = 1 << 21
+
+# Deals walked per job.  The results of the jobs are always added up in the
+# same order, so the sums don't depend on the number of workers.
+_JOB_DEALS = 32
+
+
+def _night_choices(tag, seat, players):
+    """
+    Returns labels for the choices of the player in `seat` holding the role
+    with tag `tag`.
+    """
+    others = [p for p in range(players) if p != seat]
+    if tag == "seer":
+        choices = [("view", p) for p in others]
+        choices.extend(("table", a, b) for a, b in itertools.combinations(range(3), 2))
+        return choices
+    if tag == "robber":
+        return [("steal", p) for p in others] + [("pass",)]
+    return [("switch", a, b) for a, b in itertools.combinations(others, 2)] + [("pass",)]
+
+
+def describe_choice(choice):
+    return " ".join(str(part) for part in choice)
+
+
+class GameTree(object):
+    """
+    The game tree of every deal of a small configuration, compiled to
+    arrays.  Each seat decides at most once at night, so a leaf is
+    identified by each seat's night information set and action, and each
+    seat's voting information set.
+
+    Information sets are numbered in the order they are first reached.  A
+    night information set is a seat and the card it was dealt.  A voting
+    information set adds what the seat saw or did at night.  Voting choices
+    are indexed by the seat voted for; players may not vote for themselves.
+    """
+
+    def __init__(self, players, werewolf_count=2, deck_roles=frozenset([
+            WerewolfGame.CARD_SEER, WerewolfGame.CARD_ROBBER, WerewolfGame.CARD_TROUBLEMAKER])):
+        self.players = players
+        self.deck = make_deck(players, werewolf_count, deck_roles)
+        self.plan = roles.registry.compile_phase_plan(self.deck)
+        for role in self.plan:
+            if role.tag not in _INFORMED_ROLES and role.tag not in _CHOOSING_ROLES:
+                raise ValueError("The solver doesn't model the {}.".format(role.tag))
+        self.deals = list(distinct_deals(self.deck))
+        self.actions = max(
+            [players] + [len(_night_choices(r.tag, 0, players))
+                         for r in self.plan if r.tag in _CHOOSING_ROLES])
+        self._index = {}
+        self.keys = []
+        self.choices = []
+        self.owner = []
+        self.parent = []
+        self.parent_action = []
+        self._layouts = {}
+        self._outcomes = OutcomeTable(self.deck)
+        votes = []
+        night = []
+        night_actions = []
+        layouts = []
+        self.deal_starts = []
+        for deal in self.deals:
+            self.deal_starts.append(len(votes))
+            self._expand(deal, list(deal), [()] * players, [None] * players,
+                         0, votes, night, night_actions, layouts)
+        self.deal_starts.append(len(votes))
+        self.deal_starts = numpy.array(self.deal_starts)
+        self.leaf_votes = numpy.array(votes, dtype=numpy.intp)
+        self.leaf_night = numpy.array(night, dtype=numpy.intp)
+        self.leaf_actions = numpy.array(night_actions, dtype=numpy.intp)
+        self.leaf_layouts = numpy.array(layouts, dtype=numpy.intp)
+        self.owner = numpy.array(self.owner, dtype=numpy.intp)
+        self.parent = numpy.array(self.parent, dtype=numpy.intp)
+        self.parent_action = numpy.array(self.parent_action, dtype=numpy.intp)
+        self.is_vote = numpy.array([key[0] == "vote" for key in self.keys])
+        self.legal = numpy.zeros((len(self.keys), self.actions))
+        for infoset, choices in enumerate(self.choices):
+            if self.is_vote[infoset]:
+                self.legal[infoset, [choice[1] for choice in choices]] = 1.0
+            else:
+                self.legal[infoset, :len(choices)] = 1.0
+        self._compile_payoffs()
+
+    @property
+    def infosets(self):
+        return len(self.keys)
+
+    @property
+    def leaves(self):
+        return len(self.leaf_votes)
+
+    def _infoset(self, key, seat, choices, parent=(-1, -1)):
+        infoset = self._index.get(key)
+        if infoset is None:
+            infoset = len(self.keys)
+            self._index[key] = infoset
+            self.keys.append(key)
+            self.choices.append(choices)
+            self.owner.append(seat)
+            self.parent.append(parent[0])
+            self.parent_action.append(parent[1])
+        return infoset
+
+    def _expand(self, deal, layout, seen, decided, step, votes, night, night_actions, layouts):
+        """
+        Play out the night from wake-up `step` of the plan, then add a leaf
+        for each way it can go.  `seen` holds what each seat has learned and
+        `decided` each seat's (night information set, choice).
+        """
+        players = self.players
+        while step < len(self.plan):
+            role = self.plan[step]
+            step += 1
+            seats = [s for s in range(players) if deal[s] == role.card]
+            if not seats:
+                continue
+            if role.tag in _INFORMED_ROLES:
+                seen = list(seen)
+                for seat in seats:
+                    if role.tag == "insomniac":
+                        seen[seat] += (("insomniac", layout[seat]),)
+                    else:
+                        werewolves = tuple(
+                            s for s in range(players)
+                            if deal[s] == WerewolfGame.CARD_WEREWOLF)
+                        seen[seat] += (("werewolves", werewolves),)
+                continue
+            seat = seats[0]
+            choices = _night_choices(role.tag, seat, players)
+            infoset = self._infoset(("night", seat, role.card), seat, choices)
+            for action, choice in enumerate(choices):
+                next_layout = list(layout)
+                if choice[0] == "view":
+                    saw = ("seer", choice[1], deal[choice[1]])
+                elif choice[0] == "table":
+                    saw = ("seer",) + choice + (
+                        layout[players + choice[1]], layout[players + choice[2]])
+                elif choice[0] == "steal":
+                    target = choice[1]
+                    next_layout[seat], next_layout[target] = layout[target], layout[seat]
+                    saw = ("robber", target, layout[target])
+                elif choice[0] == "switch":
+                    a, b = choice[1:]
+                    next_layout[a], next_layout[b] = layout[b], layout[a]
+                    saw = ("troublemaker", a, b)
+                else:
+                    saw = (role.tag, None)
+                next_seen = list(seen)
+                next_seen[seat] += (saw,)
+                next_decided = list(decided)
+                next_decided[seat] = (infoset, action)
+                self._expand(deal, next_layout, next_seen, next_decided, step,
+                             votes, night, night_actions, layouts)
+            return
+        leaf_votes = []
+        for seat in range(players):
+            choices = [("vote", p) for p in range(players) if p != seat]
+            leaf_votes.append(self._infoset(
+                ("vote", seat, deal[seat], seen[seat]), seat, choices,
+                decided[seat] or (-1, -1)))
+        votes.append(leaf_votes)
+        night.append([d[0] if d else -1 for d in decided])
+        night_actions.append([d[1] if d else 0 for d in decided])
+        cards = tuple(layout[:players])
+        index = self._layouts.get(cards)
+        if index is None:
+            index = len(self._layouts)
+            self._layouts[cards] = index
+        layouts.append(index)
+
+    def _compile_payoffs(self):
+        """
+        Tabulate who is eliminated by each voting profile, and each seat's
+        payoff for every final layout and set of eliminated seats.
+        """
+        players = self.players
+        seats = list(range(players))
+        profiles = list(itertools.product(seats, repeat=players))
+        # Row `players` is for a game without a hunter.
+        self.eliminations = numpy.zeros((players + 1, len(profiles)), dtype=numpy.intp)
+        for hunter in seats + [None]:
+            row = self.eliminations[players if hunter is None else hunter]
+            for n, profile in enumerate(profiles):
+                for seat in tally_votes(seats, dict(zip(seats, profile)), hunter):
+                    row[n] |= 1 << seat
+        layouts = sorted(self._layouts, key=self._layouts.get)
+        self.payoffs = numpy.zeros((len(layouts), 1 << players, players))
+        self.hunters = numpy.full(len(layouts), players, dtype=numpy.intp)
+        for index, cards in enumerate(layouts):
+            if WerewolfGame.CARD_HUNTER in cards:
+                self.hunters[index] = cards.index(WerewolfGame.CARD_HUNTER)
+            teams = [roles.registry.get_role(card).team for card in cards]
+            for mask in range(1 << players):
+                eliminated = [s for s in seats if mask & (1 << s)]
+                winning = WINNING_TEAMS[self._outcomes.winner(cards, eliminated)]
+                self.payoffs[index, mask] = [team in winning for team in teams]
+
+    def rows(self, deals=None):
+        """
+        Returns the leaves of the deals numbered `deals`, or of all of them.
+        """
+        if deals is None:
+            return numpy.arange(self.leaves)
+        deals = numpy.asarray(deals, dtype=numpy.intp)
+        starts = self.deal_starts[deals]
+        counts = self.deal_starts[deals + 1] - starts
+        offsets = numpy.repeat(starts - numpy.cumsum(counts) + counts, counts)
+        return offsets + numpy.arange(counts.sum())
+
+    def traverse(self, strategy, deals=None, chance=None):
+        """
+        Walk the leaves of `deals` (default all) with every information set
+        playing `strategy`, each deal weighted by `chance` (default
+        1/deals).
+
+        Returns (counterfactual values, values, visited): the counterfactual
+        value of each choice at each information set, each seat's expected
+        payoff, and which information sets were reached.
+        """
+        players = self.players
+        if chance is None:
+            chance = 1.0 / len(self.deals)
+        rows = self.rows(deals)
+        cfv = numpy.zeros_like(strategy)
+        values = numpy.zeros(players)
+        visited = numpy.zeros(self.infosets, dtype=bool)
+        vote_cfv = cfv[:, :players]
+        block = max(1, _BLOCK_VALUES // (players ** (players + 1)))
+        shape = (-1,) + (players,) * players
+        for start in range(0, len(rows), block):
+            leaves = rows[start:start + block]
+            votes = self.leaf_votes[leaves]
+            night = self.leaf_night[leaves]
+            actions = self.leaf_actions[leaves]
+            visited[votes] = True
+            visited[night[night >= 0]] = True
+            reach = numpy.where(night >= 0, strategy[night, actions], 1.0)
+            voting = strategy[votes][:, :, :players]
+            layouts = self.leaf_layouts[leaves]
+            payoffs = self.payoffs[
+                layouts[:, None], self.eliminations[self.hunters[layouts]]]
+            for seat in range(players):
+                others = [s for s in range(players) if s != seat]
+                weight = chance * reach[:, others].prod(axis=1)
+                # The seat's expected payoff for each vote it might cast.
+                tensor = numpy.moveaxis(payoffs[:, :, seat].reshape(shape), seat + 1, 1)
+                for other in reversed(others):
+                    tensor = numpy.einsum("l...k,lk->l...", tensor, voting[:, other])
+                value = (tensor * voting[:, seat]).sum(axis=1)
+                numpy.add.at(vote_cfv, votes[:, seat], weight[:, None] * tensor)
+                decided = night[:, seat] >= 0
+                numpy.add.at(
+                    cfv, (night[decided, seat], actions[decided, seat]),
+                    (weight * value)[decided])
+                values[seat] += (weight * reach[:, seat] * value).sum()
+        return cfv, values, visited
+
+    def best_responses(self, cfv):
+        """
+        Returns the expected payoff of each seat's best response, given the
+        counterfactual values from `traverse()`.
+        """
+        best = numpy.where(self.legal > 0, cfv, -numpy.inf).max(axis=1)
+        below = self.is_vote & (self.parent >= 0)
+        totals = numpy.zeros_like(cfv)
+        numpy.add.at(
+            totals, (self.parent[below], self.parent_action[below]), best[below])
+        night_best = numpy.where(self.legal > 0, totals, -numpy.inf).max(axis=1)
+        night = ~self.is_vote
+        top = self.is_vote & (self.parent < 0)
+        return (
+            numpy.bincount(self.owner[night], night_best[night], self.players)
+            + numpy.bincount(self.owner[top], best[top], self.players))
+
+
+def regret_matching(regrets, legal):
+    """
+    Returns the strategy that plays each legal choice in proportion to its
+    positive regret, or uniformly if none is positive.
+    """
+    positive = numpy.maximum(regrets, 0.0) * legal
+    totals = positive.sum(axis=1, keepdims=True)
+    uniform = legal / legal.sum(axis=1, keepdims=True)
+    return numpy.where(totals > 0, positive / numpy.where(totals > 0, totals, 1.0), uniform)
+
+
+_worker_tree = None
+
+def _init_worker(players, werewolf_count, deck_roles):
+    global _worker_tree
+    _worker_tree = GameTree(players, werewolf_count, deck_roles)
+
+def _traverse_worker(job):
+    strategy, deals, chance = job
+    return _worker_tree.traverse(strategy, deals, chance)
+
+
+class CFRSolver(object):
+    """
+    Counterfactual regret minimization over a `GameTree`.  With `plus`, uses
+    CFR+: regrets are floored at zero and later iterations count for more in
+    the average strategy.  With `sample`, each iteration walks that many
+    random deals instead of all of them.  With `workers` > 1, the deals are
+    split among worker processes, each of which compiles its own tree.
+    """
+
+    def __init__(self, players, werewolf_count=2, deck_roles=frozenset([
+            WerewolfGame.CARD_SEER, WerewolfGame.CARD_ROBBER, WerewolfGame.CARD_TROUBLEMAKER]),
+            plus=True, sample=None, workers=1, seed=None):
+        self.tree = GameTree(players, werewolf_count, deck_roles)
+        self.plus = plus
+        self.sample = sample
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.iterations = 0
+        shape = (self.tree.infosets, self.tree.actions)
+        self.regrets = numpy.zeros(shape)
+        self.strategy_sum = numpy.zeros(shape)
+        self._pool = None
+        if workers > 1:
+            self._pool = multiprocessing.Pool(
+                workers, _init_worker, (players, werewolf_count, deck_roles))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _traverse(self, strategy, deals=None, chance=None):
+        if deals is None:
+            deals = range(len(self.tree.deals))
+        deals = list(deals)
+        jobs = [(strategy, deals[n:n + _JOB_DEALS], chance)
+                for n in range(0, len(deals), _JOB_DEALS)]
+        if self._pool is None:
+            results = (self.tree.traverse(*job) for job in jobs)
+        else:
+            results = self._pool.imap(_traverse_worker, jobs)
+        cfv, values, visited = self.tree.traverse(strategy, [], chance)
+        for part_cfv, part_values, part_visited in results:
+            cfv += part_cfv
+            values += part_values
+            visited |= part_visited
+        return cfv, values, visited
+
+    def current_strategy(self):
+        return regret_matching(self.regrets, self.tree.legal)
+
+    def average_strategy(self):
+        legal = self.tree.legal
+        totals = self.strategy_sum.sum(axis=1, keepdims=True)
+        uniform = legal / legal.sum(axis=1, keepdims=True)
+        return numpy.where(
+            totals > 0, self.strategy_sum / numpy.where(totals > 0, totals, 1.0), uniform)
+
+    def iterate(self):
+        """
+        Run one iteration, updating every information set at once.
+        """
+        tree = self.tree
+        strategy = self.current_strategy()
+        deals = chance = None
+        if self.sample is not None and self.sample < len(tree.deals):
+            deals = self.rng.sample(range(len(tree.deals)), self.sample)
+            chance = 1.0 / self.sample
+        cfv, values, visited = self._traverse(strategy, deals, chance)
+        regrets = self.regrets + tree.legal * (
+            cfv - (strategy * cfv).sum(axis=1, keepdims=True))
+        if self.plus:
+            regrets = numpy.maximum(regrets, 0.0)
+        self.regrets = regrets
+        self.iterations += 1
+        # A seat's own reach: its night choice, if its vote follows one.
+        reach = numpy.ones(tree.infosets)
+        below = tree.parent >= 0
+        reach[below] = strategy[tree.parent[below], tree.parent_action[below]]
+        reach *= visited
+        weight = self.iterations if self.plus else 1
+        self.strategy_sum += weight * reach[:, None] * strategy
+
+    def exploitability(self):
+        """
+        Returns (NashConv, values) for the average strategy: the total of
+        what each seat could gain by switching to a best response, and each
+        seat's expected payoff.
+        """
+        cfv, values, visited = self._traverse(self.average_strategy())
+        gains = self.tree.best_responses(cfv) - values
+        return max(0.0, gains.sum()), values
+
+    def run(self, iterations, report_every=1):
+        """
+        Run `iterations` iterations.  Yields (iteration, NashConv, values,
+        elapsed seconds) every `report_every` iterations and after the last.
+        """
+        start = time.time()
+        for n in range(1, iterations + 1):
+            self.iterate()
+            if n % report_every == 0 or n == iterations:
+                elapsed = time.time() - start
+                nashconv, values = self.exploitability()
+                yield n, nashconv, values, elapsed
+
+    def night_summary(self):
+        """
+        Returns {role tag: {kind of choice: probability}} for the average
+        strategy's night choices, averaged over the seats.
+        """
+        tree = self.tree
+        strategy = self.average_strategy()
+        summary = {}
+        counts = {}
+        for infoset, key in enumerate(tree.keys):
+            if key[0] != "night":
+                continue
+            tag = roles.registry.get_role(key[2]).tag
+            kinds = summary.setdefault(tag, {})
+            counts[tag] = counts.get(tag, 0) + 1
+            for action, choice in enumerate(tree.choices[infoset]):
+                kinds[choice[0]] = kinds.get(choice[0], 0.0) + strategy[infoset, action]
+        for tag, kinds in summary.items():
+            for kind in kinds:
+                kinds[kind] /= counts[tag]
+        return summary
+
+    def strategy_table(self):
+        """
+        Yields (information set key, [(choice label, probability)]) for the
+        average strategy.
+        """
+        strategy = self.average_strategy()
+        for infoset, key in enumerate(self.tree.keys):
+            choices = self.tree.choices[infoset]
+            if key[0] == "vote":
+                columns = [choice[1] for choice in choices]
+            else:
+                columns = range(len(choices))
+            yield key, [(describe_choice(choice), strategy[infoset, column])
+                        for choice, column in zip(choices, columns)]
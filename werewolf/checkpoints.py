@@ -0,0 +1,226 @@
+from __future__ import print_function
+import json
+import numbers
+import os
+import random
+import time
+import attr
+from werewolf.instrumentation import Histogram
+
+
+class CheckpointMismatch(Exception):
+    """
+    A checkpoint belongs to a run with a different configuration.
+    """
+
+
+class InvalidCheckpoint(Exception):
+    """
+    A checkpoint file is not a valid saved `ShardState`.
+    """
+
+
+def write_atomically(path, data):
+    """
+    Replace the file at `path` with `data` (bytes) so that a crash leaves
+    either the old or the new contents.
+    """
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, path)
+
+
+@attr.attrs(slots=True)
+class ShardState(object):
+    """
+    The progress of a simulation shard: the number of games played, the
+    random number generator's state after them, and what they added up to.
+    `result_rows` is the number of rows in the shard's result store.
+    """
+    games = attr.attrib()
+    rng_state = attr.attrib()
+    winners = attr.attrib()
+    histograms = attr.attrib(default=None)
+    result_rows = attr.attrib(default=None)
+    complete = attr.attrib(default=False)
+
+
+CHECKPOINT_VERSION = 1
+
+
+def encode_state(state):
+    """
+    Return a `ShardState` as JSON bytes.
+    """
+    histograms = None
+    if state.histograms is not None:
+        histograms = dict(
+            (phase, {
+                "bounds": list(h.bounds),
+                "counts": h.counts,
+                "count": h.count,
+                "sum": h.sum})
+            for phase, h in state.histograms.items())
+    version, internal_state, gauss_next = state.rng_state
+    return json.dumps({
+        "version": CHECKPOINT_VERSION,
+        "games": state.games,
+        "rng_state": [version, list(internal_state), gauss_next],
+        "winners": dict((str(code), count) for code, count in state.winners.items()),
+        "histograms": histograms,
+        "result_rows": state.result_rows,
+        "complete": state.complete,
+    }, sort_keys=True).encode("utf-8")
+
+
+def _check(valid, message):
+    if not valid:
+        raise InvalidCheckpoint(message)
+
+
+def _is_count(value):
+    return isinstance(value, numbers.Integral) and not isinstance(value, bool) and value >= 0
+
+
+def decode_state(data):
+    """
+    Return the `ShardState` saved by `encode_state()` in `data`.  Raises
+    `InvalidCheckpoint` if any field is missing or invalid.
+    """
+    try:
+        saved = json.loads(data.decode("utf-8"))
+    except ValueError as ex:
+        raise InvalidCheckpoint("The checkpoint is not JSON: {}".format(ex))
+    _check(isinstance(saved, dict), "The checkpoint is not an object.")
+    _check(saved.get("version") == CHECKPOINT_VERSION,
+           "Unknown checkpoint version {!r}.".format(saved.get("version")))
+    games = saved.get("games")
+    _check(_is_count(games), "Invalid game count {!r}.".format(games))
+    rng_state = saved.get("rng_state")
+    _check(isinstance(rng_state, list) and len(rng_state) == 3
+           and isinstance(rng_state[1], list)
+           and (rng_state[2] is None or isinstance(rng_state[2], numbers.Real)),
+           "Invalid random number generator state.")
+    rng_state = (rng_state[0], tuple(rng_state[1]), rng_state[2])
+    try:
+        random.Random().setstate(rng_state)
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidCheckpoint("Invalid random number generator state.")
+    winners = saved.get("winners")
+    _check(isinstance(winners, dict), "Invalid winners.")
+    try:
+        winners = dict((int(code), count) for code, count in winners.items())
+    except ValueError:
+        raise InvalidCheckpoint("Invalid winner code.")
+    _check(all(_is_count(count) for count in winners.values()), "Invalid winner count.")
+    histograms = saved.get("histograms")
+    if histograms is not None:
+        _check(isinstance(histograms, dict), "Invalid histograms.")
+        histograms = dict(
+            (phase, _decode_histogram(h)) for phase, h in histograms.items())
+    result_rows = saved.get("result_rows")
+    _check(result_rows is None or _is_count(result_rows),
+           "Invalid result row count {!r}.".format(result_rows))
+    complete = saved.get("complete")
+    _check(isinstance(complete, bool), "Invalid completion flag {!r}.".format(complete))
+    return ShardState(
+        games=games,
+        rng_state=rng_state,
+        winners=winners,
+        histograms=histograms,
+        result_rows=result_rows,
+        complete=complete)
+
+
+def _decode_histogram(saved):
+    _check(isinstance(saved, dict), "Invalid histogram.")
+    bounds = saved.get("bounds")
+    counts = saved.get("counts")
+    _check(isinstance(bounds, list) and isinstance(counts, list)
+           and len(counts) == len(bounds) + 1
+           and all(isinstance(b, numbers.Real) for b in bounds)
+           and all(_is_count(c) for c in counts), "Invalid histogram buckets.")
+    histogram = Histogram(tuple(bounds))
+    histogram.counts = counts
+    histogram.count = saved.get("count")
+    histogram.sum = saved.get("sum")
+    _check(histogram.count == sum(counts), "Invalid histogram count.")
+    _check(isinstance(histogram.sum, numbers.Real), "Invalid histogram sum.")
+    return histogram
+
+
+class ShardCheckpoint(object):
+    """
+    Saves a simulation shard's `ShardState` to `path`, as JSON, at most
+    every `interval` seconds.
+    """
+
+    def __init__(self, path, interval=60.0, clock=time.time):
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self._next = clock() + interval
+
+    def load(self):
+        """
+        Returns the saved `ShardState`, or None if there is none.  Raises
+        `InvalidCheckpoint` if the file is not a valid checkpoint.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        return decode_state(data)
+
+    def due(self):
+        return self.clock() >= self._next
+
+    def save(self, state):
+        write_atomically(self.path, encode_state(state))
+        self._next = self.clock() + self.interval
+
+
+class CheckpointDir(object):
+    """
+    A directory holding the checkpoints of a run's shards, and the run's
+    configuration so a resumed run can be checked against it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, "run.json")
+
+    def resume(self, config):
+        """
+        Returns the settings of the run saved in the directory, or None if
+        there is none.  Raises `CheckpointMismatch` if a setting in the dict
+        `config` that is not None differs from the saved run's.
+        """
+        try:
+            with open(self.manifest_path) as f:
+                saved = json.load(f)
+        except (IOError, OSError):
+            return None
+        for key, value in config.items():
+            if value is not None and saved.get(key) != value:
+                raise CheckpointMismatch(
+                    "The run in {} has {} = {}, not {}.".format(
+                        self.path, key, saved.get(key), value))
+        return saved
+
+    def start(self, config):
+        """
+        Save the settings of a new run.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        write_atomically(
+            self.manifest_path, json.dumps(config, sort_keys=True).encode("utf-8"))
+
+    def shard(self, index, interval=60.0):
+        return ShardCheckpoint(
+            os.path.join(self.path, "shard-{}.ckpt".format(index)), interval)
@@ -0,0 +1,101 @@
+from __future__ import print_function
+import collections
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class TableExecutor(object):
+    """
+    Runs the inputs to a `TableManager`'s tables on a pool of `threads`
+    threads.  Each table's inputs run one at a time, in the order they were
+    submitted, so every game has a single writer while different tables'
+    games run in parallel.
+
+    A table with queued inputs holds a pool thread for at most `batch`
+    inputs before going to the back of the pool's queue, so a busy table
+    doesn't starve the others.
+    """
+
+    def __init__(self, manager, threads=4, batch=16):
+        self.manager = manager
+        self.threads = threads
+        self.batch = batch
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="werewolf-table")
+        # The queues of the tables with inputs waiting or running.
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+
+    def send(self, table_id, input_name, *args, **kwargs):
+        """
+        Queue an input to a table's game.  Returns a
+        `concurrent.futures.Future` for the game's response.
+        """
+        return self.call(table_id, self.manager.send, table_id, input_name, *args, **kwargs)
+
+    def call(self, table_id, fn, *args, **kwargs):
+        """
+        Queue `fn(*args, **kwargs)` to run in order with the inputs to
+        table `table_id`.  Returns a `concurrent.futures.Future` for its
+        result.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The executor has been shut down.")
+            queue = self._queues.get(table_id)
+            scheduled = queue is not None
+            if not scheduled:
+                queue = self._queues[table_id] = collections.deque()
+            queue.append((future, fn, args, kwargs))
+        if not scheduled:
+            self._pool.submit(self._run, table_id, queue)
+        return future
+
+    @property
+    def pending(self):
+        """
+        The number of calls queued or running.
+        """
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _run(self, table_id, queue):
+        for n in range(self.batch):
+            # The call stays queued while it runs, so later calls to the
+            # table wait for it.
+            future, fn, args, kwargs = queue[0]
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as ex:
+                    future.set_exception(ex)
+                else:
+                    future.set_result(result)
+            with self._lock:
+                queue.popleft()
+                if not queue:
+                    del self._queues[table_id]
+                    if not self._queues:
+                        self._idle.notify_all()
+                    return
+        self._pool.submit(self._run, table_id, queue)
+
+    def join(self):
+        """
+        Wait until every queued call has run.
+        """
+        with self._lock:
+            while self._queues:
+                self._idle.wait()
+
+    def shutdown(self):
+        """
+        Stop accepting calls, and wait for the queued calls to run and the
+        threads to exit.
+        """
+        with self._lock:
+            self._closed = True
+        self.join()
+        self._pool.shutdown()
@@ -0,0 +1,280 @@
+from __future__ import division, print_function
+import importlib
+import math
+import multiprocessing
+import random
+import time
+import attr
+import numpy
+from werewolf.werewolf import WerewolfGame
+
+
+class NaiveShuffle(random.Random):
+    """
+    A deliberately biased shuffle that swaps each card with a card anywhere
+    in the deck, for checking that the fairness tests notice bias.
+    """
+
+    def shuffle(self, x):
+        n = len(x)
+        for i in range(n):
+            j = self.randrange(n)
+            x[i], x[j] = x[j], x[i]
+
+
+# Random number generators the engine can shuffle with, by name.  Each is
+# made from a seed, or None to seed from the operating system.
+BACKENDS = {
+    "random": random.Random,
+    "system": lambda seed: random.SystemRandom(),
+    "numpy": lambda seed: numpy.random.default_rng(seed),
+    "numpy-legacy": lambda seed: numpy.random.RandomState(seed),
+    "naive": NaiveShuffle,
+}
+
+
+def make_rng(backend, seed=None):
+    """
+    Returns a random number generator from `BACKENDS`, or from a factory
+    named "module:attribute" that takes a seed.
+    """
+    if backend in BACKENDS:
+        return BACKENDS[backend](seed)
+    module_name, sep, name = backend.partition(":")
+    if not sep:
+        raise ValueError("Unknown random number generator '{}'.".format(backend))
+    return getattr(importlib.import_module(module_name), name)(seed)
+
+
+def deal_batch(rng, deck, size):
+    """
+    Returns a (size, len(deck)) array of deals, each shuffled from `deck`
+    with `rng` as `WerewolfGame._map_cards()` does: the players' cards in
+    seat order, then the table cards.  NumPy generators shuffle the whole
+    batch at once.
+    """
+    permuted = getattr(rng, "permuted", None)
+    if permuted is not None:
+        return permuted(numpy.tile(numpy.array(deck, dtype=numpy.int8), (size, 1)), axis=1)
+    shuffle = rng.shuffle
+    cards = []
+    for n in range(size):
+        deal = list(deck)
+        shuffle(deal)
+        cards.extend(deal)
+    return numpy.array(cards, dtype=numpy.int8).reshape(size, len(deck))
+
+
+def engine_deal_batch(rng, players, werewolf_count, roles, size):
+    """
+    Returns a (size, players + 3) array of deals made by the engine.
+    """
+    seats = list(range(players))
+    cards = []
+    for n in range(size):
+        game = WerewolfGame(rng, read_only_views=True)
+        game.add_players(seats)
+        game.deal_cards(werewolf_count, roles)
+        player_cards = game.query_player_cards()
+        cards.extend(player_cards[seat] for seat in seats)
+        cards.extend(game.query_table_cards())
+    return numpy.array(cards, dtype=numpy.int8).reshape(size, players + 3)
+
+
+class DealCounts(object):
+    """
+    Running counts of how often each position in the deal (the seats, then
+    the table) got each card, and each pair of positions each pair of
+    cards.  Deals are counted a batch at a time into preallocated arrays.
+    """
+
+    def __init__(self, positions, cards):
+        self.positions = positions
+        self.cards = cards
+        self.deals = 0
+        self.position_cards = numpy.zeros((positions, cards), dtype=numpy.int64)
+        self.pair_positions = numpy.array(numpy.triu_indices(positions, 1)).T
+        self.pair_cards = numpy.zeros(
+            (len(self.pair_positions), cards, cards), dtype=numpy.int64)
+        self._position_offsets = numpy.arange(positions, dtype=numpy.int32) * cards
+        self._pair_offsets = numpy.arange(
+            len(self.pair_positions), dtype=numpy.int32) * cards * cards
+
+    def add(self, deals):
+        cards = self.cards
+        deals = deals.astype(numpy.int32)
+        codes = deals + self._position_offsets
+        self.position_cards += numpy.bincount(
+            codes.ravel(), minlength=self.position_cards.size).reshape(
+                self.position_cards.shape)
+        first, second = self.pair_positions.T
+        codes = deals[:, first] * cards + deals[:, second] + self._pair_offsets
+        self.pair_cards += numpy.bincount(
+            codes.ravel(), minlength=self.pair_cards.size).reshape(self.pair_cards.shape)
+        self.deals += len(deals)
+
+    def merge(self, other):
+        self.position_cards += other.position_cards
+        self.pair_cards += other.pair_cards
+        self.deals += other.deals
+
+
+def chi_square_sf(statistic, df):
+    """
+    Returns the probability that a chi-square variable with `df` degrees
+    of freedom is at least `statistic`.
+    """
+    if statistic <= 0:
+        return 1.0
+    a = df / 2.0
+    x = statistic / 2.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # Series for the lower incomplete gamma function.
+        term = total = 1.0 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+    # Continued fraction for the upper incomplete gamma function.
+    tiny = 1e-300
+    b = x + 1.0 - a
+    c = 1.0 / tiny
+    d = 1.0 / b
+    h = d
+    for n in range(1, 10000):
+        an = -n * (n - a)
+        b += 2.0
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-15:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+
+def chi_square(observed, expected):
+    """
+    Returns (statistic, degrees of freedom, p-value) for Pearson's test of
+    `observed` counts against `expected` ones.  Cells expected to be empty
+    must be.
+    """
+    observed = numpy.asarray(observed, dtype=float).ravel()
+    expected = numpy.asarray(expected, dtype=float).ravel()
+    cells = expected > 0
+    if observed[~cells].any():
+        return float("inf"), int(cells.sum()) - 1, 0.0
+    diff = observed[cells] - expected[cells]
+    statistic = float((diff * diff / expected[cells]).sum())
+    df = int(cells.sum()) - 1
+    return statistic, df, chi_square_sf(statistic, df)
+
+
+@attr.attrs(slots=True)
+class FamilyResult(object):
+    """
+    The results of a family of chi-square tests, such as one per seat.
+    `worst` is the (name, statistic, df, p-value) of the test with the
+    smallest p-value, and `p_value` that p-value with a Bonferroni
+    correction for the number of tests.
+    """
+    name = attr.attrib()
+    tests = attr.attrib()
+    worst = attr.attrib()
+    p_value = attr.attrib()
+
+
+def _family(name, results):
+    worst = min(results, key=lambda r: r[3])
+    return FamilyResult(
+        name=name,
+        tests=len(results),
+        worst=worst,
+        p_value=min(1.0, worst[3] * len(results)))
+
+
+def test_fairness(counts, deck, players):
+    """
+    Test the counts from `DealCounts` against a fair shuffle of `deck`,
+    under which each position is equally likely to get each card.  Returns
+    a list of `FamilyResult` for the seats, the table and pairs of
+    positions.
+    """
+    size = len(deck)
+    frequency = numpy.bincount(deck, minlength=counts.cards).astype(float)
+    single = frequency / size
+    pair = (numpy.outer(frequency, frequency) - numpy.diag(frequency)) / (size * (size - 1))
+    n = counts.deals
+
+    def position_name(position):
+        if position < players:
+            return "seat {}".format(position)
+        return "table {}".format(position - players)
+
+    singles = []
+    for position in range(counts.positions):
+        statistic, df, p = chi_square(counts.position_cards[position], n * single)
+        singles.append((position_name(position), statistic, df, p))
+    pairs = []
+    for index, (first, second) in enumerate(counts.pair_positions):
+        statistic, df, p = chi_square(counts.pair_cards[index], n * pair)
+        pairs.append(("{} & {}".format(position_name(first), position_name(second)),
+                      statistic, df, p))
+    return [
+        _family("seat by card", singles[:players]),
+        _family("table by card", singles[players:]),
+        _family("pairs of positions", pairs),
+    ]
+
+
+def _count_deals(job):
+    backend, seed, count, players, werewolf_count, roles, engine, batch = job
+    rng = make_rng(backend, seed)
+    deck = WerewolfGame.build_deck(players, werewolf_count, roles)
+    counts = DealCounts(len(deck), max(deck) + 1)
+    while count > 0:
+        size = min(batch, count)
+        if engine:
+            deals = engine_deal_batch(rng, players, werewolf_count, roles, size)
+        else:
+            deals = deal_batch(rng, deck, size)
+        counts.add(deals)
+        count -= size
+    return counts
+
+
+def count_deals(deals, players, werewolf_count=2, roles=frozenset([
+        WerewolfGame.CARD_SEER, WerewolfGame.CARD_ROBBER, WerewolfGame.CARD_TROUBLEMAKER]),
+        backend="random", seed=None, workers=1, engine=False, batch=100000):
+    """
+    Deal `deals` games, split among `workers` processes each with its own
+    random number generator, and returns (`DealCounts`, seconds).  With
+    `engine`, each deal is made by a `WerewolfGame`; otherwise decks are
+    shuffled in batches the same way.
+    """
+    jobs = []
+    for n in range(workers):
+        count = deals // workers
+        if n < deals % workers:
+            count += 1
+        worker_seed = None if seed is None else seed + n
+        jobs.append((backend, worker_seed, count, players, werewolf_count,
+                     frozenset(roles), engine, batch))
+    start = time.time()
+    if workers == 1:
+        results = [_count_deals(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.map(_count_deals, jobs, chunksize=1)
+        pool.close()
+        pool.join()
+    counts = results[0]
+    for other in results[1:]:
+        counts.merge(other)
+    return counts, time.time() - start
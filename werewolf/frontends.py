@@ -0,0 +1,362 @@
+from __future__ import print_function
+import abc
+import textwrap
+import six
+from werewolf.instrumentation import clock
+
+try:
+    from curses import KEY_ENTER
+    ENTER_KEYS = (KEY_ENTER, 10, 13)
+except ImportError:
+    # Without curses only the headless frontend can be used.
+    ENTER_KEYS = (10, 13)
+
+DEFAULT_KEY_MESSAGE = "= PRESS A KEY ="
+DEFAULT_COUNTDOWN_MESSAGE = "= {} left, PRESS A KEY ="
+
+# Wrapped lines keyed by (message, width).
+_layouts = {}
+_MAX_LAYOUTS = 1024
+
+
+class ScriptExhausted(Exception):
+    """
+    A headless frontend ran out of scripted keys.
+    """
+
+
+def layout_text(msg, width):
+    """
+    Wrap each paragraph of `msg` to `width` columns.  Returns a tuple of
+    lines.
+    """
+    key = (msg, width)
+    lines = _layouts.get(key)
+    if lines is None:
+        lines = []
+        for para in msg.split('\n'):
+            lines.extend(textwrap.wrap(para, width, drop_whitespace=False))
+        lines = tuple(lines)
+        if len(_layouts) >= _MAX_LAYOUTS:
+            _layouts.clear()
+        _layouts[key] = lines
+    return lines
+
+
+def format_remaining(seconds):
+    """
+    Format a number of seconds left as M:SS, rounding up.
+    """
+    seconds = max(0, int(-(-seconds // 1)))
+    return "{}:{:02d}".format(seconds // 60, seconds % 60)
+
+
+def dialog_layout(msg, title, key_message, screen_h, screen_w):
+    """
+    Lay out a dialog centered on a screen of `screen_h` rows and `screen_w`
+    columns.  Returns ((height, width, y, x), rows) where `rows` holds a
+    (kind, text) pair for every row of the dialog.  `kind` is "title" for
+    the top border, "keys" for the key message or "text".
+    """
+    dialog_w = int(screen_w * 0.67)
+    lines = layout_text(msg, dialog_w - 4)
+    max_width = max(len(l) for l in lines)
+    if key_message is not None:
+        max_width = max(max_width, len(key_message))
+    dialog_w = min(max_width + 4, dialog_w)
+    dialog_h = len(lines) + 5
+    dialog_h = min(screen_h, dialog_h)
+    dialog_w = min(screen_w, dialog_w)
+    x = int((screen_w - dialog_w) / 2)
+    y = int((screen_h - dialog_h) / 2)
+    rows = [("title", title), ("text", "")]
+    for n in range(2, dialog_h - 2):
+        line = ""
+        if n - 2 < len(lines):
+            line = lines[n - 2]
+        rows.append(("text", line))
+    if key_message is None:
+        rows.append(("text", ""))
+    else:
+        rows.append(("keys", key_message))
+    return (dialog_h, dialog_w, y, x), rows
+
+
+@six.add_metaclass(abc.ABCMeta)
+class Frontend(object):
+    """
+    The interface the game uses to talk to the players.
+    """
+
+    @abc.abstractmethod
+    def show_title(self, title):
+        """
+        Show the title of the game.
+        """
+
+    @abc.abstractmethod
+    def prompt(self, msg, title=None, keys=None, key_message=DEFAULT_KEY_MESSAGE):
+        """
+        Display a message and wait for a key in `keys`, or for any key if
+        `keys` is None.  Returns the key code.
+        """
+
+    @abc.abstractmethod
+    def countdown(self, msg, seconds, title=None,
+                  key_message=DEFAULT_COUNTDOWN_MESSAGE):
+        """
+        Display a message with a timer counting down from `seconds` and wait
+        for any key.  `key_message` is formatted with the time left.
+        Returns the key code, or None if the time runs out.
+        """
+
+
+class Dialog(object):
+    """
+    The curses window messages are displayed in.  The window is reused for
+    every message, and only the rows that differ from the previous message
+    are redrawn, so little is written to the terminal between prompts.
+    """
+
+    def __init__(self, stdscr):
+        import curses
+        self.curses = curses
+        self.stdscr = stdscr
+        self.win = None
+        self._geometry = None
+        # What is currently drawn on each row of the window.
+        self._rows = {}
+
+    def show(self, msg, title=None, key_message=None):
+        h, w = self.stdscr.getmaxyx()
+        geometry, rows = dialog_layout(msg, title, key_message, h, w)
+        self._place(*geometry)
+        draw = {
+            "title": self._draw_title,
+            "text": self._draw_line,
+            "keys": self._draw_key_message,
+        }
+        for n, content in enumerate(rows):
+            if self._rows.get(n) != content:
+                draw[content[0]](n, content[1])
+                self._rows[n] = content
+        self.win.noutrefresh()
+        self.curses.doupdate()
+
+    def resized(self):
+        """
+        Drop the window after the screen is resized.  The next `show()`
+        makes a new one that fits the new screen.
+        """
+        self.win = None
+        self._geometry = None
+        self._rows = {}
+
+    def _place(self, h, w, y, x):
+        """
+        Size and position the window, blanking the area it used to cover if
+        it moves.
+        """
+        # The screen may have shrunk since the layout was made.
+        screen_h, screen_w = self.stdscr.getmaxyx()
+        h = max(1, min(h, screen_h))
+        w = max(1, min(w, screen_w))
+        y = max(0, min(y, screen_h - h))
+        x = max(0, min(x, screen_w - w))
+        geometry = (h, w, y, x)
+        if geometry == self._geometry:
+            return
+        win = self.win
+        if win is None:
+            win = self.curses.newwin(h, w, y, x)
+            self.win = win
+        else:
+            win.erase()
+            win.noutrefresh()
+            # The old size always fits at the origin, and the new size
+            # always fits at its own position.
+            win.mvwin(0, 0)
+            win.resize(h, w)
+            win.mvwin(y, x)
+        win.erase()
+        win.border()
+        self._geometry = geometry
+        self._rows = {}
+
+    def _draw_line(self, n, line):
+        w = self._geometry[1]
+        self.win.addstr(n, 2, line[:w - 4].ljust(w - 4))
+
+    def _draw_title(self, n, title):
+        win = self.win
+        w = self._geometry[1]
+        win.hline(0, 1, self.curses.ACS_HLINE, w - 2)
+        if title is not None:
+            title_x = int((w - len(title)) / 2)
+            win.addstr(0, title_x, title, self.curses.A_STANDOUT)
+
+    def _draw_key_message(self, n, key_message):
+        w = self._geometry[1]
+        self._draw_line(n, "")
+        press_x = int((w - len(key_message)) / 2)
+        self.win.addstr(n, press_x, key_message, self.curses.A_BOLD)
+
+
+class CursesFrontend(Frontend):
+    """
+    Plays the game on a curses screen.
+    """
+
+    def __init__(self, stdscr, clock=clock):
+        import curses
+        self.curses = curses
+        self.stdscr = stdscr
+        self.clock = clock
+        self.dialog = Dialog(stdscr)
+        self._title = None
+
+    def show_title(self, title):
+        self._title = title
+        stdscr = self.stdscr
+        h, w = stdscr.getmaxyx()
+        stdscr.border()
+        x = int(((w-2) - len(title)) / 2)
+        stdscr.addstr(1, x, title, self.curses.A_REVERSE)
+        stdscr.refresh()
+
+    def prompt(self, msg, title=None, keys=None, key_message=DEFAULT_KEY_MESSAGE):
+        self.dialog.show(msg, title, key_message)
+        if keys is not None:
+            keys = set(keys)
+        while True:
+            c = self.stdscr.getch(1, 0)
+            if c == self.curses.KEY_RESIZE:
+                self._resized()
+                self.dialog.show(msg, title, key_message)
+                continue
+            if keys is None:
+                break
+            if c in keys:
+                break
+        return c
+
+    def countdown(self, msg, seconds, title=None,
+                  key_message=DEFAULT_COUNTDOWN_MESSAGE):
+        stdscr = self.stdscr
+        deadline = self.clock() + seconds
+        try:
+            while True:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return None
+                self.dialog.show(
+                    msg, title, key_message.format(format_remaining(remaining)))
+                # Sleep in getch() until a key is pressed or the displayed
+                # time needs to change, so waiting costs no CPU.
+                tick = remaining - (-(-remaining // 1) - 1)
+                stdscr.timeout(max(1, int(tick * 1000)))
+                c = stdscr.getch(1, 0)
+                if c == self.curses.KEY_RESIZE:
+                    self._resized()
+                elif c != -1:
+                    return c
+        finally:
+            stdscr.timeout(-1)
+
+    def _resized(self):
+        """
+        Redraw the screen after it is resized, fitting the dialog to the new
+        size.
+        """
+        self.stdscr.erase()
+        if self._title is not None:
+            self.show_title(self._title)
+        self.dialog.resized()
+
+
+class HeadlessFrontend(Frontend):
+    """
+    Plays the game without a terminal.
+
+    Keys are taken from `script`, a sequence of key codes or a string,
+    skipping any key the current prompt does not accept, just as a player's
+    extra keypresses are ignored.  A None in the script lets a countdown
+    run out.  Once the script runs out, `chooser(screen, keys)` is called
+    for each prompt if it is given; it is passed the rendered screen and
+    the keys the prompt accepts (None for any key) and returns a key, or
+    None to let a countdown run out.  Otherwise `ScriptExhausted` is
+    raised.  Countdowns end immediately; no time passes headless.
+
+    If `capture` is set, every rendered prompt is appended to `screens`.
+    """
+
+    def __init__(self, script=(), chooser=None, height=24, width=80, capture=True):
+        if isinstance(script, str):
+            script = [ord(c) for c in script]
+        self._script = iter(script)
+        self.chooser = chooser
+        self.height = height
+        self.width = width
+        self.capture = capture
+        self.screens = []
+        self.title = None
+
+    def show_title(self, title):
+        self.title = title
+
+    def render(self, msg, title=None, key_message=None):
+        """
+        Return the dialog for a message drawn as text.
+        """
+        (h, w, y, x), rows = dialog_layout(
+            msg, title, key_message, self.height, self.width)
+        lines = []
+        for kind, text in rows:
+            if kind == "title":
+                border = "-" * (w - 2)
+                if text is not None:
+                    title_x = int((w - len(text)) / 2) - 1
+                    border = border[:title_x] + text + border[title_x + len(text):]
+                lines.append("+{}+".format(border))
+            elif kind == "keys":
+                lines.append("|{}|".format(text.center(w - 2)))
+            else:
+                lines.append("| {} |".format(text[:w - 4].ljust(w - 4)))
+        lines.append("+{}+".format("-" * (w - 2)))
+        return '\n'.join(lines)
+
+    def prompt(self, msg, title=None, keys=None, key_message=DEFAULT_KEY_MESSAGE):
+        screen = None
+        if self.capture or self.chooser is not None:
+            screen = self.render(msg, title, key_message)
+            if self.capture:
+                self.screens.append(screen)
+        if keys is not None:
+            keys = set(keys)
+        return self._next_key(msg, screen, keys, False)
+
+    def countdown(self, msg, seconds, title=None,
+                  key_message=DEFAULT_COUNTDOWN_MESSAGE):
+        key_message = key_message.format(format_remaining(seconds))
+        screen = None
+        if self.capture or self.chooser is not None:
+            screen = self.render(msg, title, key_message)
+            if self.capture:
+                self.screens.append(screen)
+        return self._next_key(msg, screen, None, True)
+
+    def _next_key(self, msg, screen, keys, timeout_allowed):
+        for c in self._script:
+            if c is None:
+                if timeout_allowed:
+                    return None
+            elif keys is None or c in keys:
+                return c
+        if self.chooser is None:
+            raise ScriptExhausted(msg)
+        c = self.chooser(screen, keys)
+        if c is None and timeout_allowed:
+            return c
+        if c is None or (keys is not None and c not in keys):
+            raise Exception("Key {} is not accepted by the prompt.".format(c))
+        return c
@@ -0,0 +1,345 @@
+from __future__ import print_function
+import collections
+import random
+import time
+import attr
+from automat import NoTransition
+from werewolf import roles
+from werewolf.werewolf import WerewolfGame
+
+PLAYER_NAMES = [
+    "alice", "bob", "carol", "dave", "erin",
+    "frank", "grace", "heidi", "ivan", "judy",
+]
+BOGUS_PLAYER = "mallory"
+
+# Every public input and the kinds of arguments it takes.
+INPUTS = {
+    "add_players": ("players",),
+    "deal_cards": ("werewolf_count", "roles"),
+    "query_cards": (),
+    "query_player_cards": (),
+    "query_table_cards": (),
+    "advance_phase": (),
+    "query_phase": (),
+    "query_active_role": (),
+    "is_role_active": (),
+    "is_player_active": ("player",),
+    "identify_werewolves": (),
+    "seer_view_player_card": ("player",),
+    "seer_view_table_cards": ("position", "position"),
+    "robber_steal_card": ("player",),
+    "troublemaker_switch_cards": ("player", "player"),
+    "insomniac_view_card": (),
+    "query_hunter": (),
+    "eliminate_players": ("eliminated",),
+    "query_post_game_results": (),
+}
+INPUT_NAMES = sorted(INPUTS)
+
+# Cards that may appear at most once in a deck.
+UNIQUE_CARDS = frozenset(
+    r.card for r in roles.registry.roles()
+    if r.card not in (WerewolfGame.CARD_WEREWOLF, WerewolfGame.CARD_VILLAGER))
+
+
+@attr.attrs(frozen=True)
+class Step(object):
+    """
+    A single input fired at the game.  `well_formed` is False if the
+    arguments were deliberately chosen to be invalid.
+    """
+    input = attr.attrib()
+    args = attr.attrib()
+    well_formed = attr.attrib(default=True)
+
+
+@attr.attrs(frozen=True)
+class Failure(object):
+    """
+    An invariant violation found at step `index` of a sequence.
+    """
+    index = attr.attrib()
+    kind = attr.attrib()
+    message = attr.attrib()
+
+
+class InvariantError(Exception):
+    """
+    An invariant of the game state does not hold.
+    """
+
+    def __init__(self, kind, message):
+        Exception.__init__(self, message)
+        self.kind = kind
+
+
+class StepGenerator(object):
+    """
+    Generates random steps for a game.  Most steps are inputs the game
+    accepts in its current state; the rest are chosen from all inputs.
+    """
+
+    def __init__(self, rng, valid_ratio=0.8, malformed_ratio=0.05):
+        self.rng = rng
+        self.valid_ratio = valid_ratio
+        self.malformed_ratio = malformed_ratio
+
+    def next_step(self, game):
+        rng = self.rng
+        self.players = getattr(game, "_players", PLAYER_NAMES[:3])
+        allowed = game.allowed_inputs()
+        if allowed and rng.random() < self.valid_ratio:
+            name = rng.choice(sorted(allowed))
+        else:
+            name = rng.choice(INPUT_NAMES)
+        well_formed = rng.random() >= self.malformed_ratio
+        args = tuple(
+            self._make_arg(kind, well_formed) for kind in INPUTS[name])
+        return Step(name, args, well_formed or len(args) == 0)
+
+    def _make_arg(self, kind, well_formed):
+        rng = self.rng
+        players = self.players
+        if kind == "players":
+            count = rng.randint(3, len(PLAYER_NAMES))
+            return tuple(PLAYER_NAMES[:count])
+        if kind == "werewolf_count":
+            return rng.randint(0, 3)
+        if kind == "roles":
+            return frozenset(c for c in UNIQUE_CARDS if rng.random() < 0.5)
+        if kind == "player":
+            if not well_formed:
+                return BOGUS_PLAYER
+            return rng.choice(players)
+        if kind == "position":
+            if not well_formed:
+                return 3
+            return rng.randint(0, 2)
+        if kind == "eliminated":
+            eliminated = [p for p in players if rng.random() < 0.2]
+            if not well_formed:
+                eliminated.append(BOGUS_PLAYER)
+            return eliminated
+        raise Exception("Unknown argument kind, {}".format(kind))
+
+
+def check_invariants(game, eliminated):
+    """
+    Check the invariants of the game state.  Raises `InvariantError`.
+    """
+    if not hasattr(game, "_player_cards"):
+        return
+    player_cards = game._player_cards
+    new_player_cards = game._new_player_cards
+    table_cards = game._table_cards
+    new_table_cards = game._new_table_cards
+    if set(player_cards) != set(game._players):
+        raise InvariantError(
+            "deal", "Dealt cards do not match the players.")
+    if set(new_player_cards) != set(player_cards):
+        raise InvariantError(
+            "players", "Players changed after the deal: {!r}".format(
+                sorted(new_player_cards, key=repr)))
+    if len(table_cards) != 3 or len(new_table_cards) != 3:
+        raise InvariantError("table", "There must be 3 table cards.")
+    dealt = collections.Counter(player_cards.values())
+    dealt.update(table_cards)
+    current = collections.Counter(new_player_cards.values())
+    current.update(new_table_cards)
+    if dealt != current:
+        raise InvariantError(
+            "conservation",
+            "Deck changed from {!r} to {!r}.".format(dealt, current))
+    for card in UNIQUE_CARDS:
+        if current[card] > 1:
+            raise InvariantError(
+                "unique",
+                "{} {} cards in play.".format(
+                    current[card], WerewolfGame.get_card_name(card)))
+    if eliminated is not None:
+        check_winner(game, eliminated)
+
+
+class WinnerSet(object):
+    VILLAGE = frozenset([WerewolfGame.WINNER_VILLAGE])
+    WEREWOLVES = frozenset([WerewolfGame.WINNER_WEREWOLVES])
+    TANNER = frozenset([WerewolfGame.WINNER_TANNER])
+    TANNER_AND_VILLAGE = frozenset([WerewolfGame.WINNER_TANNER_AND_VILLAGE])
+    WEREWOLVES_OR_NO_ONE = frozenset([
+        WerewolfGame.WINNER_WEREWOLVES, WerewolfGame.WINNER_NO_ONE])
+
+
+def check_winner(game, eliminated):
+    """
+    Check the post-game results are consistent with the eliminated players.
+    """
+    results = game.query_post_game_results()
+    if results != game.query_post_game_results():
+        raise InvariantError("winner", "Post-game results are not stable.")
+    eliminated_cards = set(results.player_cards[p] for p in eliminated)
+    werewolf_player = WerewolfGame.CARD_WEREWOLF in results.player_cards.values()
+    tanner_eliminated = WerewolfGame.CARD_TANNER in eliminated_cards
+    werewolf_eliminated = WerewolfGame.CARD_WEREWOLF in eliminated_cards
+    winner = results.winner
+    if tanner_eliminated:
+        expected = (
+            WinnerSet.TANNER_AND_VILLAGE if werewolf_eliminated
+            else WinnerSet.TANNER)
+    elif werewolf_eliminated:
+        expected = WinnerSet.VILLAGE
+    elif len(eliminated_cards) == 0 and not werewolf_player:
+        expected = WinnerSet.VILLAGE
+    elif werewolf_player:
+        expected = WinnerSet.WEREWOLVES
+    else:
+        expected = WinnerSet.WEREWOLVES_OR_NO_ONE
+    if winner not in expected:
+        raise InvariantError(
+            "winner",
+            "Winner {} with eliminated cards {!r}.".format(
+                winner, sorted(eliminated_cards)))
+
+
+def apply_step(game, step, state):
+    """
+    Fire a step at the game and check the result.  `state` is a dict
+    carrying the eliminated players between steps.  Returns True if the game
+    accepted the input, False if it was rejected, or None if a malformed
+    input spoiled the game.  Raises `InvariantError`.
+    """
+    accepted = game.can(step.input)
+    func = getattr(game, step.input)
+    try:
+        func(*step.args)
+    except NoTransition:
+        if accepted:
+            raise InvariantError(
+                "can", "{} rejected but can() was True.".format(step.input))
+        return False
+    except (KeyError, AssertionError):
+        if step.well_formed:
+            raise
+        # The machine has already changed state, so the game can't be
+        # trusted after a malformed input.
+        return None
+    except Exception as ex:
+        # The engine raises plain exceptions for inputs that do not apply
+        # to the deal, e.g. viewing the insomniac card when no player has it.
+        if type(ex) is not Exception:
+            raise
+    if not accepted:
+        raise InvariantError(
+            "can", "{} accepted but can() was False.".format(step.input))
+    if step.input == "eliminate_players":
+        state["eliminated"] = step.args[0]
+    check_invariants(game, state.get("eliminated"))
+    return True
+
+
+def make_game(seed):
+    """
+    Create a game for a seed.  Odd seeds use read-only query views.
+    """
+    return WerewolfGame(random.Random(seed), read_only_views=bool(seed & 1))
+
+
+def run_steps(steps, seed):
+    """
+    Replay steps against a new game whose deck is shuffled by a random
+    number generator seeded with `seed`.  Returns a `Failure` or None.
+    """
+    game = make_game(seed)
+    state = {}
+    for index, step in enumerate(steps):
+        try:
+            result = apply_step(game, step, state)
+        except InvariantError as ex:
+            return Failure(index, ex.kind, str(ex))
+        except Exception as ex:
+            return Failure(index, type(ex).__name__, str(ex))
+        if result is None:
+            break
+    return None
+
+
+def shrink(steps, seed, failure):
+    """
+    Return a minimal subsequence of `steps` that fails the same way.
+    """
+    steps = list(steps[:failure.index + 1])
+    chunk = len(steps) // 2
+    while chunk >= 1:
+        start = 0
+        while start < len(steps):
+            candidate = steps[:start] + steps[start + chunk:]
+            result = run_steps(candidate, seed)
+            if result is not None and result.kind == failure.kind:
+                steps = candidate[:result.index + 1]
+            else:
+                start += chunk
+        chunk //= 2
+    return steps
+
+
+@attr.attrs
+class FuzzReport(object):
+    games = attr.attrib(default=0)
+    inputs = attr.attrib(default=0)
+    rejected = attr.attrib(default=0)
+    elapsed = attr.attrib(default=0.0)
+    failure = attr.attrib(default=None)
+    seed = attr.attrib(default=None)
+    steps = attr.attrib(default=None)
+
+    @property
+    def inputs_per_second(self):
+        if self.elapsed == 0:
+            return 0.0
+        return self.inputs / self.elapsed
+
+
+def fuzz(seed=None, games=None, duration=None, max_steps=200):
+    """
+    Play random games until `games` games have been played or `duration`
+    seconds have passed.  Returns a `FuzzReport`; if an invariant failed,
+    its `steps` are the shrunk sequence that reproduces the failure when
+    replayed with `run_steps()` and the report's `seed`.
+    """
+    rng = random.Random(seed)
+    report = FuzzReport()
+    start = time.time()
+    while True:
+        if games is not None and report.games >= games:
+            break
+        if duration is not None and time.time() - start >= duration:
+            break
+        generator = StepGenerator(rng)
+        game_seed = rng.getrandbits(32)
+        game = make_game(game_seed)
+        state = {}
+        steps = []
+        for index in range(max_steps):
+            step = generator.next_step(game)
+            steps.append(step)
+            report.inputs += 1
+            result = False
+            try:
+                result = apply_step(game, step, state)
+            except InvariantError as ex:
+                report.failure = Failure(index, ex.kind, str(ex))
+            except Exception as ex:
+                report.failure = Failure(index, type(ex).__name__, str(ex))
+            if report.failure is not None:
+                report.elapsed = time.time() - start
+                report.seed = game_seed
+                report.steps = shrink(steps, game_seed, report.failure)
+                report.failure = run_steps(report.steps, game_seed)
+                return report
+            if result is None:
+                break
+            if not result:
+                report.rejected += 1
+        report.games += 1
+    report.elapsed = time.time() - start
+    return report
@@ -0,0 +1,148 @@
+from __future__ import print_function
+import bisect
+import collections
+import time
+
+try:
+    clock = time.perf_counter
+except AttributeError:
+    clock = time.time
+
+# Histogram bucket upper bounds in seconds, from 1 usec to about 17 minutes.
+DEFAULT_BOUNDS = tuple(1e-6 * (2 ** n) for n in range(31))
+
+
+def phase_of(state):
+    """
+    Return the name of the game phase a serialized machine state belongs to.
+    Night states are grouped by role tag, so a role's power-activated state
+    counts towards its phase.
+    """
+    if state in ("dont_have_players", "have_players"):
+        return "setup"
+    if state == "cards_dealt":
+        return "deal"
+    if state.endswith("_power_activated"):
+        return state[:-len("_power_activated")]
+    if state.endswith("_phase"):
+        return state[:-len("_phase")]
+    return state
+
+
+class Histogram(object):
+    """
+    Counts observations in fixed buckets.
+    """
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        """
+        Add the observations of another histogram with the same bounds.
+        """
+        if other.bounds != self.bounds:
+            raise Exception("Histogram bounds don't match.")
+        for n, count in enumerate(other.counts):
+            self.counts[n] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return 0.0
+        return self.sum / self.count
+
+    def percentile(self, q):
+        """
+        Return the upper bound of the bucket holding the `q` percentile
+        (0-100), or infinity if it is past the last bucket.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for n, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                if n < len(self.bounds):
+                    return self.bounds[n]
+                return float("inf")
+        return float("inf")
+
+
+class TransitionRecorder(object):
+    """
+    A transition hook that keeps the most recent `capacity` transitions in
+    a ring buffer as (state, input, next state, duration) tuples.
+    """
+
+    def __init__(self, capacity=1024):
+        self._records = collections.deque(maxlen=capacity)
+        self.append = self._records.append
+
+    def __call__(self, state, input, next_state, duration):
+        self.append((state, input, next_state, duration))
+
+    def records(self):
+        """
+        Return a list of the recorded transitions, oldest first.
+        """
+        return list(self._records)
+
+
+class PhaseTimer(object):
+    """
+    A transition hook that measures how long a game spends in each phase
+    (deal, each night role, daybreak, ...) and adds the wall time to a
+    `Histogram` per phase in `histograms`.  Use one timer per game; the
+    histograms may be shared.
+    """
+
+    def __init__(self, histograms, clock=clock):
+        self.histograms = histograms
+        self.clock = clock
+        self._phase = None
+        self._entered = None
+
+    def __call__(self, state, input, next_state, duration):
+        phase = phase_of(next_state)
+        if phase == self._phase:
+            return
+        now = self.clock()
+        if self._phase is not None:
+            self.observe(self._phase, now - self._entered)
+        self._phase = phase
+        self._entered = now
+
+    def observe(self, phase, elapsed):
+        """
+        Record that the game spent `elapsed` seconds in `phase`.
+        """
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = Histogram()
+            self.histograms[phase] = histogram
+        histogram.observe(elapsed)
+
+
+class HookChain(object):
+    """
+    A transition hook that calls several hooks in turn.
+    """
+
+    def __init__(self, *hooks):
+        self.hooks = hooks
+
+    def __call__(self, state, input, next_state, duration):
+        for hook in self.hooks:
+            hook(state, input, next_state, duration)
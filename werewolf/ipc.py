@@ -0,0 +1,228 @@
+from __future__ import print_function
+import struct
+import six
+from werewolf import roles
+from werewolf.werewolf import PostGameInfo, WerewolfGame
+
+# Request operations.
+OP_CREATE = 1
+OP_SEND = 2
+OP_REMOVE = 3
+OP_EXPORT = 4
+OP_IMPORT = 5
+OP_STOP = 6
+OP_METRICS = 7
+
+# Response statuses.
+STATUS_OK = 0
+STATUS_INVALID_INPUT = 1
+STATUS_UNKNOWN_TABLE = 2
+STATUS_ERROR = 3
+
+# Request: request ID, operation, table ID.
+REQUEST_HEADER = struct.Struct("!IB16s")
+# Response: request ID, status, microseconds the worker spent on it.
+RESPONSE_HEADER = struct.Struct("!IBI")
+
+# Value tags.
+_NONE = b"N"
+_TRUE = b"T"
+_FALSE = b"F"
+_SMALL_INT = b"b"
+_INT = b"q"
+_TEXT = b"s"
+_BYTES = b"y"
+_LIST = b"l"
+_TUPLE = b"t"
+_SET = b"f"
+_DICT = b"d"
+_ROLE = b"r"
+_RESULTS = b"p"
+
+_i8 = struct.Struct("!b")
+_u16 = struct.Struct("!H")
+_u32 = struct.Struct("!I")
+_i64 = struct.Struct("!q")
+
+_input_codes = None
+_input_names = None
+
+
+def input_code(name):
+    """
+    Return the one byte code for a game input.
+    """
+    global _input_codes, _input_names
+    if _input_codes is None:
+        _input_names = WerewolfGame.input_names()
+        _input_codes = dict((n, i) for i, n in enumerate(_input_names))
+    return _input_codes[name]
+
+
+def input_name(code):
+    """
+    Return the game input for a code from `input_code()`.
+    """
+    if _input_names is None:
+        input_code("add_players")
+    return _input_names[code]
+
+
+def encode_value(value, out):
+    """
+    Append the binary encoding of `value` to the list of byte strings
+    `out`.  Values may be None, bools, ints, strings, lists, tuples, sets,
+    mappings, roles and `PostGameInfo` records nested in any way the game's
+    inputs and outputs need.
+    """
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, six.integer_types):
+        if -128 <= value < 128:
+            out.append(_SMALL_INT + _i8.pack(value))
+        else:
+            out.append(_INT + _i64.pack(value))
+    elif isinstance(value, six.text_type):
+        data = value.encode("utf-8")
+        out.append(_TEXT + _u16.pack(len(data)) + data)
+    elif isinstance(value, bytes):
+        out.append(_BYTES + _u32.pack(len(value)) + value)
+    elif isinstance(value, roles.Role):
+        out.append(_ROLE)
+        encode_value(value.tag, out)
+    elif isinstance(value, PostGameInfo):
+        out.append(_RESULTS)
+        encode_value(value.winner, out)
+        encode_value(value.player_cards, out)
+        encode_value(value.orig_player_cards, out)
+        encode_value(value.table_cards, out)
+        encode_value(value.orig_table_cards, out)
+    elif hasattr(value, "items"):
+        out.append(_DICT + _u16.pack(len(value)))
+        for k, v in value.items():
+            encode_value(k, out)
+            encode_value(v, out)
+    else:
+        if isinstance(value, list):
+            tag = _LIST
+        elif isinstance(value, tuple):
+            tag = _TUPLE
+        elif isinstance(value, (set, frozenset)):
+            tag = _SET
+        else:
+            raise TypeError("Can't encode {!r}.".format(value))
+        out.append(tag + _u16.pack(len(value)))
+        for item in value:
+            encode_value(item, out)
+
+
+def decode_value(data, offset=0):
+    """
+    Decode a value encoded by `encode_value()` from `data` at `offset`.
+    Returns (value, offset after the value).
+    """
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == _NONE:
+        return None, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _SMALL_INT:
+        return _i8.unpack_from(data, offset)[0], offset + 1
+    if tag == _INT:
+        return _i64.unpack_from(data, offset)[0], offset + 8
+    if tag == _TEXT:
+        size = _u16.unpack_from(data, offset)[0]
+        offset += 2
+        return data[offset:offset + size].decode("utf-8"), offset + size
+    if tag == _BYTES:
+        size = _u32.unpack_from(data, offset)[0]
+        offset += 4
+        return data[offset:offset + size], offset + size
+    if tag == _ROLE:
+        role_tag, offset = decode_value(data, offset)
+        return roles.registry.get_role_by_tag(role_tag), offset
+    if tag == _RESULTS:
+        fields = []
+        for n in range(5):
+            value, offset = decode_value(data, offset)
+            fields.append(value)
+        return PostGameInfo(*fields), offset
+    if tag == _DICT:
+        count = _u16.unpack_from(data, offset)[0]
+        offset += 2
+        value = {}
+        for n in range(count):
+            k, offset = decode_value(data, offset)
+            v, offset = decode_value(data, offset)
+            value[k] = v
+        return value, offset
+    if tag in (_LIST, _TUPLE, _SET):
+        count = _u16.unpack_from(data, offset)[0]
+        offset += 2
+        items = []
+        for n in range(count):
+            item, offset = decode_value(data, offset)
+            items.append(item)
+        if tag == _TUPLE:
+            return tuple(items), offset
+        if tag == _SET:
+            return frozenset(items), offset
+        return items, offset
+    raise ValueError("Unknown value tag {!r}.".format(tag))
+
+
+def encode_request(request_id, op, table_id, value=None):
+    """
+    Encode a request from the router to a worker.  `table_id` is a 32
+    digit hex string.
+    """
+    out = [REQUEST_HEADER.pack(request_id, op, bytes(bytearray.fromhex(table_id)))]
+    encode_value(value, out)
+    return b"".join(out)
+
+
+def decode_request(data):
+    """
+    Returns (request ID, operation, table ID, value).
+    """
+    request_id, op, table_id = REQUEST_HEADER.unpack_from(data)
+    value, offset = decode_value(data, REQUEST_HEADER.size)
+    return request_id, op, _hex(table_id), value
+
+
+def encode_response(request_id, status, busy, value=None):
+    """
+    Encode a worker's response.  `busy` is the time the worker spent on the
+    request, in seconds.
+    """
+    out = [RESPONSE_HEADER.pack(
+        request_id, status, min(int(busy * 1e6), 0xffffffff))]
+    encode_value(value, out)
+    return b"".join(out)
+
+
+def decode_response(data):
+    """
+    Returns (request ID, status, busy seconds, value).
+    """
+    request_id, status, busy = RESPONSE_HEADER.unpack_from(data)
+    value, offset = decode_value(data, RESPONSE_HEADER.size)
+    return request_id, status, busy / 1e6, value
+
+
+def encode_send(input, args):
+    """
+    Return the value for an `OP_SEND` request.
+    """
+    return (input_code(input), tuple(args))
+
+
+def _hex(data):
+    return "".join("{:02x}".format(b) for b in bytearray(data))
@@ -0,0 +1,301 @@
+from __future__ import print_function
+import asyncio
+import attr
+from werewolf import protocol
+from werewolf.werewolf import WerewolfGame
+
+
+class Think(object):
+    """
+    A think-time distribution: how long a simulated player waits before
+    answering the server.  Parsed from specifications like "0.5",
+    "const:0.5", "uniform:0.1,2", "exp:0.5" (mean) or "lognormal:0.5,1"
+    (median, sigma).
+    """
+
+    def __init__(self, spec):
+        kind, _, params = spec.partition(":")
+        if not params:
+            kind, params = "const", kind
+        try:
+            values = [float(p) for p in params.split(",")]
+        except ValueError:
+            raise ValueError("Bad think time '{}'.".format(spec))
+        expected = {"const": 1, "uniform": 2, "exp": 1, "lognormal": 2}
+        if expected.get(kind) != len(values) or min(values) < 0:
+            raise ValueError("Bad think time '{}'.".format(spec))
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng):
+        """
+        Returns a think time in seconds.
+        """
+        kind = self.kind
+        values = self.values
+        if kind == "const":
+            return values[0]
+        if kind == "uniform":
+            return rng.uniform(*values)
+        if kind == "exp":
+            if values[0] == 0:
+                return 0.0
+            return rng.expovariate(1.0 / values[0])
+        if values[0] == 0:
+            return 0.0
+        return values[0] * rng.lognormvariate(0.0, values[1])
+
+
+class RandomClientPolicy(object):
+    """
+    Players choose valid night actions and votes uniformly at random.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def night_action(self, card, seat, players):
+        """
+        Returns the `protocol.NightAction` for the player in `seat` when the
+        role with card `card` is active.
+        """
+        rng = self.rng
+        others = [s for s in range(players) if s != seat]
+        if card == WerewolfGame.CARD_SEER:
+            if rng.random() < 0.5:
+                return protocol.NightAction(
+                    protocol.ACTION_VIEW_PLAYER, rng.choice(others))
+            first, second = rng.sample((0, 1, 2), 2)
+            return protocol.NightAction(protocol.ACTION_VIEW_TABLE, first, second)
+        if card == WerewolfGame.CARD_ROBBER and rng.random() < 0.75:
+            return protocol.NightAction(protocol.ACTION_STEAL, rng.choice(others))
+        if card == WerewolfGame.CARD_TROUBLEMAKER and rng.random() < 0.75:
+            first, second = rng.sample(others, 2)
+            return protocol.NightAction(protocol.ACTION_SWITCH, first, second)
+        return protocol.NightAction(protocol.ACTION_PASS)
+
+    def vote(self, seat, players):
+        return self.rng.choice([s for s in range(players) if s != seat])
+
+
+class PassiveClientPolicy(object):
+    """
+    Players never use their night actions and vote for the player on their
+    left.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def night_action(self, card, seat, players):
+        return protocol.NightAction(protocol.ACTION_PASS)
+
+    def vote(self, seat, players):
+        return (seat + 1) % players
+
+
+POLICIES = {
+    "random": RandomClientPolicy,
+    "passive": PassiveClientPolicy,
+}
+
+# Roles whose players are asked for a night action.
+_ACTING_CARDS = frozenset([
+    WerewolfGame.CARD_SEER,
+    WerewolfGame.CARD_ROBBER,
+    WerewolfGame.CARD_TROUBLEMAKER,
+])
+
+
+@attr.attrs(slots=True)
+class LoadStats(object):
+    """
+    What the simulated clients saw.
+    """
+    connected = attr.attrib(default=0)
+    connect_failures = attr.attrib(default=0)
+    disconnects = attr.attrib(default=0)
+    games = attr.attrib(default=0)
+    # Games completed, counted once per table by the player in seat 0.
+    tables = attr.attrib(default=0)
+    # Tables completed before the clients were told to stop.
+    window_tables = attr.attrib(default=0)
+    errors = attr.attrib(default=0)
+    # Times a client was told the server was too busy to play its game.
+    overloaded = attr.attrib(default=0)
+    spectator_events = attr.attrib(default=0)
+    spectator_games = attr.attrib(default=0)
+
+
+class SimulatedClient(object):
+    """
+    A client that joins tables of `table_size` players and plays games
+    with `policy`, waiting a time drawn from `think` before each action and
+    vote, until `stop` is set.  A client turned away by a busy server waits
+    a random time of up to `backoff` seconds before joining again.
+    """
+
+    def __init__(self, name, table_size, policy, think, rng, stats, codec=None,
+                 backoff=1.0):
+        self.name = name
+        self.table_size = table_size
+        self.policy = policy
+        self.think = think
+        self.rng = rng
+        self.stats = stats
+        self.backoff = backoff
+        if codec is None:
+            codec = protocol.BinaryCodec()
+        self.codec = codec
+
+    async def run(self, host, port, stop):
+        stats = self.stats
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            stats.connect_failures += 1
+            return
+        stats.connected += 1
+        try:
+            while not stop.is_set():
+                if not await self.play(reader, writer):
+                    stats.disconnects += 1
+                    break
+        except (ConnectionError, protocol.ProtocolError):
+            stats.disconnects += 1
+        finally:
+            writer.close()
+
+    async def play(self, reader, writer):
+        """
+        Play one game.  Returns False if the server hung up.
+        """
+        codec = self.codec
+        policy = self.policy
+        stats = self.stats
+        seat = None
+        players = self.table_size
+        writer.write(codec.encode(protocol.Join(players, self.name)))
+        while True:
+            message = await codec.read(reader)
+            if message is None:
+                return False
+            if isinstance(message, protocol.Seated):
+                seat = message.seat
+                players = len(message.names)
+            elif isinstance(message, protocol.Phase):
+                if message.active and message.card in _ACTING_CARDS:
+                    await self.pause()
+                    action = policy.night_action(message.card, seat, players)
+                    writer.write(codec.encode(action))
+            elif isinstance(message, protocol.VotePrompt):
+                await self.pause()
+                writer.write(codec.encode(protocol.Vote(policy.vote(seat, players))))
+            elif isinstance(message, protocol.Results):
+                stats.games += 1
+                if seat == 0:
+                    stats.tables += 1
+                return True
+            elif isinstance(message, protocol.Error):
+                if message.code == protocol.ERROR_OVERLOADED:
+                    stats.overloaded += 1
+                    await asyncio.sleep(self.rng.uniform(0, self.backoff))
+                    return True
+                stats.errors += 1
+                if message.code == protocol.ERROR_BAD_MESSAGE:
+                    return False
+                if message.code == protocol.ERROR_BAD_ACTION:
+                    writer.write(codec.encode(protocol.NightAction(protocol.ACTION_PASS)))
+
+    async def pause(self):
+        delay = self.think.sample(self.rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class SimulatedSpectator(object):
+    """
+    A client that watches one game after another until `stop` is set,
+    taking `read_delay` seconds to handle each event.
+    """
+
+    def __init__(self, stats, read_delay=0.0, codec=None):
+        self.stats = stats
+        self.read_delay = read_delay
+        if codec is None:
+            codec = protocol.BinaryCodec()
+        self.codec = codec
+
+    async def run(self, host, port, stop):
+        codec = self.codec
+        stats = self.stats
+        while not stop.is_set():
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError:
+                stats.connect_failures += 1
+                return
+            try:
+                writer.write(codec.encode(protocol.Watch(protocol.NEXT_TABLE)))
+                while True:
+                    message = await codec.read(reader)
+                    if message is None:
+                        break
+                    stats.spectator_events += 1
+                    if isinstance(message, protocol.Results):
+                        stats.spectator_games += 1
+                    if self.read_delay > 0:
+                        await asyncio.sleep(self.read_delay)
+            except (ConnectionError, protocol.ProtocolError):
+                stats.disconnects += 1
+                return
+            finally:
+                writer.close()
+
+
+async def run_load(host, port, clients, table_size, policy, think, rng,
+                   duration, ramp=0.0, drain=30.0, codec_factory=None,
+                   spectators=0, spectator_delay=0.0, backoff=1.0):
+    """
+    Play games with `clients` simulated clients for `duration` seconds,
+    while `spectators` simulated spectators watch them.  Clients connect at
+    random times during the first `ramp` seconds, and after `duration`
+    finish their games for up to `drain` seconds.  Clients turned away by
+    the server back off for up to `backoff` seconds.  Returns the
+    `LoadStats`.
+    """
+    stats = LoadStats()
+    stop = asyncio.Event()
+
+    async def start_client(n):
+        await asyncio.sleep(rng.uniform(0, ramp))
+        codec = None
+        if codec_factory is not None:
+            codec = codec_factory()
+        client = SimulatedClient(
+            "load{}".format(n), table_size, POLICIES[policy](rng), think, rng,
+            stats, codec, backoff)
+        await client.run(host, port, stop)
+
+    async def start_spectator():
+        await asyncio.sleep(rng.uniform(0, ramp))
+        codec = None
+        if codec_factory is not None:
+            codec = codec_factory()
+        await SimulatedSpectator(stats, spectator_delay, codec).run(host, port, stop)
+
+    tasks = [asyncio.ensure_future(start_client(n)) for n in range(clients)]
+    watchers = [asyncio.ensure_future(start_spectator()) for n in range(spectators)]
+    await asyncio.sleep(duration)
+    stop.set()
+    stats.window_tables = stats.tables
+    # Clients still waiting for a table when the others stop never get
+    # one, so the stragglers are cancelled after the drain period.
+    done, pending = await asyncio.wait(tasks, timeout=drain)
+    pending.update(watchers)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+    return stats
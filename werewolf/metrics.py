@@ -0,0 +1,428 @@
+from __future__ import print_function
+import os
+import threading
+import time
+from werewolf.instrumentation import Histogram, PhaseTimer
+from werewolf.werewolf import WerewolfGame
+
+# Histogram bucket upper bounds in seconds for phase durations.
+PHASE_BOUNDS = (
+    0.0001, 0.001, 0.01, 0.1, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Histogram bucket upper bounds in seconds for request latencies.
+LATENCY_BOUNDS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0)
+
+WINNER_LABELS = {
+    WerewolfGame.WINNER_VILLAGE: "village",
+    WerewolfGame.WINNER_WEREWOLVES: "werewolves",
+    WerewolfGame.WINNER_NO_ONE: "no_one",
+    WerewolfGame.WINNER_TANNER: "tanner",
+    WerewolfGame.WINNER_TANNER_AND_VILLAGE: "tanner_and_village",
+}
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{{{}}}".format(",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs))
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric(object):
+    """
+    A metric family with optional labels.
+    """
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} {}".format(self.name, self.kind),
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.extend(self._render_value(label_values, value))
+        return lines
+
+    def _render_value(self, label_values, value):
+        return ["{}{} {}".format(
+            self.name,
+            _format_labels(self.label_names, label_values),
+            _format_value(value))]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class HistogramMetric(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), bounds=PHASE_BOUNDS):
+        Metric.__init__(self, name, help, labels)
+        self.bounds = bounds
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            histogram = self._values.get(label_values)
+            if histogram is None:
+                histogram = Histogram(self.bounds)
+                self._values[label_values] = histogram
+            histogram.observe(value)
+
+    def merge(self, histogram, *label_values):
+        """
+        Add the observations of a `Histogram` with the same bounds.
+        """
+        with self._lock:
+            existing = self._values.get(label_values)
+            if existing is None:
+                existing = Histogram(self.bounds)
+                self._values[label_values] = existing
+            existing.merge(histogram)
+
+    def _render_value(self, label_values, histogram):
+        lines = []
+        cumulative = 0
+        bounds = list(histogram.bounds) + [float("inf")]
+        for bound, count in zip(bounds, histogram.counts):
+            cumulative += count
+            lines.append("{}_bucket{} {}".format(
+                self.name,
+                _format_labels(
+                    self.label_names, label_values, ("le", _format_value(bound))),
+                cumulative))
+        labels = _format_labels(self.label_names, label_values)
+        lines.append("{}_sum{} {}".format(self.name, labels, _format_value(histogram.sum)))
+        lines.append("{}_count{} {}".format(self.name, labels, histogram.count))
+        return lines
+
+
+class MetricsRegistry(object):
+    """
+    A collection of metrics rendered together in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), bounds=PHASE_BOUNDS):
+        return self.register(HistogramMetric(name, help, labels, bounds))
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.append("")
+        return "\n".join(lines)
+
+
+class GameMetrics(object):
+    """
+    The metrics reported by game servers and simulators.
+    """
+
+    def __init__(self, registry=None):
+        if registry is None:
+            registry = MetricsRegistry()
+        self.registry = registry
+        self.games_started = registry.counter(
+            "werewolf_games_started_total",
+            "Games that have been dealt.")
+        self.games_completed = registry.counter(
+            "werewolf_games_completed_total",
+            "Games that have ended, by winner.",
+            labels=("winner",))
+        self.active_tables = registry.gauge(
+            "werewolf_active_tables",
+            "Tables held in memory.")
+        self.hibernating_tables = registry.gauge(
+            "werewolf_hibernating_tables",
+            "Tables hibernating on disk.")
+        self.invalid_inputs = registry.counter(
+            "werewolf_invalid_inputs_total",
+            "Inputs rejected because the game could not accept them.",
+            labels=("input",))
+        self.phase_duration = registry.histogram(
+            "werewolf_phase_duration_seconds",
+            "Wall time spent in each phase of a game.",
+            labels=("phase",))
+        self.request_latency = registry.histogram(
+            "werewolf_request_latency_seconds",
+            "Time from receiving a player's action or vote to answering it, "
+            "by phase.",
+            labels=("phase",),
+            bounds=LATENCY_BOUNDS)
+        self.overloads = registry.counter(
+            "werewolf_overloaded_total",
+            "New tables turned away because the server was overloaded.")
+        for label in WINNER_LABELS.values():
+            self.games_completed.inc(0, label)
+        self.overloads.inc(0)
+
+    def game_started(self):
+        self.games_started.inc()
+
+    def game_completed(self, winner):
+        self.games_completed.inc(1, WINNER_LABELS[winner])
+
+    def input_rejected(self, input_name):
+        self.invalid_inputs.inc(1, input_name)
+
+    def overloaded(self):
+        """
+        Count a new table turned away by admission control.
+        """
+        self.overloads.inc()
+
+    def request_handled(self, phase, seconds):
+        self.request_latency.observe(seconds, phase)
+
+    def set_tables(self, active, hibernating=0):
+        self.active_tables.set(active)
+        self.hibernating_tables.set(hibernating)
+
+    def phase_timer(self):
+        """
+        Return a transition hook for one game that reports its phase
+        durations.
+        """
+        return _PhaseMetricsTimer(self.phase_duration)
+
+    def add_worker_metrics(self, collected):
+        """
+        Add the metrics a worker's `WorkerMetrics.take()` returned.
+        """
+        phases, rejected = collected
+        for phase, (counts, micros) in phases.items():
+            histogram = Histogram(PHASE_BOUNDS)
+            histogram.counts = list(counts)
+            histogram.count = sum(counts)
+            histogram.sum = micros / 1e6
+            self.phase_duration.merge(histogram, phase)
+        for input_name, count in rejected.items():
+            self.invalid_inputs.inc(count, input_name)
+
+
+class WorkerMetrics(object):
+    """
+    Collects the metrics a server worker's `werewolf.tables.TableManager`
+    reports: phase durations and rejected inputs.  The router takes them
+    with `take()` and adds them to its `GameMetrics`.  Games and tables are
+    counted by the router, which sees them all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}
+        self._rejected = {}
+
+    def game_started(self):
+        pass
+
+    def game_completed(self, winner):
+        pass
+
+    def set_tables(self, active, hibernating=0):
+        pass
+
+    def input_rejected(self, input_name):
+        with self._lock:
+            self._rejected[input_name] = self._rejected.get(input_name, 0) + 1
+
+    def observe(self, seconds, phase):
+        with self._lock:
+            histogram = self._phases.get(phase)
+            if histogram is None:
+                histogram = Histogram(PHASE_BOUNDS)
+                self._phases[phase] = histogram
+            histogram.observe(seconds)
+
+    def phase_timer(self):
+        return _PhaseMetricsTimer(self)
+
+    def take(self):
+        """
+        Return the metrics collected since the last call, in a form
+        `werewolf.ipc` can encode: (phase -> (bucket counts, microseconds
+        in the phase), input -> times rejected).
+        """
+        with self._lock:
+            phases, self._phases = self._phases, {}
+            rejected, self._rejected = self._rejected, {}
+        return (
+            dict((phase, (histogram.counts, int(histogram.sum * 1e6)))
+                 for phase, histogram in phases.items()),
+            rejected)
+
+
+class _PhaseMetricsTimer(PhaseTimer):
+
+    def __init__(self, metric):
+        PhaseTimer.__init__(self, None, clock=time.time)
+        self.metric = metric
+
+    def observe(self, phase, elapsed):
+        self.metric.observe(elapsed, phase)
+
+
+class MetricsServer(object):
+    """
+    Serves a registry's metrics over HTTP from a daemon thread.
+    """
+
+    def __init__(self, registry, port, host="127.0.0.1"):
+        from six.moves import BaseHTTPServer
+        self.registry = registry
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            def do_GET(handler):
+                body = registry.render().encode("utf-8")
+                handler.send_response(200)
+                handler.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.httpd = BaseHTTPServer.HTTPServer((host, port), Handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def write_textfile(registry, path):
+    """
+    Atomically write a registry's metrics to a text file.
+    """
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "w") as f:
+        f.write(registry.render())
+    os.rename(tmp_path, path)
+
+
+class TextfileWriter(object):
+    """
+    Rewrites a metrics text file every `interval` seconds from a daemon
+    thread.
+    """
+
+    def __init__(self, registry, path, interval=10.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            write_textfile(self.registry, self.path)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        write_textfile(self.registry, self.path)
+
+
+def _parse_labels(text):
+    labels = {}
+    for pair in text.split('",'):
+        if pair:
+            name, value = pair.split('="', 1)
+            labels[name] = value.rstrip('"').replace('\\"', '"').replace("\\\\", "\\")
+    return labels
+
+
+def parse_histograms(text, name, label):
+    """
+    Read the histogram metric `name` back from metrics in the Prometheus
+    text format.  Returns a dict mapping the value of its label `label` to
+    a `Histogram`.
+    """
+    buckets = {}
+    sums = {}
+    for line in text.splitlines():
+        if not line.startswith(name) or line.startswith("#"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        metric, _, labels = series.partition("{")
+        labels = _parse_labels(labels.rstrip("}"))
+        key = labels.get(label)
+        if metric == name + "_bucket":
+            bound = float(labels["le"])
+            buckets.setdefault(key, []).append((bound, int(float(value))))
+        elif metric == name + "_sum":
+            sums[key] = float(value)
+    histograms = {}
+    for key, cumulative in buckets.items():
+        cumulative.sort()
+        histogram = Histogram(tuple(bound for bound, count in cumulative[:-1]))
+        previous = 0
+        for n, (bound, count) in enumerate(cumulative):
+            histogram.counts[n] = count - previous
+            previous = count
+        histogram.count = previous
+        histogram.sum = sums.get(key, 0.0)
+        histograms[key] = histogram
+    return histograms
@@ -0,0 +1,271 @@
+from __future__ import print_function
+import collections
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import attr
+
+# Sent to a process to start or stop a profiling window.
+TOGGLE_SIGNAL = getattr(signal, "SIGUSR2", None)
+
+DEFAULT_OUTPUT = "werewolf-profile.folded"
+
+# Functions counted as the engine's in summaries.
+ENGINE_PACKAGES = ("werewolf", "automat")
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    path = "/".join(filename.replace("\\", "/").split("/")[-2:])
+    return "{}:{}".format(path, code.co_name).replace(";", ":")
+
+
+class SamplingProfiler(object):
+    """
+    A statistical profiler.  While running, a background thread records
+    the stack of every other thread in the process every `interval`
+    seconds, so the profiled code isn't slowed by tracing each call.
+    Stacks are counted with the thread's name as their root.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._labels = {}
+        self._thread = None
+        self._stopping = threading.Event()
+        self._started = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.stacks.clear()
+        self.samples = 0
+        self._stopping.clear()
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._run, name="werewolf-profiler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and wait for the sampling thread to finish.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        if thread is not threading.current_thread():
+            thread.join()
+
+    def request_stop(self):
+        """
+        Ask the sampling thread to stop without waiting for it.  Safe to
+        call from a signal handler.
+        """
+        self._stopping.set()
+
+    def _run(self):
+        try:
+            while not self._stopping.wait(self.interval):
+                self.sample()
+        finally:
+            self.elapsed = time.time() - self._started
+            self._thread = None
+            self.finished()
+
+    def finished(self):
+        """
+        Called on the sampling thread when sampling stops.
+        """
+
+    def sample(self):
+        own = threading.current_thread().ident
+        names = dict((t.ident, t.name) for t in threading.enumerate())
+        labels = self._labels
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            stack.append(names.get(ident, "thread-{}".format(ident)))
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+        self.samples += 1
+
+    def write_collapsed(self, f):
+        """
+        Write the stacks in the collapsed format read by flame graph tools:
+        one stack per line, its frames separated by semicolons and followed
+        by its count.
+        """
+        for stack, count in sorted(self.stacks.items()):
+            f.write("{} {}\n".format(";".join(stack), count))
+
+    def top_functions(self, count=20, packages=ENGINE_PACKAGES):
+        """
+        Returns [(function, self samples, total samples)] for the `count`
+        functions in `packages` that were on top of the most stacks.  Self
+        samples count the stacks a function was on top of, and total
+        samples those it was anywhere in.
+        """
+        prefixes = tuple("{}/".format(package) for package in packages)
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, samples in self.stacks.items():
+            frames = [frame for frame in stack[1:] if frame.startswith(prefixes)]
+            if not frames:
+                continue
+            # The innermost engine frame gets the time spent in anything it
+            # called outside the engine.
+            own[frames[-1]] += samples
+            for frame in set(frames):
+                total[frame] += samples
+        ranked = sorted(total, key=lambda f: (-own[f], -total[f], f))[:count]
+        return [(frame, own[frame], total[frame]) for frame in ranked]
+
+
+class ProfileRecorder(SamplingProfiler):
+    """
+    Profiles windows of time, writing each window's stacks to `path` and a
+    summary of the top engine functions to `stream` when it ends.  A window
+    ends after `window` seconds if given, or when `toggle()` or `stop()` is
+    called.
+    """
+
+    def __init__(self, path=DEFAULT_OUTPUT, window=None, interval=0.005,
+                 label=None, stream=None):
+        super(ProfileRecorder, self).__init__(interval)
+        self.path = path
+        self.window = window
+        self.label = label or "process {}".format(os.getpid())
+        self.stream = stream
+        self._timer = None
+        self._installed = False
+        self._previous_handler = None
+
+    def start(self):
+        super(ProfileRecorder, self).start()
+        if self.window:
+            self._timer = threading.Timer(self.window, self.request_stop)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def install(self):
+        """
+        Toggle the recorder when the process is sent `TOGGLE_SIGNAL`.
+        """
+        self._previous_handler = install_toggle(self)
+        self._installed = TOGGLE_SIGNAL is not None
+
+    def close(self):
+        """
+        End the current window, if any, and restore the signal handler the
+        recorder replaced.
+        """
+        self.stop()
+        if self._installed:
+            previous = self._previous_handler
+            if not callable(previous):
+                # The default action would end the process.
+                previous = signal.SIG_IGN
+            signal.signal(TOGGLE_SIGNAL, previous)
+            self._installed = False
+
+    def toggle(self):
+        """
+        Start a window, or end the current one.  Safe to call from a signal
+        handler.
+        """
+        if self.running:
+            self.request_stop()
+        else:
+            self.start()
+
+    def finished(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        with open(self.path, "w") as f:
+            self.write_collapsed(f)
+        self.write_summary(self.stream or sys.stderr)
+
+    def write_summary(self, stream, count=15):
+        print("Profile of {}: {} samples in {:.1f}s written to {}".format(
+            self.label, self.samples, self.elapsed, self.path), file=stream)
+        top = self.top_functions(count)
+        if not top or self.samples == 0:
+            return
+        print("{}{:>8}{:>8}".format("Engine function".ljust(60), "self", "total"),
+              file=stream)
+        for frame, own, total in top:
+            print("{}{:>7.1f}%{:>7.1f}%".format(
+                frame[:59].ljust(60), 100.0 * own / self.samples,
+                100.0 * total / self.samples), file=stream)
+        stream.flush()
+
+
+def install_toggle(recorder=None, forward=True):
+    """
+    Toggle `recorder`, if given, when the process is sent `TOGGLE_SIGNAL`,
+    so a running process can be profiled without restarting it.  With
+    `forward`, the signal is also passed on to the process's
+    multiprocessing children.  Returns the previous handler, or None on
+    platforms without the signal.
+    """
+    if TOGGLE_SIGNAL is None:
+        return None
+
+    def handler(signum, frame):
+        if recorder is not None:
+            recorder.toggle()
+        if forward:
+            for child in multiprocessing.active_children():
+                try:
+                    os.kill(child.pid, signum)
+                except OSError:
+                    pass
+
+    return signal.signal(TOGGLE_SIGNAL, handler)
+
+
+@attr.attrs(slots=True)
+class ProfileSettings(object):
+    """
+    How a program's processes are profiled.  If `start` is True they are
+    profiled from startup; otherwise only once toggled.  A process with an
+    `index` writes to `path` suffixed with it, and one without to `path`.
+    """
+    path = attr.attrib(default=DEFAULT_OUTPUT)
+    window = attr.attrib(default=None)
+    start = attr.attrib(default=False)
+    interval = attr.attrib(default=0.005)
+
+    def recorder(self, index=None, label=None):
+        """
+        Returns a `ProfileRecorder` for process `index`, toggled by
+        `TOGGLE_SIGNAL` and already started if `start` is True.
+        """
+        path = self.path
+        if index is not None:
+            path = "{}.{}".format(path, index)
+        recorder = ProfileRecorder(path, self.window, self.interval, label)
+        recorder.install()
+        if self.start:
+            recorder.start()
+        return recorder
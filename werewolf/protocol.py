@@ -0,0 +1,382 @@
+from __future__ import print_function
+import json
+import struct
+import attr
+
+# Seats and cards are sent as single bytes; NO_SEAT and NO_CARD mark an
+# unused field.
+NO_SEAT = 255
+NO_CARD = 255
+
+# The `card` of a `Phase` message at daybreak.
+PHASE_DAYBREAK = 254
+
+# `NightAction` actions.
+ACTION_PASS = 0
+ACTION_VIEW_PLAYER = 1
+ACTION_VIEW_TABLE = 2
+ACTION_STEAL = 3
+ACTION_SWITCH = 4
+
+# `Reveal` kinds.
+REVEAL_PLAYER = 1
+REVEAL_TABLE = 2
+REVEAL_OWN = 3
+
+# `Error` codes.
+ERROR_UNEXPECTED = 1
+ERROR_BAD_MESSAGE = 2
+ERROR_BAD_ACTION = 3
+ERROR_UNKNOWN_TABLE = 4
+ERROR_OVERLOADED = 5
+
+# The `table` of a `Watch` message asking to watch the next table to start.
+NEXT_TABLE = b"\x00" * 16
+
+# Binary frames: payload length, then the message type.
+_frame_header = struct.Struct("!H")
+
+# Binary frames longer than this could be mistaken for a JSON message,
+# which starts with "{".
+MAX_FRAME = 0x7aff
+
+# The longest vote deadline a `VotePrompt` can carry, in seconds.
+MAX_VOTE_SECONDS = 0xffff
+
+
+class ProtocolError(Exception):
+    """
+    A message could not be encoded or decoded.
+    """
+
+
+# ---------------------
+# Client to server
+# ---------------------
+
+@attr.attrs(slots=True)
+class Join(object):
+    """
+    Ask for a seat at the next table for `players` players.
+    """
+    TYPE = 1
+    players = attr.attrib()
+    name = attr.attrib()
+
+
+@attr.attrs(slots=True)
+class NightAction(object):
+    """
+    Use the active role's power.  `first` and `second` are seats, or table
+    card positions for `ACTION_VIEW_TABLE`.
+    """
+    TYPE = 2
+    action = attr.attrib()
+    first = attr.attrib(default=NO_SEAT)
+    second = attr.attrib(default=NO_SEAT)
+
+
+@attr.attrs(slots=True)
+class Vote(object):
+    """
+    Vote to eliminate the player in `seat`.
+    """
+    TYPE = 3
+    seat = attr.attrib()
+
+
+@attr.attrs(slots=True)
+class Watch(object):
+    """
+    Watch the game at `table`, or the next game to start if `table` is
+    `NEXT_TABLE`, as a spectator.
+    """
+    TYPE = 4
+    table = attr.attrib()
+
+
+# ---------------------
+# Server to client
+# ---------------------
+
+@attr.attrs(slots=True)
+class Seated(object):
+    """
+    The client has been seated at a table.  `names` holds the players'
+    names in seat order; later messages refer to players by seat.
+    Spectators are sent `NO_SEAT`.
+    """
+    TYPE = 16
+    table = attr.attrib()
+    seat = attr.attrib()
+    names = attr.attrib()
+
+
+@attr.attrs(slots=True)
+class Dealt(object):
+    """
+    The card the player was dealt.
+    """
+    TYPE = 17
+    card = attr.attrib()
+
+
+@attr.attrs(slots=True)
+class Phase(object):
+    """
+    A night phase for the role with card `card`, or daybreak.  `active` is
+    set for the players who act in the phase.
+    """
+    TYPE = 18
+    card = attr.attrib()
+    active = attr.attrib(default=False)
+
+
+@attr.attrs(slots=True)
+class Reveal(object):
+    """
+    Cards revealed to one player.  `REVEAL_PLAYER` gives the card in seat
+    `first`, `REVEAL_TABLE` the table cards at positions `first` and
+    `second`, and `REVEAL_OWN` the player's own card.
+    """
+    TYPE = 19
+    kind = attr.attrib()
+    first = attr.attrib(default=NO_SEAT)
+    first_card = attr.attrib(default=NO_CARD)
+    second = attr.attrib(default=NO_SEAT)
+    second_card = attr.attrib(default=NO_CARD)
+
+
+@attr.attrs(slots=True)
+class Werewolves(object):
+    """
+    The seats holding werewolf cards, as a bit mask.
+    """
+    TYPE = 20
+    seats = attr.attrib()
+
+
+@attr.attrs(slots=True)
+class VotePrompt(object):
+    """
+    Discussion has started; votes are due within `seconds` seconds.
+    """
+    TYPE = 21
+    seconds = attr.attrib()
+
+
+@attr.attrs(slots=True)
+class Results(object):
+    """
+    The results of a game.  `dealt` and `final` hold the cards for every
+    seat followed by the 3 table cards.  `eliminated` is a bit mask of
+    seats.
+    """
+    TYPE = 22
+    winner = attr.attrib()
+    eliminated = attr.attrib()
+    dealt = attr.attrib()
+    final = attr.attrib()
+
+
+@attr.attrs(slots=True)
+class Error(object):
+    """
+    The server rejected a message.
+    """
+    TYPE = 23
+    code = attr.attrib()
+
+
+@attr.attrs(slots=True)
+class Cards(object):
+    """
+    Every seat's card followed by the 3 table cards, as dealt.  Sent to
+    spectators.
+    """
+    TYPE = 24
+    cards = attr.attrib()
+
+
+# Fixed fields, their struct layout and the kind of variable length field
+# that follows them, if any, for each message type.
+_LAYOUTS = [
+    (Join, "B", ("players",), "name"),
+    (NightAction, "BBB", ("action", "first", "second"), None),
+    (Vote, "B", ("seat",), None),
+    (Watch, "16s", ("table",), None),
+    (Seated, "16sB", ("table", "seat"), "names"),
+    (Dealt, "B", ("card",), None),
+    (Phase, "B?", ("card", "active"), None),
+    (Reveal, "BBBBB", ("kind", "first", "first_card", "second", "second_card"), None),
+    (Werewolves, "H", ("seats",), None),
+    (VotePrompt, "H", ("seconds",), None),
+    (Results, "BH", ("winner", "eliminated"), "cards"),
+    (Error, "B", ("code",), None),
+    (Cards, "", (), "deck"),
+]
+_by_class = {}
+_by_type = {}
+_by_name = {}
+for klass, layout, fields, tail in _LAYOUTS:
+    entry = (klass, struct.Struct("!B" + layout), fields, tail)
+    _by_class[klass] = entry
+    _by_type[klass.TYPE] = entry
+    _by_name[klass.__name__] = entry
+del klass, layout, fields, tail, entry
+
+
+def is_name(value):
+    """
+    Returns True if `value` is text short enough to send as a name.
+    """
+    try:
+        return len(value.encode("utf-8")) <= 255
+    except (AttributeError, UnicodeError):
+        return False
+
+
+def _encode_text(text):
+    data = text.encode("utf-8")
+    if len(data) > 255:
+        raise ProtocolError("Text is too long.")
+    return struct.pack("!B", len(data)) + data
+
+
+def _decode_text(data, offset):
+    size = data[offset]
+    offset += 1
+    return data[offset:offset + size].decode("utf-8"), offset + size
+
+
+class BinaryCodec(object):
+    """
+    Encodes messages as fixed struct layouts, each framed by its length.
+    """
+    name = "binary"
+
+    def encode(self, message):
+        klass, layout, fields, tail = _by_class[type(message)]
+        parts = [layout.pack(klass.TYPE, *[getattr(message, f) for f in fields])]
+        if tail == "name":
+            parts.append(_encode_text(message.name))
+        elif tail == "names":
+            parts.append(struct.pack("!B", len(message.names)))
+            parts.extend(_encode_text(name) for name in message.names)
+        elif tail == "cards":
+            parts.append(struct.pack("!B", len(message.dealt)))
+            parts.append(bytes(bytearray(message.dealt)))
+            parts.append(bytes(bytearray(message.final)))
+        elif tail == "deck":
+            parts.append(bytes(bytearray(message.cards)))
+        payload = b"".join(parts)
+        if len(payload) > MAX_FRAME:
+            raise ProtocolError("Message is too long.")
+        return _frame_header.pack(len(payload)) + payload
+
+    def decode(self, payload):
+        """
+        Decode a frame's payload.
+        """
+        data = bytearray(payload)
+        try:
+            klass, layout, fields, tail = _by_type[data[0]]
+            values = layout.unpack_from(payload)
+            kwargs = dict(zip(fields, values[1:]))
+            offset = layout.size
+            if tail == "name":
+                kwargs["name"], offset = _decode_text(data, offset)
+            elif tail == "names":
+                count = data[offset]
+                offset += 1
+                names = []
+                for n in range(count):
+                    name, offset = _decode_text(data, offset)
+                    names.append(name)
+                kwargs["names"] = names
+            elif tail == "cards":
+                count = data[offset]
+                offset += 1
+                kwargs["dealt"] = list(data[offset:offset + count])
+                kwargs["final"] = list(data[offset + count:offset + 2 * count])
+            elif tail == "deck":
+                kwargs["cards"] = list(data[offset:])
+            return klass(**kwargs)
+        except (IndexError, KeyError, struct.error, UnicodeDecodeError):
+            raise ProtocolError("Malformed message.")
+
+    async def read(self, reader):
+        """
+        Read a message from an asyncio stream.  Returns None at the end of
+        the stream.
+        """
+        try:
+            header = await reader.readexactly(_frame_header.size)
+            payload = await reader.readexactly(_frame_header.unpack(header)[0])
+        except EOFError:
+            return None
+        return self.decode(payload)
+
+
+class JsonCodec(object):
+    """
+    Encodes messages as JSON objects, one per line, for debugging.
+    """
+    name = "json"
+
+    def encode(self, message):
+        klass, layout, fields, tail = _by_class[type(message)]
+        obj = attr.asdict(message)
+        if "table" in obj:
+            obj["table"] = _hex(obj["table"])
+        obj["type"] = klass.__name__
+        return json.dumps(obj).encode("utf-8") + b"\n"
+
+    def decode(self, line):
+        try:
+            obj = json.loads(line.decode("utf-8"))
+            klass = _by_name[obj.pop("type")][0]
+            if "table" in obj:
+                obj["table"] = bytes(bytearray.fromhex(obj["table"]))
+            return klass(**obj)
+        except (KeyError, TypeError, ValueError):
+            raise ProtocolError("Malformed message.")
+
+    async def read(self, reader):
+        line = await _read_line(reader)
+        if not line:
+            return None
+        return self.decode(line)
+
+
+async def _read_line(reader):
+    # A line longer than the stream's limit raises ValueError.
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise ProtocolError("Message is too long.")
+
+
+async def read_first_message(reader):
+    """
+    Read the first message a client sends, choosing the codec by its first
+    byte, which is "{" for JSON.  Returns (codec, message), or (None, None)
+    at the end of the stream.
+    """
+    first = await reader.read(1)
+    if not first:
+        return None, None
+    try:
+        if first == b"{":
+            codec = JsonCodec()
+            return codec, codec.decode(first + await _read_line(reader))
+        codec = BinaryCodec()
+        header = first + await reader.readexactly(1)
+        payload = await reader.readexactly(_frame_header.unpack(header)[0])
+    except EOFError:
+        return None, None
+    return codec, codec.decode(payload)
+
+
+def _hex(data):
+    return "".join("{:02x}".format(b) for b in bytearray(data))
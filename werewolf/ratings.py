@@ -0,0 +1,173 @@
+from __future__ import print_function
+import json
+import os
+import attr
+from werewolf import roles
+from werewolf.werewolf import WerewolfGame
+
+TEAM_VILLAGE = roles.TEAM_VILLAGE
+TEAM_WEREWOLVES = roles.TEAM_WEREWOLVES
+TEAM_TANNER = roles.TEAM_TANNER
+
+_winning_teams = {
+    WerewolfGame.WINNER_VILLAGE: frozenset([TEAM_VILLAGE]),
+    WerewolfGame.WINNER_WEREWOLVES: frozenset([TEAM_WEREWOLVES]),
+    WerewolfGame.WINNER_NO_ONE: frozenset(),
+    WerewolfGame.WINNER_TANNER: frozenset([TEAM_TANNER]),
+    WerewolfGame.WINNER_TANNER_AND_VILLAGE: frozenset([TEAM_TANNER, TEAM_VILLAGE]),
+}
+
+
+def team_for_card(card):
+    """
+    Return the team a player holding `card` at the end of the game plays for.
+    """
+    return roles.registry.get_role(card).team
+
+
+def winning_teams(winner):
+    """
+    Return the set of teams that won for a `WINNER_XXX` code.
+    """
+    return _winning_teams[winner]
+
+
+@attr.attrs(slots=True)
+class Rating(object):
+    rating = attr.attrib()
+    games = attr.attrib(default=0)
+
+
+class RatingService(object):
+    """
+    Elo-style player ratings updated incrementally from completed games.
+
+    Each game is scored as a match between the winning players and the
+    losing players.  Each player on the smaller team moves by the Elo delta
+    for the match, and the players on the larger team share the same
+    total, so the total rating is conserved and no player moves by more
+    than the delta whatever the sizes of the teams.  Only the ratings of
+    the players in the game are touched, so recording a game costs
+    O(players in game).
+    """
+
+    def __init__(self, initial_rating=1500.0, k_factor=32.0):
+        self.initial_rating = initial_rating
+        self.k_factor = k_factor
+        self._ratings = {}
+
+    def get_rating(self, player):
+        """
+        Return the `Rating` for a player, or None if the player is unrated.
+        """
+        return self._ratings.get(player)
+
+    def ratings(self):
+        """
+        Return a mapping of players to `Rating` objects.
+        """
+        return dict(self._ratings)
+
+    def record_results(self, results):
+        """
+        Update ratings from a `PostGameInfo` object.
+        """
+        self.record_game(results.player_cards, results.winner)
+
+    def record_game(self, player_cards, winner):
+        """
+        Update ratings from a mapping of players to final cards and a
+        `WINNER_XXX` code.
+        """
+        ratings = self._ratings
+        initial_rating = self.initial_rating
+        teams = winning_teams(winner)
+        winners = []
+        losers = []
+        for player, card in player_cards.items():
+            rating = ratings.get(player)
+            if rating is None:
+                rating = Rating(initial_rating)
+                ratings[player] = rating
+            rating.games += 1
+            if team_for_card(card) in teams:
+                winners.append(rating)
+            else:
+                losers.append(rating)
+        if len(winners) == 0 or len(losers) == 0:
+            # No one to score against.
+            return
+        winner_avg = sum(r.rating for r in winners) / len(winners)
+        loser_avg = sum(r.rating for r in losers) / len(losers)
+        expected = 1.0 / (1.0 + 10.0 ** ((loser_avg - winner_avg) / 400.0))
+        # The points the smaller team's players win or lose between them.
+        points = self.k_factor * (1.0 - expected) * min(len(winners), len(losers))
+        gain = points / len(winners)
+        loss = points / len(losers)
+        for rating in winners:
+            rating.rating += gain
+        for rating in losers:
+            rating.rating -= loss
+
+    def backfill(self, journal):
+        """
+        Replay a journal of completed games (an iterable of lines as written
+        by `write_journal_entry()`).  Returns the number of games replayed.
+        """
+        record_game = self.record_game
+        loads = json.loads
+        count = 0
+        for line in journal:
+            if not line.strip():
+                continue
+            entry = loads(line)
+            record_game(entry["player_cards"], entry["winner"])
+            count += 1
+        return count
+
+    def save(self, path):
+        """
+        Atomically write the current ratings to `path`.
+        """
+        doc = {
+            "initial_rating": self.initial_rating,
+            "k_factor": self.k_factor,
+            "ratings": dict(
+                (player, [r.rating, r.games])
+                for player, r in self._ratings.items()),
+        }
+        tmp_path = "{}.tmp".format(path)
+        with open(tmp_path, "w") as f:
+            json.dump(doc, f)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(klass, path):
+        """
+        Load ratings written by `save()`.  If `path` does not exist, a new
+        service with no ratings is returned.
+        """
+        if not os.path.exists(path):
+            return klass()
+        with open(path) as f:
+            doc = json.load(f)
+        service = klass(
+            initial_rating=doc["initial_rating"],
+            k_factor=doc["k_factor"])
+        ratings = service._ratings
+        for player, (rating, games) in doc["ratings"].items():
+            ratings[player] = Rating(rating, games)
+        return service
+
+
+def write_journal_entry(f, results):
+    """
+    Append a `PostGameInfo` object to a journal file as a single line.
+    """
+    # The cards may be a read-only view, which JSON can't encode.
+    entry = {
+        "winner": results.winner,
+        "player_cards": dict(results.player_cards),
+    }
+    f.write(json.dumps(entry, sort_keys=True))
+    f.write("\n")
@@ -0,0 +1,215 @@
+from __future__ import print_function
+import array
+import os
+import socket
+from werewolf.werewolf import WerewolfGame
+
+MAX_PLAYERS = 10
+TABLE_CARDS = 3
+NO_CARD = 255
+NO_SEAT = 255
+
+# Fixed-width columns: (name, array typecode, numpy dtype, values per row).
+# Card columns hold the cards for seats 0-9 followed by the 3 table cards.
+COLUMNS = [
+    ("player_count", "B", "u1", 1),
+    ("dealt", "B", "u1", MAX_PLAYERS + TABLE_CARDS),
+    ("final", "B", "u1", MAX_PLAYERS + TABLE_CARDS),
+    ("votes", "B", "u1", MAX_PLAYERS),
+    ("eliminated", "H", "u2", 1),
+    ("winner", "B", "u1", 1),
+]
+COLUMN_NAMES = [c[0] for c in COLUMNS]
+_column_widths = dict(
+    (name, array.array(typecode).itemsize * width)
+    for name, typecode, dtype, width in COLUMNS)
+
+
+def _column_path(shard_path, name):
+    return os.path.join(shard_path, "{}.col".format(name))
+
+
+def _to_bytes(a):
+    if hasattr(a, "tobytes"):
+        return a.tobytes()
+    return a.tostring()
+
+
+class ResultWriter(object):
+    """
+    Appends `GameRecord` objects to a shard of a columnar result store.
+
+    Each writer owns its own shard directory inside the store, so any number
+    of worker processes may write to the same store at once.  Rows are
+    buffered and appended to one file per column.  `rows` counts the rows
+    written to the files.
+
+    An existing shard is first cut back to its complete rows, or to `rows`
+    rows if given, dropping any written after a checkpoint.
+    """
+
+    def __init__(self, path, shard=None, buffer_rows=4096, rows=None):
+        if shard is None:
+            shard = "{}-{}".format(socket.gethostname(), os.getpid())
+        self.path = os.path.join(path, "shard-{}".format(shard))
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.buffer_rows = buffer_rows
+        self._files = {}
+        for name in COLUMN_NAMES:
+            self._files[name] = open(_column_path(self.path, name), "ab")
+        complete = Shard(self.path).rows
+        if rows is None or rows > complete:
+            rows = complete
+        for name in COLUMN_NAMES:
+            self._files[name].truncate(rows * _column_widths[name])
+        self.rows = rows
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        self._buffers = dict(
+            (name, array.array(typecode))
+            for name, typecode, dtype, width in COLUMNS)
+        self._rows = 0
+
+    def write(self, record):
+        """
+        Buffer a `GameRecord`.
+        """
+        buffers = self._buffers
+        players = record.players
+        results = record.results
+        seats = dict((player, seat) for seat, player in enumerate(players))
+        padding = [NO_CARD] * (MAX_PLAYERS - len(players))
+        player_cards = results.orig_player_cards
+        dealt = buffers["dealt"]
+        dealt.extend(player_cards[p] for p in players)
+        dealt.extend(padding)
+        dealt.extend(results.orig_table_cards)
+        player_cards = results.player_cards
+        final = buffers["final"]
+        final.extend(player_cards[p] for p in players)
+        final.extend(padding)
+        final.extend(results.table_cards)
+        votes = buffers["votes"]
+        votes.extend(seats[record.votes[p]] for p in players)
+        votes.extend([NO_SEAT] * (MAX_PLAYERS - len(players)))
+        eliminated = 0
+        for player in record.eliminated:
+            eliminated |= 1 << seats[player]
+        buffers["eliminated"].append(eliminated)
+        buffers["winner"].append(results.winner)
+        buffers["player_count"].append(len(players))
+        self._rows += 1
+        if self._rows >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered rows to the column files.
+        """
+        if self._rows == 0:
+            return
+        for name in COLUMN_NAMES:
+            f = self._files[name]
+            f.write(_to_bytes(self._buffers[name]))
+            f.flush()
+        self.rows += self._rows
+        self._reset_buffers()
+
+    def close(self):
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class Shard(object):
+    """
+    The columns of one shard, memory-mapped as read-only NumPy arrays.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        rows = None
+        for name in COLUMN_NAMES:
+            size = os.path.getsize(_column_path(path, name))
+            # A writer may be part way through appending a batch, so only
+            # the rows present in every column are complete.
+            column_rows = size // _column_widths[name]
+            if rows is None or column_rows < rows:
+                rows = column_rows
+        self.rows = rows
+        self._columns = {}
+
+    def column(self, name):
+        """
+        Return a column as a read-only array of shape (rows, width), or
+        (rows,) for single-value columns.
+        """
+        column = self._columns.get(name)
+        if column is None:
+            for cname, typecode, dtype, width in COLUMNS:
+                if cname == name:
+                    break
+            else:
+                raise KeyError(name)
+            import numpy
+            if self.rows == 0:
+                column = numpy.zeros((0, width), dtype=dtype)
+            else:
+                column = numpy.memmap(
+                    _column_path(self.path, name),
+                    dtype=dtype,
+                    mode="r",
+                    shape=(self.rows, width))
+            if width == 1:
+                column = column.reshape(self.rows)
+            self._columns[name] = column
+        return column
+
+
+class ResultReader(object):
+    """
+    Reads a columnar result store without loading it into memory.  Columns
+    are exposed as memory-mapped NumPy arrays, one per shard.
+    """
+
+    def __init__(self, path):
+        # NumPy is only needed to read a store, not to write one.
+        try:
+            import numpy
+        except ImportError:
+            raise Exception("Reading a result store requires NumPy.")
+        self.path = path
+        self.shards = []
+        for entry in sorted(os.listdir(path)):
+            shard_path = os.path.join(path, entry)
+            if entry.startswith("shard-") and os.path.isdir(shard_path):
+                self.shards.append(Shard(shard_path))
+
+    def __len__(self):
+        return sum(shard.rows for shard in self.shards)
+
+    def column(self, name):
+        """
+        Return a list of the arrays for column `name`, one per shard.
+        """
+        return [shard.column(name) for shard in self.shards]
+
+    def winner_counts(self):
+        """
+        Return an array of how many games each `WINNER_XXX` code won.
+        """
+        import numpy
+        codes = WerewolfGame.WINNER_TANNER_AND_VILLAGE + 1
+        counts = numpy.zeros(codes, dtype="i8")
+        for winners in self.column("winner"):
+            counts += numpy.bincount(winners, minlength=codes)[:codes]
+        return counts
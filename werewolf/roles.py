@@ -0,0 +1,168 @@
+import attr
+
+TEAM_VILLAGE = "village"
+TEAM_WEREWOLVES = "werewolves"
+TEAM_TANNER = "tanner"
+
+
+@attr.attrs(frozen=True)
+class NightAction(object):
+    """
+    An input a role may use during its night phase.  If `uses_power` is
+    True, using the action activates the role's power and the action may not
+    be used again that night.
+    """
+    input = attr.attrib()
+    uses_power = attr.attrib(default=False)
+
+
+@attr.attrs(frozen=True)
+class Role(object):
+    """
+    A role and its card.  Roles with a `wake_order` wake up during the night
+    in ascending order and may use their `actions`.
+    """
+    tag = attr.attrib()
+    card = attr.attrib()
+    team = attr.attrib()
+    wake_order = attr.attrib(default=None)
+    phase_name = attr.attrib(default=None)
+    desc = attr.attrib(default=None)
+    actions = attr.attrib(default=())
+
+    @property
+    def has_power(self):
+        return any(action.uses_power for action in self.actions)
+
+
+class RoleRegistry(object):
+    """
+    The roles known to the game engine.
+    """
+
+    def __init__(self):
+        self._roles = []
+        self._by_card = {}
+        self._by_tag = {}
+        self._phase_plans = {}
+
+    def register(self, role):
+        """
+        Register a role.  Returns the role.
+        """
+        if role.card in self._by_card:
+            raise Exception("Card {} is already registered.".format(role.card))
+        if role.tag in self._by_tag:
+            raise Exception("Role '{}' is already registered.".format(role.tag))
+        self._roles.append(role)
+        self._by_card[role.card] = role
+        self._by_tag[role.tag] = role
+        self._phase_plans.clear()
+        return role
+
+    def roles(self):
+        """
+        Return a list of all registered roles.
+        """
+        return list(self._roles)
+
+    def night_roles(self):
+        """
+        Return a list of the roles that wake up at night, in wake order.
+        """
+        roles = [r for r in self._roles if r.wake_order is not None]
+        roles.sort(key=lambda r: r.wake_order)
+        return roles
+
+    def get_role(self, card):
+        """
+        Return the role for a card.
+        """
+        return self._by_card[card]
+
+    def get_role_by_tag(self, tag):
+        """
+        Return the role with tag `tag`.
+        """
+        return self._by_tag[tag]
+
+    def compile_phase_plan(self, deck):
+        """
+        Return a tuple of the night roles that wake up for a game dealt from
+        `deck`, in wake order.  Roles with no card in the deck are omitted.
+        Plans are cached per set of cards.
+        """
+        cards = frozenset(deck)
+        plan = self._phase_plans.get(cards)
+        if plan is None:
+            plan = tuple(r for r in self.night_roles() if r.card in cards)
+            self._phase_plans[cards] = plan
+        return plan
+
+
+# The engine's state machine is built from this registry when
+# `werewolf.werewolf` is imported, so roles must be registered here.
+registry = RoleRegistry()
+
+WEREWOLF = registry.register(Role(
+    tag="werewolf",
+    card=0,
+    team=TEAM_WEREWOLVES,
+    wake_order=10,
+    phase_name="Werewolf Phase",
+    desc="Werewolves open their eyes and look for each other.",
+    actions=(NightAction("identify_werewolves"),)))
+SEER = registry.register(Role(
+    tag="seer",
+    card=1,
+    team=TEAM_VILLAGE,
+    wake_order=30,
+    phase_name="Seer Phase",
+    desc="The Seer may look at one player's card or 2 cards on the table.",
+    actions=(
+        NightAction("seer_view_player_card", uses_power=True),
+        NightAction("seer_view_table_cards", uses_power=True))))
+ROBBER = registry.register(Role(
+    tag="robber",
+    card=2,
+    team=TEAM_VILLAGE,
+    wake_order=40,
+    phase_name="Robber Phase",
+    desc="The Robber may exchange his card for another player's card and look at it.",
+    actions=(NightAction("robber_steal_card", uses_power=True),)))
+TROUBLEMAKER = registry.register(Role(
+    tag="troublemaker",
+    card=3,
+    team=TEAM_VILLAGE,
+    wake_order=50,
+    phase_name="Troublemaker Phase",
+    desc="The Troublemaker may exchange 2 other player's cards without looking at them.",
+    actions=(NightAction("troublemaker_switch_cards", uses_power=True),)))
+VILLAGER = registry.register(Role(
+    tag="villager",
+    card=4,
+    team=TEAM_VILLAGE))
+MINION = registry.register(Role(
+    tag="minion",
+    card=5,
+    team=TEAM_WEREWOLVES,
+    wake_order=20,
+    phase_name="Minion Phase",
+    desc="Minion, wake up and see the werewolves.",
+    actions=(NightAction("identify_werewolves"),)))
+INSOMNIAC = registry.register(Role(
+    tag="insomniac",
+    card=6,
+    team=TEAM_VILLAGE,
+    wake_order=60,
+    phase_name="Insomniac Phase",
+    desc="The Insomniac wakes up after everyone else to see if her card changed.",
+    actions=(NightAction("insomniac_view_card"),)))
+HUNTER = registry.register(Role(
+    tag="hunter",
+    card=7,
+    team=TEAM_VILLAGE))
+TANNER = registry.register(Role(
+    tag="tanner",
+    card=8,
+    team=TEAM_TANNER))
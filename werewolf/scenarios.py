@@ -0,0 +1,391 @@
+from __future__ import print_function
+import gzip
+import io
+import itertools
+import json
+import multiprocessing
+import random
+import time
+import attr
+from werewolf import roles
+from werewolf.werewolf import WerewolfGame, tally_votes
+
+WINNER_TAGS = {
+    WerewolfGame.WINNER_VILLAGE: "village",
+    WerewolfGame.WINNER_WEREWOLVES: "werewolves",
+    WerewolfGame.WINNER_NO_ONE: "no_one",
+    WerewolfGame.WINNER_TANNER: "tanner",
+    WerewolfGame.WINNER_TANNER_AND_VILLAGE: "tanner_and_village",
+}
+_winner_codes = dict((tag, code) for code, tag in WINNER_TAGS.items())
+
+# The teams that win with each outcome.
+WINNING_TEAMS = {
+    WerewolfGame.WINNER_VILLAGE: frozenset([roles.TEAM_VILLAGE]),
+    WerewolfGame.WINNER_WEREWOLVES: frozenset([roles.TEAM_WEREWOLVES]),
+    WerewolfGame.WINNER_NO_ONE: frozenset(),
+    WerewolfGame.WINNER_TANNER: frozenset([roles.TEAM_TANNER]),
+    WerewolfGame.WINNER_TANNER_AND_VILLAGE: frozenset([roles.TEAM_TANNER, roles.TEAM_VILLAGE]),
+}
+
+
+class ScenarioError(Exception):
+    """
+    A scenario is malformed or could not be played.
+    """
+
+
+class StackedDeck(object):
+    """
+    Stands in for a game's random number generator so the cards are dealt
+    in a fixed order: "shuffling" the deck lays out `cards`, each player's
+    card in seat order followed by the 3 table cards.
+    """
+
+    def __init__(self, cards):
+        self.cards = list(cards)
+        self._sorted = sorted(self.cards)
+
+    def shuffle(self, deck):
+        if sorted(deck) != self._sorted:
+            raise ScenarioError("The deck doesn't match the scenario's cards.")
+        deck[:] = self.cards
+
+
+@attr.attrs(slots=True)
+class Scenario(object):
+    """
+    A game with a predetermined deal.  `cards` holds each seat's card
+    followed by the table cards.  `actions` maps the tag of each night role
+    that acts to (input name, args).  `votes` holds the seat each player
+    votes for.  `winner` is the expected `WINNER_XXX` code and `eliminated`
+    the seats expected to be eliminated.
+    """
+    cards = attr.attrib()
+    actions = attr.attrib()
+    votes = attr.attrib()
+    winner = attr.attrib()
+    eliminated = attr.attrib(default=None)
+
+    @property
+    def players(self):
+        return len(self.cards) - 3
+
+    def to_json(self):
+        obj = {
+            "deal": [WerewolfGame.get_card_name(card) for card in self.cards],
+            "night": dict(
+                (tag, [input_name] + list(args))
+                for tag, (input_name, args) in self.actions.items()),
+            "votes": list(self.votes),
+            "winner": WINNER_TAGS[self.winner],
+        }
+        if self.eliminated is not None:
+            obj["eliminated"] = list(self.eliminated)
+        return json.dumps(obj, sort_keys=True)
+
+    @classmethod
+    def from_json(klass, line):
+        try:
+            obj = json.loads(line)
+            cards = [roles.registry.get_role_by_tag(tag).card for tag in obj["deal"]]
+            actions = {}
+            for tag, action in obj.get("night", {}).items():
+                role = roles.registry.get_role_by_tag(tag)
+                if action[0] not in [a.input for a in role.actions]:
+                    raise ScenarioError(
+                        "'{}' is not a night action of the {}.".format(action[0], tag))
+                actions[tag] = (action[0], tuple(action[1:]))
+            return klass(
+                cards=cards,
+                actions=actions,
+                votes=list(obj["votes"]),
+                winner=_winner_codes[obj["winner"]],
+                eliminated=obj.get("eliminated"))
+        except (KeyError, IndexError, TypeError, ValueError) as ex:
+            raise ScenarioError("Malformed scenario: {!r}".format(ex))
+
+
+def open_corpus(path, mode="r"):
+    """
+    Open a scenario corpus, one JSON scenario per line, compressed with gzip
+    if its name ends with ".gz".
+    """
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, mode + "b"), encoding="utf-8")
+    return io.open(path, mode, encoding="utf-8")
+
+
+def _scenario_lines(f):
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line
+
+
+def _parse(number, line):
+    try:
+        return Scenario.from_json(line)
+    except ScenarioError as ex:
+        raise ScenarioError("Line {}: {}".format(number, ex))
+
+
+def read_scenarios(f):
+    """
+    Yield (line number, `Scenario`) for each scenario in a corpus file.
+    """
+    for number, line in _scenario_lines(f):
+        yield number, _parse(number, line)
+
+
+def play_scenario(scenario):
+    """
+    Play a scenario's game.  The players are labelled by seat.  Returns
+    (`PostGameInfo`, eliminated seats).
+    """
+    cards = scenario.cards
+    seats = list(range(scenario.players))
+    if len(scenario.votes) != len(seats):
+        raise ScenarioError("Expected {} votes.".format(len(seats)))
+    werewolf_count = 0
+    deck_roles = set()
+    for card in cards:
+        if card == WerewolfGame.CARD_WEREWOLF:
+            werewolf_count += 1
+        elif card != WerewolfGame.CARD_VILLAGER:
+            deck_roles.add(card)
+    game = WerewolfGame(StackedDeck(cards), read_only_views=True)
+    game.add_players(seats)
+    game.deal_cards(werewolf_count, deck_roles)
+    actions = scenario.actions
+    while True:
+        game.advance_phase()
+        role = game.query_active_role()
+        if role is None:
+            break
+        action = actions.get(role.tag)
+        if action is not None:
+            getattr(game, action[0])(*action[1])
+    votes = dict(zip(seats, scenario.votes))
+    eliminated = tally_votes(seats, votes, game.query_hunter())
+    game.eliminate_players(eliminated)
+    return game.query_post_game_results(), eliminated
+
+
+def make_deck(players, werewolf_count=2, deck_roles=frozenset([
+        WerewolfGame.CARD_SEER, WerewolfGame.CARD_ROBBER, WerewolfGame.CARD_TROUBLEMAKER])):
+    """
+    Returns the sorted cards for a game, as `WerewolfGame.build_deck()`
+    makes up the deck.  Raises ValueError if the werewolves and roles
+    don't all fit in the deck, where the engine would drop some.
+    """
+    size = werewolf_count + len(deck_roles)
+    if size > players + 3:
+        raise ValueError("{} players can't be dealt {} cards.".format(players, size))
+    return sorted(WerewolfGame.build_deck(players, werewolf_count, deck_roles))
+
+
+def distinct_deals(deck):
+    """
+    Yield each distinct ordering of the cards in `deck` once, in sorted
+    order.  Every distinct deal is equally likely.
+    """
+    counts = {}
+    for card in deck:
+        counts[card] = counts.get(card, 0) + 1
+    cards = sorted(counts)
+    deal = []
+
+    def place(remaining):
+        if remaining == 0:
+            yield tuple(deal)
+            return
+        for card in cards:
+            if counts[card]:
+                counts[card] -= 1
+                deal.append(card)
+                for result in place(remaining - 1):
+                    yield result
+                deal.pop()
+                counts[card] += 1
+
+    return place(len(deck))
+
+
+class OutcomeTable(object):
+    """
+    The outcomes of games dealt from `deck`, as the engine decides them.
+    The outcome only depends on the cards the players end the night holding
+    and the cards eliminated, so outcomes are memoized by those.
+    """
+
+    def __init__(self, deck):
+        self.deck = sorted(deck)
+        self.werewolf_count = self.deck.count(WerewolfGame.CARD_WEREWOLF)
+        self.deck_roles = set(self.deck) - set(
+            [WerewolfGame.CARD_WEREWOLF, WerewolfGame.CARD_VILLAGER])
+        self._winners = {}
+
+    def winner(self, cards, eliminated):
+        """
+        Returns the `WINNER_XXX` code when the players end the night holding
+        `cards`, in seat order, and the seats `eliminated` are eliminated.
+        """
+        key = (tuple(sorted(cards)), tuple(sorted(cards[s] for s in eliminated)))
+        winner = self._winners.get(key)
+        if winner is None:
+            table = list(self.deck)
+            for card in cards:
+                table.remove(card)
+            game = WerewolfGame(StackedDeck(list(cards) + table), read_only_views=True)
+            game.add_players(list(range(len(cards))))
+            game.deal_cards(self.werewolf_count, self.deck_roles)
+            while True:
+                game.advance_phase()
+                if game.query_active_role() is None:
+                    break
+            game.eliminate_players(list(eliminated))
+            winner = game.query_post_game_results().winner
+            self._winners[key] = winner
+        return winner
+
+
+def check_scenario(scenario):
+    """
+    Play a scenario.  Returns None if the game ends as expected, or a
+    description of the difference.
+    """
+    try:
+        results, eliminated = play_scenario(scenario)
+    except Exception as ex:
+        return "raised {}: {}".format(type(ex).__name__, ex)
+    if results.winner != scenario.winner:
+        return "winner was {}, expected {}".format(
+            WINNER_TAGS.get(results.winner, results.winner),
+            WINNER_TAGS[scenario.winner])
+    if scenario.eliminated is not None and sorted(eliminated) != sorted(scenario.eliminated):
+        return "eliminated {}, expected {}".format(
+            sorted(eliminated), sorted(scenario.eliminated))
+    return None
+
+
+@attr.attrs
+class CorpusReport(object):
+    scenarios = attr.attrib()
+    # (path, line number, description) for the first mismatches.
+    mismatches = attr.attrib()
+    mismatch_count = attr.attrib()
+    elapsed = attr.attrib()
+
+    @property
+    def scenarios_per_second(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.scenarios / self.elapsed
+
+
+def _check_chunk(chunk):
+    """
+    Returns (scenarios checked, [(line number, problem)]) for a list of
+    (line number, line).
+    """
+    problems = []
+    for number, line in chunk:
+        problem = check_scenario(_parse(number, line))
+        if problem is not None:
+            problems.append((number, problem))
+    return len(chunk), problems
+
+
+def _chunks(f, size):
+    lines = _scenario_lines(f)
+    while True:
+        chunk = list(itertools.islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_corpus(paths, max_mismatches=20, workers=1, chunk_size=2000):
+    """
+    Stream the scenarios in the corpus files `paths` through the engine,
+    in chunks of `chunk_size` scenarios spread over `workers` processes.
+    Returns a `CorpusReport`.
+    """
+    count = 0
+    mismatches = []
+    mismatch_count = 0
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+    start = time.time()
+    try:
+        for path in paths:
+            with open_corpus(path) as f:
+                chunks = _chunks(f, chunk_size)
+                if pool is None:
+                    results = (_check_chunk(chunk) for chunk in chunks)
+                else:
+                    results = pool.imap(_check_chunk, chunks)
+                for checked, problems in results:
+                    count += checked
+                    mismatch_count += len(problems)
+                    for number, problem in problems[:max_mismatches - len(mismatches)]:
+                        mismatches.append((path, number, problem))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return CorpusReport(
+        scenarios=count,
+        mismatches=mismatches,
+        mismatch_count=mismatch_count,
+        elapsed=time.time() - start)
+
+
+def random_action(role, seat, seats, rng):
+    """
+    Returns a random night action (input name, args) for the player in
+    `seat` holding `role`, or None to pass.
+    """
+    others = [s for s in seats if s != seat]
+    if role.tag == "seer":
+        if rng.random() < 0.5:
+            return ("seer_view_player_card", (rng.choice(others),))
+        return ("seer_view_table_cards", tuple(rng.sample((0, 1, 2), 2)))
+    if role.tag == "robber" and rng.random() < 0.75:
+        return ("robber_steal_card", (rng.choice(others),))
+    if role.tag == "troublemaker" and len(others) >= 2 and rng.random() < 0.75:
+        return ("troublemaker_switch_cards", tuple(rng.sample(others, 2)))
+    return None
+
+
+def generate_scenarios(count, player_counts, werewolf_count, deck_roles, seed=None):
+    """
+    Yield `count` random scenarios for tables of the sizes in
+    `player_counts`, with their outcomes as the engine plays them now.
+    """
+    rng = random.Random(seed)
+    for n in range(count):
+        players = rng.choice(player_counts)
+        seats = list(range(players))
+        deck = [WerewolfGame.CARD_WEREWOLF] * werewolf_count
+        deck.extend(sorted(deck_roles))
+        deck.extend([WerewolfGame.CARD_VILLAGER] * (players + 3 - len(deck)))
+        deck = deck[:players + 3]
+        rng.shuffle(deck)
+        actions = {}
+        for seat in seats:
+            role = roles.registry.get_role(deck[seat])
+            action = random_action(role, seat, seats, rng)
+            if action is not None:
+                actions[role.tag] = action
+        scenario = Scenario(
+            cards=deck,
+            actions=actions,
+            votes=[rng.choice(seats) for seat in seats],
+            winner=None)
+        results, eliminated = play_scenario(scenario)
+        scenario.winner = results.winner
+        scenario.eliminated = sorted(eliminated)
+        yield scenario
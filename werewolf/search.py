@@ -0,0 +1,307 @@
+from __future__ import division, print_function
+import collections
+import itertools
+import random
+import attr
+from werewolf import roles
+from werewolf.scenarios import WINNING_TEAMS, OutcomeTable, distinct_deals, make_deck
+from werewolf.werewolf import WerewolfGame, tally_votes
+
+# Night roles whose actions move cards.  The others only learn something,
+# which the voting policies here don't use, so their choices aren't searched.
+_SWAPPING_ROLES = ("robber", "troublemaker")
+
+MODE_RANDOM = "random"
+MODE_BEST = "best"
+
+_OUTCOMES = len(WINNING_TEAMS)
+
+
+def _werewolf_team(card):
+    return roles.registry.get_role(card).team == roles.TEAM_WEREWOLVES
+
+
+def informed_votes(cards):
+    """
+    A voting policy for players who know every final card.  Werewolves and
+    the Minion vote for the next player on their left who isn't a werewolf;
+    the others vote for the next werewolf on their left, or for the player
+    on their left if there is none.
+    """
+    players = len(cards)
+    votes = []
+    for seat in range(players):
+        left = [(seat + n) % players for n in range(1, players)]
+        if _werewolf_team(cards[seat]):
+            targets = [s for s in left if cards[s] != WerewolfGame.CARD_WEREWOLF]
+        else:
+            targets = [s for s in left if cards[s] == WerewolfGame.CARD_WEREWOLF]
+        votes.append(targets[0] if targets else left[0])
+    return votes
+
+
+def circle_votes(cards):
+    """
+    A voting policy where every player votes for the player on their left,
+    so no one is eliminated.
+    """
+    players = len(cards)
+    return [(seat + 1) % players for seat in range(players)]
+
+
+POLICIES = {
+    "informed": informed_votes,
+    "circle": circle_votes,
+}
+
+
+class ZobristKeys(object):
+    """
+    Random 64-bit keys for hashing the cards the players hold: the hash of
+    a layout is the exclusive or of a key for each seat and the card in it,
+    so swapping two cards updates it with four exclusive ors.  There is
+    also a key for each night role's turn to act from each seat.
+    """
+
+    def __init__(self, players, cards, turns, seed=0):
+        rng = random.Random(seed)
+        self.seats = [dict((card, rng.getrandbits(64)) for card in sorted(cards))
+                      for seat in range(players)]
+        self.turns = [[rng.getrandbits(64) for seat in range(players)]
+                      for turn in range(turns)]
+
+    def layout(self, cards):
+        h = 0
+        for seat, card in enumerate(cards):
+            h ^= self.seats[seat][card]
+        return h
+
+    def swap(self, h, cards, a, b):
+        """
+        Returns the hash of `cards` once the cards in seats `a` and `b` are
+        swapped, given its hash `h` before.
+        """
+        seat_a = self.seats[a]
+        seat_b = self.seats[b]
+        card_a = cards[a]
+        card_b = cards[b]
+        return h ^ seat_a[card_a] ^ seat_b[card_b] ^ seat_a[card_b] ^ seat_b[card_a]
+
+
+class TranspositionTable(object):
+    """
+    Search results keyed by position hash, holding at most `capacity`
+    entries.  When it is full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, capacity=1 << 20):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entries = self._entries
+        value = entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        entries = self._entries
+        entries[key] = value
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+@attr.attrs(slots=True)
+class SearchResult(object):
+    """
+    The outcome of a night search: the probability of each `WINNER_XXX`
+    code, and with `MODE_BEST`, the night actions chosen as
+    [(role tag, seats switched or None to pass)].
+    """
+    outcomes = attr.attrib()
+    line = attr.attrib(default=None)
+
+    def win_rate(self, team):
+        return sum(p for winner, p in enumerate(self.outcomes)
+                   if team in WINNING_TEAMS[winner])
+
+
+class NightSearch(object):
+    """
+    Searches every Robber and Troublemaker choice from a deal and evaluates
+    the cards the players end up holding with a voting policy, which maps
+    the final cards to the seat each player votes for.
+
+    With `MODE_RANDOM`, each role chooses uniformly at random.  With
+    `MODE_BEST`, each role chooses what gives its team the best chance to
+    win, knowing all the cards.
+
+    Different choices often lead to the same cards, from one deal or many,
+    so positions are cached in a `TranspositionTable` keyed by the Zobrist
+    hash of the cards and the turns left to play.
+    """
+
+    def __init__(self, players, werewolf_count=2, deck_roles=frozenset([
+            WerewolfGame.CARD_SEER, WerewolfGame.CARD_ROBBER, WerewolfGame.CARD_TROUBLEMAKER]),
+            policy=informed_votes, mode=MODE_RANDOM, capacity=1 << 20, seed=0):
+        if mode not in (MODE_RANDOM, MODE_BEST):
+            raise ValueError("Unknown search mode '{}'.".format(mode))
+        self.players = players
+        self.deck = make_deck(players, werewolf_count, deck_roles)
+        self.policy = policy
+        self.mode = mode
+        self.plan = [r for r in roles.registry.compile_phase_plan(self.deck)
+                     if r.tag in _SWAPPING_ROLES]
+        self.outcomes = OutcomeTable(self.deck)
+        self.table = TranspositionTable(capacity)
+        self.keys = ZobristKeys(players, set(self.deck), len(self.plan), seed)
+        self.nodes = 0
+        seats = list(range(players))
+        self._choices = {}
+        for role in self.plan:
+            for seat in seats:
+                others = [s for s in seats if s != seat]
+                if role.tag == "robber":
+                    choices = [(seat, s) for s in others]
+                else:
+                    choices = list(itertools.combinations(others, 2))
+                self._choices[(role.tag, seat)] = choices + [None]
+
+    def _turns(self, deal):
+        """
+        Returns [(role, seat, key)] for the roles dealt to players that move
+        cards, where `key` is the exclusive or of the keys of that turn and
+        every later one.
+        """
+        turns = []
+        for turn, role in enumerate(self.plan):
+            for seat in range(self.players):
+                if deal[seat] == role.card:
+                    turns.append((role, seat, self.keys.turns[turn][seat]))
+        key = 0
+        for n in reversed(range(len(turns))):
+            key ^= turns[n][2]
+            turns[n] = turns[n][:2] + (key,)
+        return turns
+
+    def analyze(self, deal):
+        """
+        Search the night from `deal`, the players' cards in seat order
+        followed by the table cards.  Returns a `SearchResult`.
+        """
+        cards = list(deal[:self.players])
+        turns = self._turns(deal)
+        h = self.keys.layout(cards)
+        outcomes = self._search(cards, h, turns, 0)
+        line = None
+        if self.mode == MODE_BEST:
+            line = []
+            for n, (role, seat, key) in enumerate(turns):
+                choice = self._best_choice(cards, h, turns, n)
+                line.append((role.tag, choice))
+                if choice is not None:
+                    h = self.keys.swap(h, cards, *choice)
+                    a, b = choice
+                    cards[a], cards[b] = cards[b], cards[a]
+        return SearchResult(outcomes=outcomes, line=line)
+
+    def analyze_all(self):
+        """
+        Search the night from every distinct deal, which are equally likely.
+        Returns a `SearchResult` with the overall outcomes.
+        """
+        totals = [0.0] * _OUTCOMES
+        deals = 0
+        for deal in distinct_deals(self.deck):
+            outcomes = self.analyze(deal).outcomes
+            for winner in range(_OUTCOMES):
+                totals[winner] += outcomes[winner]
+            deals += 1
+        return SearchResult(outcomes=tuple(total / deals for total in totals))
+
+    def _leaf(self, cards):
+        seats = range(self.players)
+        hunter = None
+        if WerewolfGame.CARD_HUNTER in cards:
+            hunter = cards.index(WerewolfGame.CARD_HUNTER)
+        votes = dict(zip(seats, self.policy(cards)))
+        winner = self.outcomes.winner(cards, tally_votes(seats, votes, hunter))
+        outcomes = [0.0] * _OUTCOMES
+        outcomes[winner] = 1.0
+        return tuple(outcomes)
+
+    def _children(self, cards, h, turns, n):
+        """
+        Yield (choice, outcomes) for each choice on turn `n`.
+        """
+        role, seat, key = turns[n]
+        for choice in self._choices[(role.tag, seat)]:
+            if choice is None:
+                yield choice, self._search(cards, h, turns, n + 1)
+                continue
+            a, b = choice
+            child = self.keys.swap(h, cards, a, b)
+            cards[a], cards[b] = cards[b], cards[a]
+            outcomes = self._search(cards, child, turns, n + 1)
+            cards[a], cards[b] = cards[b], cards[a]
+            yield choice, outcomes
+
+    def _score(self, team, outcomes):
+        return sum(p for winner, p in enumerate(outcomes) if team in WINNING_TEAMS[winner])
+
+    def _best_choice(self, cards, h, turns, n):
+        team = turns[n][0].team
+        best = None
+        best_score = None
+        for choice, outcomes in self._children(cards, h, turns, n):
+            score = self._score(team, outcomes)
+            if best_score is None or score > best_score:
+                best, best_score = choice, score
+        return best
+
+    def _search(self, cards, h, turns, n):
+        """
+        Returns the outcomes from turn `n` on, with the players holding
+        `cards`, whose hash is `h`.
+        """
+        key = h ^ turns[n][2] if n < len(turns) else h
+        outcomes = self.table.get(key)
+        if outcomes is not None:
+            return outcomes
+        self.nodes += 1
+        if n == len(turns):
+            outcomes = self._leaf(cards)
+        elif self.mode == MODE_RANDOM:
+            totals = [0.0] * _OUTCOMES
+            count = 0
+            for choice, child in self._children(cards, h, turns, n):
+                for winner in range(_OUTCOMES):
+                    totals[winner] += child[winner]
+                count += 1
+            outcomes = tuple(total / count for total in totals)
+        else:
+            team = turns[n][0].team
+            outcomes = None
+            best_score = None
+            for choice, child in self._children(cards, h, turns, n):
+                score = self._score(team, child)
+                if best_score is None or score > best_score:
+                    outcomes, best_score = child, score
+        self.table.put(key, outcomes)
+        return outcomes
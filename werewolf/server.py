@@ -0,0 +1,692 @@
+from __future__ import print_function
+import asyncio
+import collections
+import multiprocessing
+import os
+import socket
+import struct
+import threading
+import uuid
+from werewolf import ipc, protocol
+from werewolf.instrumentation import clock
+from werewolf.tables import InvalidInput, Overloaded, TableManager, UnknownTable
+from werewolf.sessions import Lobby, Player
+from werewolf.spectators import SpectatorHub
+from werewolf.werewolf import WerewolfGame
+
+# Frames on the router/worker sockets are prefixed with their length.
+_frame_header = struct.Struct("!I")
+
+# Inputs that start a game.  They wait behind the inputs to games already
+# under way, so a new table never holds up a vote.
+NEW_GAME_INPUTS = frozenset(["add_players", "deal_cards"])
+
+# The weight of each new measurement in a worker's moving averages of
+# request latency and engine time.
+_LATENCY_WEIGHT = 0.01
+
+
+class WorkerError(Exception):
+    """
+    A worker failed to process a request.
+    """
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def worker_main(sock, index=0, profile=None, threads=0, hibernate_path=None,
+                idle_timeout=300.0, metrics=False):
+    """
+    Serve requests from the router on `sock` until told to stop.  Each
+    worker hosts its own tables in a `TableManager`.  If `threads` is
+    given, requests run on that many threads, each table's in the order
+    they arrived; otherwise they run one at a time.  If `profile` is a
+    `ProfileSettings`, the worker can be profiled.  If `hibernate_path` is
+    given, tables idle for `idle_timeout` seconds are hibernated to a
+    directory for the worker under it.  With `metrics`, the worker
+    collects phase durations and rejected inputs for the router.
+    """
+    recorder = None
+    if profile is not None:
+        recorder = profile.recorder(index, "worker {}".format(index))
+    if hibernate_path is not None:
+        # Each worker gets its own directory, since a manager adopts every
+        # snapshot it finds in its directory.
+        hibernate_path = os.path.join(hibernate_path, "worker-{}".format(index))
+    worker_metrics = None
+    if metrics:
+        from werewolf.metrics import WorkerMetrics
+        worker_metrics = WorkerMetrics()
+    manager = TableManager(hibernate_path, idle_timeout, metrics=worker_metrics)
+    try:
+        _serve_router(sock, manager, threads)
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+
+def _hibernate_idle(manager, stopped):
+    # Tables are checked twice per timeout, so none stays in memory much
+    # longer than `idle_timeout`.
+    interval = min(manager.idle_timeout / 2.0, 60.0)
+    while not stopped.wait(interval):
+        manager.hibernate_idle()
+
+
+def _serve_router(sock, manager, threads=0):
+    hibernator = None
+    stopped = threading.Event()
+    if manager.hibernate_path is not None:
+        # The manager locks each table, so idle ones can be hibernated
+        # while requests run.
+        hibernator = threading.Thread(
+            target=_hibernate_idle, args=(manager, stopped), name="hibernate")
+        hibernator.daemon = True
+        hibernator.start()
+    executor = None
+    if threads:
+        from werewolf.executors import TableExecutor
+        executor = TableExecutor(manager, threads)
+    send_lock = threading.Lock()
+
+    def respond(request_id, op, table_id, value):
+        response = _handle_request(manager, request_id, op, table_id, value)
+        with send_lock:
+            sock.sendall(_frame_header.pack(len(response)) + response)
+
+    stop = None
+    while True:
+        header = _recv_exactly(sock, _frame_header.size)
+        if header is None:
+            break
+        data = _recv_exactly(sock, _frame_header.unpack(header)[0])
+        request = ipc.decode_request(data)
+        if request[1] == ipc.OP_STOP:
+            stop = request
+            break
+        if executor is None:
+            respond(*request)
+        else:
+            executor.call(request[2], respond, *request)
+    if executor is not None:
+        # Finish the requests already received before answering a stop.
+        executor.shutdown()
+    if hibernator is not None:
+        stopped.set()
+        hibernator.join()
+    if stop is not None:
+        respond(*stop)
+    sock.close()
+
+
+def _handle_request(manager, request_id, op, table_id, value):
+    """
+    Carry out a request from the router.  Returns the encoded response.
+    """
+    start = clock()
+    try:
+        result = None
+        if op == ipc.OP_SEND:
+            code, args = value
+            result = manager.send(table_id, ipc.input_name(code), *args)
+        elif op == ipc.OP_CREATE:
+            manager.create_table(table_id, WerewolfGame(read_only_views=True))
+        elif op == ipc.OP_REMOVE:
+            manager.remove_table(table_id)
+        elif op == ipc.OP_EXPORT:
+            result = manager.remove_table(table_id).snapshot()
+        elif op == ipc.OP_IMPORT:
+            manager.create_table(table_id, WerewolfGame.restore(value))
+        elif op == ipc.OP_METRICS:
+            result = manager.metrics.take()
+        elif op != ipc.OP_STOP:
+            raise Exception("Unknown operation {}.".format(op))
+        return ipc.encode_response(request_id, ipc.STATUS_OK, clock() - start, result)
+    except InvalidInput as ex:
+        return ipc.encode_response(
+            request_id, ipc.STATUS_INVALID_INPUT, clock() - start, ex.args[0])
+    except UnknownTable:
+        return ipc.encode_response(
+            request_id, ipc.STATUS_UNKNOWN_TABLE, clock() - start, table_id)
+    except Exception as ex:
+        return ipc.encode_response(
+            request_id, ipc.STATUS_ERROR, clock() - start, str(ex))
+
+
+class _Worker(object):
+    """
+    The router's handle on a worker process.
+    """
+
+    def __init__(self, index, process, reader, writer):
+        self.index = index
+        self.process = process
+        self.reader = reader
+        self.writer = writer
+        # Requests sent to the worker and not yet answered.
+        self.pending = {}
+        # Requests waiting for room in `pending`: inputs to games under way,
+        # then new tables and the inputs starting their games.  `waiting`
+        # has no limit of its own: a `TableSession` waits for each answer
+        # before sending its next input, so it holds at most one input per
+        # game under way, and the games are limited by turning new tables
+        # away.
+        self.waiting = collections.deque()
+        self.waiting_new = collections.deque()
+        # Tables with requests in `waiting_new`, whose later requests must
+        # wait behind them.
+        self.deferred = collections.Counter()
+        self.tables = set()
+        # Seconds spent on requests since the last rebalance, in total and
+        # per table.
+        self.busy = 0.0
+        self.table_busy = collections.Counter()
+        # Moving averages of the seconds from queueing a request to its
+        # answer, and of the engine time a request takes.
+        self.latency = 0.0
+        self.service_time = 0.0
+
+    @property
+    def queued(self):
+        return len(self.pending) + len(self.waiting) + len(self.waiting_new)
+
+    def estimated_wait(self):
+        """
+        Returns how long a new table's requests are expected to wait, in
+        seconds: at least as long as the oldest request still waiting.
+        """
+        queued = self.queued
+        if queued == 0:
+            return 0.0
+        wait = max(self.latency, (queued + 1) * self.service_time)
+        for waiting in (self.waiting, self.waiting_new):
+            if waiting:
+                wait = max(wait, clock() - waiting[0][3])
+        return wait
+
+
+class Router(object):
+    """
+    Routes table inputs to a pool of worker processes, each hosting many
+    games, so game logic runs on every core.  With `threads`, each worker
+    runs its tables' inputs on that many threads.  With `hibernate_path`,
+    each worker hibernates tables idle for `idle_timeout` seconds, as
+    `TableManager.hibernate_idle()` does.  With `metrics`, a
+    `werewolf.metrics.GameMetrics`, the workers measure phase durations and
+    count rejected inputs, and `collect_metrics()` adds them to it.
+
+    Tables are placed on the worker hosting the fewest.  `rebalance()`
+    moves tables off a worker whose share of the work since the last
+    rebalance exceeds the average by `overload_ratio`; a table is moved by
+    snapshotting it on its old worker and restoring it on the new one,
+    while any inputs sent to it in the meantime wait.
+
+    At most `max_in_flight` requests are sent to a worker at once; the rest
+    wait in the router, inputs to games under way ahead of new tables and
+    the inputs that start their games.  Creating a table, or starting its
+    game, raises `Overloaded` when `queue_limit` requests are already
+    waiting for its worker, and creating a table does too while its
+    worker's estimated wait, from its measured latency and engine time per
+    request, exceeds `admission_latency` seconds.  Pass None for no limit.
+    Inputs to games under way are never refused, since a game refused an
+    input partway through could never finish.  They count towards
+    `queue_limit`, so a backlog of them turns new tables away, and with
+    each game sending one input at a time they never number more than the
+    worker's games.
+    """
+
+    def __init__(self, workers=None, overload_ratio=1.5, profile=None, threads=0,
+                 max_in_flight=32, queue_limit=1024, admission_latency=0.02,
+                 hibernate_path=None, idle_timeout=300.0, metrics=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.worker_count = workers
+        self.threads = threads
+        self.hibernate_path = hibernate_path
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics
+        self.max_in_flight = max_in_flight
+        self.queue_limit = queue_limit
+        self.admission_latency = admission_latency
+        self.rejected_tables = 0
+        self.overload_ratio = overload_ratio
+        self.profile = profile
+        self.workers = []
+        self._tables = {}
+        self._moving = {}
+        self._next_request_id = 0
+        self._readers = []
+
+    async def start(self):
+        # Forked workers would inherit the running event loop, its sockets
+        # and this coroutine's frames, so they are started from a fresh
+        # interpreter instead.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn")
+        for n in range(self.worker_count):
+            parent_sock, child_sock = socket.socketpair()
+            process = context.Process(
+                target=worker_main,
+                args=(child_sock, n, self.profile, self.threads,
+                      self.hibernate_path, self.idle_timeout,
+                      self.metrics is not None),
+                name="werewolf-worker-{}".format(n))
+            process.daemon = True
+            process.start()
+            child_sock.close()
+            reader, writer = await asyncio.open_connection(sock=parent_sock)
+            worker = _Worker(n, process, reader, writer)
+            self.workers.append(worker)
+            self._readers.append(asyncio.ensure_future(self._read_responses(worker)))
+        return self
+
+    async def stop(self):
+        """
+        Stop the workers.  Their tables are lost.
+        """
+        waits = []
+        for worker in self.workers:
+            waits.append(self._request(worker, ipc.OP_STOP, "0" * 32))
+        await asyncio.gather(*waits, return_exceptions=True)
+        for worker in self.workers:
+            worker.writer.close()
+            worker.process.join()
+        for reader in self._readers:
+            reader.cancel()
+        self.workers = []
+
+    async def _read_responses(self, worker):
+        reader = worker.reader
+        pending = worker.pending
+        try:
+            while True:
+                header = await reader.readexactly(_frame_header.size)
+                data = await reader.readexactly(_frame_header.unpack(header)[0])
+                request_id, status, busy, value = ipc.decode_response(data)
+                future, table_id, queued = pending.pop(request_id)
+                worker.busy += busy
+                worker.table_busy[table_id] += busy
+                worker.latency += (clock() - queued - worker.latency) * _LATENCY_WEIGHT
+                worker.service_time += (busy - worker.service_time) * _LATENCY_WEIGHT
+                self._send_waiting(worker)
+                if future.done():
+                    continue
+                if status == ipc.STATUS_OK:
+                    future.set_result(value)
+                elif status == ipc.STATUS_INVALID_INPUT:
+                    future.set_exception(InvalidInput(value))
+                elif status == ipc.STATUS_UNKNOWN_TABLE:
+                    future.set_exception(UnknownTable(value))
+                else:
+                    future.set_exception(WorkerError(value))
+        except asyncio.IncompleteReadError:
+            requests = list(pending.values())
+            requests.extend(r[1:4] for r in worker.waiting)
+            requests.extend(r[1:4] for r in worker.waiting_new)
+            for future, table_id, queued in requests:
+                if not future.done():
+                    future.set_exception(
+                        WorkerError("Worker {} exited.".format(worker.index)))
+            pending.clear()
+            worker.waiting.clear()
+            worker.waiting_new.clear()
+            worker.deferred.clear()
+
+    def _request(self, worker, op, table_id, value=None, new_game=False):
+        """
+        Send a request to a worker, or queue it until the worker has room.
+        Returns a future for the response.  Requests that start a game are
+        queued with `new_game`, and only they are refused when the worker's
+        queue is full; inputs to games under way always wait their turn.
+        """
+        if (new_game and self.queue_limit is not None
+                and len(worker.waiting) + len(worker.waiting_new) >= self.queue_limit):
+            self.rejected_tables += 1
+            raise Overloaded("Worker {} has too many requests waiting.".format(worker.index))
+        request_id = self._next_request_id
+        self._next_request_id = (request_id + 1) & 0xffffffff
+        future = asyncio.get_event_loop().create_future()
+        data = ipc.encode_request(request_id, op, table_id, value)
+        request = (request_id, future, table_id, clock(), data)
+        if (self.max_in_flight is None or len(worker.pending) < self.max_in_flight) \
+                and not worker.waiting and not worker.waiting_new:
+            self._send(worker, request)
+        elif new_game or table_id in worker.deferred:
+            worker.waiting_new.append(request)
+            worker.deferred[table_id] += 1
+        else:
+            worker.waiting.append(request)
+        return future
+
+    def _send(self, worker, request):
+        request_id, future, table_id, queued, data = request
+        worker.pending[request_id] = (future, table_id, queued)
+        worker.writer.write(_frame_header.pack(len(data)) + data)
+
+    def _send_waiting(self, worker):
+        """
+        Send waiting requests while the worker has room for them.
+        """
+        limit = self.max_in_flight
+        while limit is None or len(worker.pending) < limit:
+            if worker.waiting:
+                self._send(worker, worker.waiting.popleft())
+            elif worker.waiting_new:
+                request = worker.waiting_new.popleft()
+                table_id = request[2]
+                worker.deferred[table_id] -= 1
+                if not worker.deferred[table_id]:
+                    del worker.deferred[table_id]
+                self._send(worker, request)
+            else:
+                break
+
+    def admits(self, worker):
+        """
+        Returns True if a new table may be created on `worker`.
+        """
+        limit = self.admission_latency
+        return limit is None or worker.estimated_wait() <= limit
+
+    async def create_table(self):
+        """
+        Create a table on the least loaded worker.  Returns its ID.  Raises
+        `Overloaded` if the worker is too busy to take another table.
+        """
+        worker = min(self.workers, key=lambda w: (len(w.tables), w.busy))
+        if not self.admits(worker):
+            # The least loaded worker by tables may not be the least busy.
+            worker = min(self.workers, key=lambda w: w.estimated_wait())
+            if not self.admits(worker):
+                self.rejected_tables += 1
+                raise Overloaded("Worker {} is too busy.".format(worker.index))
+        table_id = uuid.uuid4().hex
+        future = self._request(worker, ipc.OP_CREATE, table_id, new_game=True)
+        worker.tables.add(table_id)
+        self._tables[table_id] = worker
+        try:
+            await future
+        except Exception:
+            worker.tables.discard(table_id)
+            del self._tables[table_id]
+            raise
+        return table_id
+
+    async def _worker_for(self, table_id):
+        while table_id in self._moving:
+            await asyncio.shield(self._moving[table_id])
+        worker = self._tables.get(table_id)
+        if worker is None:
+            raise UnknownTable(table_id)
+        return worker
+
+    async def send(self, table_id, input_name, *args):
+        """
+        Send an input to a table's game and return the game's response.
+        Raises `InvalidInput` if the game does not accept the input in its
+        current state.  Inputs starting a game, in `NEW_GAME_INPUTS`, raise
+        `Overloaded` if too many requests are waiting for its worker.
+        """
+        worker = self._tables.get(table_id)
+        if worker is None or table_id in self._moving:
+            worker = await self._worker_for(table_id)
+        return await self._request(
+            worker, ipc.OP_SEND, table_id, ipc.encode_send(input_name, args),
+            input_name in NEW_GAME_INPUTS)
+
+    async def remove_table(self, table_id):
+        worker = await self._worker_for(table_id)
+        del self._tables[table_id]
+        worker.tables.discard(table_id)
+        worker.table_busy.pop(table_id, None)
+        await self._request(worker, ipc.OP_REMOVE, table_id)
+
+    def table_ids(self):
+        return list(self._tables)
+
+    def __len__(self):
+        return len(self._tables)
+
+    async def move_table(self, table_id, target):
+        """
+        Move a table to the worker `target`.
+        """
+        source = await self._worker_for(table_id)
+        if source is target:
+            return
+        moved = asyncio.get_event_loop().create_future()
+        self._moving[table_id] = moved
+        try:
+            # Inputs already sent to the old worker are handled before the
+            # export, since each worker handles its requests in order.
+            snapshot = await self._request(source, ipc.OP_EXPORT, table_id)
+            source.tables.discard(table_id)
+            load = source.table_busy.pop(table_id, 0.0)
+            source.busy -= load
+            await self._request(target, ipc.OP_IMPORT, table_id, snapshot)
+            target.tables.add(table_id)
+            target.busy += load
+            target.table_busy[table_id] += load
+            self._tables[table_id] = target
+        except Exception:
+            # The table is lost if its game could not be moved.
+            self._tables.pop(table_id, None)
+            raise
+        finally:
+            del self._moving[table_id]
+            moved.set_result(None)
+
+    async def rebalance(self):
+        """
+        Move tables from overloaded workers to the least loaded workers and
+        start a new load measurement period.  Returns the number of tables
+        moved.
+        """
+        moved = 0
+        workers = self.workers
+        if len(workers) > 1:
+            mean = sum(w.busy for w in workers) / len(workers)
+            for source in sorted(workers, key=lambda w: w.busy, reverse=True):
+                if mean <= 0 or source.busy <= mean * self.overload_ratio:
+                    break
+                # Move the busiest tables that fit in the gap between the
+                # overloaded worker and the least loaded one.
+                for table_id, load in source.table_busy.most_common():
+                    target = min(workers, key=lambda w: w.busy)
+                    if source.busy <= mean * self.overload_ratio:
+                        break
+                    if load <= 0 or target.busy + load >= source.busy - load:
+                        continue
+                    if table_id not in self._tables:
+                        continue
+                    await self.move_table(table_id, target)
+                    moved += 1
+        for worker in workers:
+            worker.busy = 0.0
+            worker.table_busy.clear()
+        return moved
+
+    async def run_rebalancer(self, interval=10.0):
+        """
+        Rebalance every `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await self.rebalance()
+
+    async def collect_metrics(self):
+        """
+        Add the metrics the workers have collected since the last call to
+        `metrics`.
+        """
+        collected = await asyncio.gather(*[
+            self._request(worker, ipc.OP_METRICS, "0" * 32)
+            for worker in self.workers])
+        for worker_metrics in collected:
+            self.metrics.add_worker_metrics(worker_metrics)
+
+    async def run_metrics_collector(self, interval=1.0):
+        """
+        Collect the workers' metrics every `interval` seconds until
+        cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await self.collect_metrics()
+
+    def stats(self):
+        """
+        Returns a list of (table count, busy seconds) for each worker since
+        the last rebalance.
+        """
+        return [(len(w.tables), w.busy) for w in self.workers]
+
+
+class GameServer(object):
+    """
+    Accepts client connections and seats the players at tables played by
+    `werewolf.sessions.TableSession`, with the games hosted by a `Router`.
+
+    Clients speak the protocol in `werewolf.protocol`, in its binary or
+    JSON encoding; the encoding is chosen by the first byte a client sends.
+    A client starts by sending a `Join` message, and may join another table
+    once its game has ended.  A client that starts with a `Watch` message
+    instead is sent the public events of a table's game, buffering at most
+    `spectator_buffer` events for it.
+    """
+
+    def __init__(self, router, spectator_buffer=32, **session_options):
+        self.router = router
+        self.spectators = SpectatorHub(spectator_buffer)
+        self.lobby = Lobby(router, spectators=self.spectators, **session_options)
+
+    async def handle_client(self, reader, writer):
+        player = None
+        try:
+            codec, message = await protocol.read_first_message(reader)
+            if codec is None:
+                return
+            if isinstance(message, protocol.Watch):
+                await self.watch(codec, reader, writer, message.table)
+                return
+            player = Player(codec, writer)
+            while message is not None:
+                if isinstance(message, protocol.Join) and not player.joined:
+                    # JSON clients may send fields of any type.
+                    joined = False
+                    if protocol.is_name(message.name):
+                        player.name = message.name
+                        joined = self.lobby.join(player, message.players)
+                    if not joined:
+                        player.send(protocol.Error(protocol.ERROR_BAD_MESSAGE))
+                else:
+                    player.receive(message)
+                message = await codec.read(reader)
+        except protocol.ProtocolError:
+            if player is not None:
+                player.send(protocol.Error(protocol.ERROR_BAD_MESSAGE))
+        except ConnectionError:
+            pass
+        finally:
+            if player is not None:
+                player.connected = False
+                self.lobby.leave(player)
+            writer.close()
+
+    async def watch(self, codec, reader, writer, table):
+        """
+        Stream a table's events to a spectator until its game ends or the
+        spectator hangs up.
+        """
+        table_id = None
+        if table != protocol.NEXT_TABLE:
+            table_id = table.hex()
+        subscription = self.spectators.subscribe(table_id)
+        if subscription is None:
+            writer.write(codec.encode(protocol.Error(protocol.ERROR_UNKNOWN_TABLE)))
+            return
+        # Anything else the spectator sends is ignored; reading it notices
+        # when the spectator hangs up.
+        hangup = asyncio.ensure_future(reader.read())
+        hangup.add_done_callback(lambda f: subscription.close())
+        try:
+            while True:
+                event = await subscription.get()
+                if event is None:
+                    break
+                writer.write(event.encode(codec))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            hangup.cancel()
+            self.spectators.unsubscribe(subscription)
+
+
+async def serve(host, port, workers=None, rebalance_interval=10.0,
+                metrics_port=None, backlog=1024, profile=None, threads=0,
+                max_in_flight=32, queue_limit=1024, admission_latency=0.02,
+                hibernate_path=None, idle_timeout=300.0, **session_options):
+    """
+    Run a server until cancelled.  If `metrics_port` is given, Prometheus
+    metrics for the games are served on it.  If `profile` is a
+    `ProfileSettings`, the router and workers can be profiled.  If
+    `threads` is given, each worker runs inputs on that many threads.
+    `max_in_flight`, `queue_limit` and `admission_latency` limit the
+    requests queued for each worker, as described for `Router`.  If
+    `hibernate_path` is given, games idle for `idle_timeout` seconds are
+    written to snapshots under it and dropped from memory until their next
+    input.
+    """
+    metrics = None
+    if metrics_port is not None:
+        from werewolf.metrics import GameMetrics
+        metrics = GameMetrics()
+        session_options["metrics"] = metrics
+    # The workers are started first so they don't inherit the metrics
+    # server's socket.
+    router = await Router(
+        workers,
+        profile=profile,
+        threads=threads,
+        max_in_flight=max_in_flight,
+        queue_limit=queue_limit,
+        admission_latency=admission_latency,
+        hibernate_path=hibernate_path,
+        idle_timeout=idle_timeout,
+        metrics=metrics).start()
+    recorder = None
+    if profile is not None:
+        recorder = profile.recorder(label="router")
+    exporter = None
+    collector = None
+    if metrics is not None:
+        from werewolf.metrics import MetricsServer
+        exporter = MetricsServer(metrics.registry, metrics_port, host).start()
+        collector = asyncio.ensure_future(router.run_metrics_collector())
+    server = GameServer(router, **session_options)
+    listener = await asyncio.start_server(
+        server.handle_client, host, port, backlog=backlog)
+    rebalancer = asyncio.ensure_future(router.run_rebalancer(rebalance_interval))
+    try:
+        await listener.serve_forever()
+    finally:
+        rebalancer.cancel()
+        if collector is not None:
+            collector.cancel()
+        listener.close()
+        await router.stop()
+        if exporter is not None:
+            exporter.stop()
+        if recorder is not None:
+            recorder.close()
@@ -0,0 +1,390 @@
+from __future__ import print_function
+import asyncio
+from werewolf import protocol
+from werewolf.instrumentation import clock
+from werewolf.spectators import KEY_CARDS, KEY_PHASE, KEY_RESULTS, KEY_TABLE
+from werewolf.tables import InvalidInput, Overloaded
+from werewolf.werewolf import WerewolfGame, tally_votes
+
+# Night actions players may choose, by role tag: protocol action ->
+# (game input, number of targets, whether the targets are seats rather than
+# table card positions).
+NIGHT_ACTIONS = {
+    "seer": {
+        protocol.ACTION_VIEW_PLAYER: ("seer_view_player_card", 1, True),
+        protocol.ACTION_VIEW_TABLE: ("seer_view_table_cards", 2, False),
+    },
+    "robber": {
+        protocol.ACTION_STEAL: ("robber_steal_card", 1, True),
+    },
+    "troublemaker": {
+        protocol.ACTION_SWITCH: ("troublemaker_switch_cards", 2, True),
+    },
+}
+
+
+def _is_index(value, limit):
+    """
+    Returns True if `value` is an integer from 0 up to `limit`.  JSON
+    clients may send values of any type.
+    """
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value < limit
+
+
+class Player(object):
+    """
+    A connected client.  Messages the client sends are queued in `inbox`
+    with the time they arrived while a game is waiting for them, and
+    rejected otherwise.
+    """
+
+    def __init__(self, codec, writer, name=None):
+        self.codec = codec
+        self.writer = writer
+        self.name = name
+        # Set from joining a table until its game ends.
+        self.joined = False
+        self.seat = None
+        self.inbox = asyncio.Queue()
+        # The message types the player's game is waiting for.
+        self.expecting = ()
+        self.connected = True
+
+    def send(self, message):
+        if self.connected:
+            self.writer.write(self.codec.encode(message))
+
+    def receive(self, message):
+        """
+        Handle a message from the client.
+        """
+        if isinstance(message, self.expecting):
+            self.inbox.put_nowait((message, clock()))
+        else:
+            self.send(protocol.Error(protocol.ERROR_UNEXPECTED))
+
+    async def expect(self, types, timeout):
+        """
+        Wait up to `timeout` seconds for a message of one of `types`.
+        Returns (message, time it arrived), or (None, None) if none arrived
+        in time.
+        """
+        self.expecting = types
+        try:
+            return await asyncio.wait_for(self.inbox.get(), timeout)
+        except asyncio.TimeoutError:
+            return None, None
+        finally:
+            self.expecting = ()
+
+
+class TableSession(object):
+    """
+    Plays a game at a table hosted by a `werewolf.server.Router` with
+    connected players.  Players are identified to the game and to each
+    other by seat.
+
+    If `metrics` is a `werewolf.metrics.GameMetrics`, the session reports
+    the game and how long it takes to answer each player's actions and
+    votes to it.
+
+    If `spectators` is a `werewolf.spectators.SpectatorHub`, the session
+    publishes the game's public events to its spectators: the table, each
+    phase and the results.  With `reveal_delay`, every player's card is
+    also revealed to them that many seconds after the deal.
+    """
+
+    def __init__(self, router, players, werewolf_count=2, roles=None,
+                 action_timeout=60.0, vote_timeout=300.0, metrics=None,
+                 spectators=None, reveal_delay=None):
+        self.router = router
+        self.players = players
+        self.werewolf_count = werewolf_count
+        if roles is None:
+            roles = [WerewolfGame.CARD_SEER, WerewolfGame.CARD_ROBBER,
+                     WerewolfGame.CARD_TROUBLEMAKER]
+        self.roles = list(roles)
+        self.action_timeout = action_timeout
+        self.vote_timeout = vote_timeout
+        self.metrics = metrics
+        self.spectators = spectators
+        self.reveal_delay = reveal_delay
+        self.channel = None
+        self.table_id = None
+
+    def broadcast(self, message):
+        for player in self.players:
+            player.send(message)
+
+    def publish(self, key, message):
+        """
+        Send a public event to the table's spectators.
+        """
+        if self.channel is not None:
+            self.channel.publish(key, message)
+
+    async def send(self, input_name, *args):
+        return await self.router.send(self.table_id, input_name, *args)
+
+    async def run(self):
+        """
+        Play the game.  Returns the game's `PostGameInfo`, or None if the
+        server was too busy to play it, in which case the players are sent
+        an `ERROR_OVERLOADED` error and may join another table.
+        """
+        players = self.players
+        seats = list(range(len(players)))
+        metrics = self.metrics
+        reveal = None
+        try:
+            self.table_id = await self.router.create_table()
+        except Overloaded:
+            self.overloaded()
+            return None
+        try:
+            try:
+                await self.send("add_players", seats)
+                await self.send("deal_cards", self.werewolf_count, self.roles)
+            except Overloaded:
+                # Only the inputs starting a game are ever refused, so a
+                # game under way always finishes.
+                self.overloaded()
+                return None
+            if metrics is not None:
+                metrics.game_started()
+                metrics.set_tables(len(self.router))
+            cards = await self.send("query_player_cards")
+            table = bytes(bytearray.fromhex(self.table_id))
+            names = [p.name for p in players]
+            for seat, player in enumerate(players):
+                player.seat = seat
+                player.send(protocol.Seated(table, seat, names))
+                player.send(protocol.Dealt(cards[seat]))
+            if self.spectators is not None:
+                self.channel = self.spectators.open(self.table_id)
+                self.publish(KEY_TABLE, protocol.Seated(table, protocol.NO_SEAT, names))
+                if self.reveal_delay is not None:
+                    table_cards = await self.send("query_table_cards")
+                    reveal = asyncio.get_event_loop().call_later(
+                        self.reveal_delay, self.publish, KEY_CARDS,
+                        protocol.Cards([cards[s] for s in seats] + list(table_cards)))
+            while True:
+                await self.send("advance_phase")
+                role = await self.send("query_active_role")
+                if role is None:
+                    break
+                active = [seat for seat in seats if cards[seat] == role.card]
+                for seat, player in enumerate(players):
+                    player.send(protocol.Phase(role.card, seat in active))
+                self.publish(KEY_PHASE, protocol.Phase(role.card))
+                for seat in active:
+                    await self.night_action(role, seat)
+            results = await self.daybreak()
+            if metrics is not None:
+                metrics.game_completed(results.winner)
+            return results
+        finally:
+            for player in players:
+                player.joined = False
+                player.seat = None
+            if reveal is not None:
+                reveal.cancel()
+            if self.channel is not None:
+                self.spectators.close(self.table_id)
+            await self.router.remove_table(self.table_id)
+            if metrics is not None:
+                metrics.set_tables(len(self.router))
+
+    def overloaded(self):
+        """
+        Tell the players the game can't be played, and free them to join
+        another table.
+        """
+        self.broadcast(protocol.Error(protocol.ERROR_OVERLOADED))
+        for player in self.players:
+            player.joined = False
+            player.seat = None
+        if self.metrics is not None:
+            self.metrics.overloaded()
+
+    def input_rejected(self, input_name):
+        """
+        Count a player's action or vote that was rejected before it reached
+        the game.
+        """
+        if self.metrics is not None:
+            self.metrics.input_rejected(input_name)
+
+    async def night_action(self, role, seat):
+        """
+        Give the player in `seat` the information or the choice their role
+        gets during its phase.
+        """
+        player = self.players[seat]
+        tag = role.tag
+        if tag in ("werewolf", "minion"):
+            mask = 0
+            for werewolf in await self.send("identify_werewolves"):
+                mask |= 1 << werewolf
+            player.send(protocol.Werewolves(mask))
+            return
+        if tag == "insomniac":
+            card = await self.send("insomniac_view_card")
+            player.send(protocol.Reveal(protocol.REVEAL_OWN, first_card=card))
+            return
+        actions = NIGHT_ACTIONS.get(tag)
+        if actions is None:
+            return
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.action_timeout
+        while True:
+            message, received = await player.expect(
+                protocol.NightAction, deadline - loop.time())
+            if message is None or message.action == protocol.ACTION_PASS:
+                return
+            action = None
+            if isinstance(message.action, int):
+                action = actions.get(message.action)
+            args = None
+            if action is not None:
+                args = self._action_args(seat, action, message)
+            if args is None:
+                player.send(protocol.Error(protocol.ERROR_BAD_ACTION))
+                self.input_rejected(
+                    "night_action" if action is None else action[0])
+                continue
+            try:
+                result = await self.send(action[0], *args)
+            except InvalidInput:
+                # The worker's table manager counts inputs the game
+                # rejects.
+                player.send(protocol.Error(protocol.ERROR_BAD_ACTION))
+                continue
+            if action[0] == "seer_view_table_cards":
+                player.send(protocol.Reveal(
+                    protocol.REVEAL_TABLE,
+                    args[0], result[0], args[1], result[1]))
+            elif action[0] != "troublemaker_switch_cards":
+                player.send(protocol.Reveal(
+                    protocol.REVEAL_PLAYER, args[0], result))
+            if self.metrics is not None:
+                self.metrics.request_handled(tag, clock() - received)
+            return
+
+    def _action_args(self, seat, action, message):
+        """
+        Returns the game input arguments for a night action, or None if the
+        targets aren't valid.
+        """
+        input_name, count, targets_seats = action
+        args = [message.first, message.second][:count]
+        if targets_seats:
+            limit = len(self.players)
+        else:
+            limit = 3
+        for target in args:
+            if not _is_index(target, limit):
+                return None
+            if targets_seats and target == seat:
+                return None
+        if len(set(args)) != len(args):
+            return None
+        return args
+
+    async def daybreak(self):
+        """
+        Collect the votes and end the game.
+        """
+        players = self.players
+        seats = list(range(len(players)))
+        self.broadcast(protocol.Phase(protocol.PHASE_DAYBREAK))
+        self.publish(KEY_PHASE, protocol.Phase(protocol.PHASE_DAYBREAK))
+        seconds = max(0, min(int(self.vote_timeout), protocol.MAX_VOTE_SECONDS))
+        self.broadcast(protocol.VotePrompt(seconds))
+        deadline = asyncio.get_event_loop().time() + self.vote_timeout
+        ballots = await asyncio.gather(
+            *[self._collect_vote(player, deadline) for player in players])
+        # A player who doesn't vote votes for themself.
+        votes = {}
+        last_vote = None
+        for seat, (ballot, received) in zip(seats, ballots):
+            if not _is_index(ballot, len(players)):
+                if received is not None:
+                    self.input_rejected("vote")
+                ballot = seat
+            votes[seat] = ballot
+            if received is not None and (last_vote is None or received > last_vote):
+                last_vote = received
+        hunter = await self.send("query_hunter")
+        eliminated = tally_votes(seats, votes, hunter)
+        await self.send("eliminate_players", eliminated)
+        results = await self.send("query_post_game_results")
+        mask = 0
+        for seat in eliminated:
+            mask |= 1 << seat
+        message = protocol.Results(
+            results.winner,
+            mask,
+            [results.orig_player_cards[s] for s in seats] + list(results.orig_table_cards),
+            [results.player_cards[s] for s in seats] + list(results.table_cards))
+        self.broadcast(message)
+        self.publish(KEY_RESULTS, message)
+        if self.metrics is not None and last_vote is not None:
+            self.metrics.request_handled("daybreak", clock() - last_vote)
+        return results
+
+    async def _collect_vote(self, player, deadline):
+        """
+        Returns (the seat voted for, time the vote arrived).
+        """
+        message, received = await player.expect(
+            protocol.Vote, deadline - asyncio.get_event_loop().time())
+        if message is None:
+            return None, None
+        return message.seat, received
+
+
+class Lobby(object):
+    """
+    Seats players who ask to join a table of a given size, and starts a
+    `TableSession` whenever a table is full.
+    """
+
+    def __init__(self, router, min_players=3, max_players=10, **session_options):
+        self.router = router
+        self.min_players = min_players
+        self.max_players = max_players
+        self.session_options = session_options
+        self._waiting = {}
+        self.sessions = set()
+
+    def join(self, player, table_size):
+        """
+        Add a player to the queue for tables of `table_size` players.
+        Returns False if no such table can be played.
+        """
+        if not isinstance(table_size, int) or isinstance(table_size, bool):
+            return False
+        if not self.min_players <= table_size <= self.max_players:
+            return False
+        player.joined = True
+        waiting = self._waiting.setdefault(table_size, [])
+        waiting.append(player)
+        if len(waiting) == table_size:
+            del self._waiting[table_size]
+            self._start(waiting)
+        return True
+
+    def leave(self, player):
+        """
+        Remove a disconnected player from the queues.
+        """
+        for waiting in self._waiting.values():
+            if player in waiting:
+                waiting.remove(player)
+
+    def _start(self, players):
+        session = TableSession(self.router, players, **self.session_options)
+        task = asyncio.ensure_future(session.run())
+        self.sessions.add(task)
+        task.add_done_callback(self.sessions.discard)
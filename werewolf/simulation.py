@@ -0,0 +1,164 @@
+from __future__ import print_function
+import collections
+import random
+import attr
+from werewolf.instrumentation import HookChain, PhaseTimer
+from werewolf.werewolf import WerewolfGame, tally_votes
+
+
+@attr.attrs
+class GameRecord(object):
+    """
+    The record of a simulated game.  `votes` maps each player to the player
+    they voted for.
+    """
+    players = attr.attrib()
+    votes = attr.attrib()
+    eliminated = attr.attrib()
+    results = attr.attrib()
+
+
+class RandomPolicy(object):
+    """
+    Players choose their night actions and votes uniformly at random.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def night_action(self, tag, game, players, player):
+        """
+        Use the night action for the role with tag `tag`.
+        """
+        rng = self.rng
+        others = [p for p in players if p != player]
+        if tag == "seer":
+            if rng.random() < 0.5:
+                game.seer_view_player_card(rng.choice(others))
+            else:
+                game.seer_view_table_cards(*rng.sample((0, 1, 2), 2))
+        elif tag == "robber":
+            choice = rng.randrange(len(others) + 1)
+            if choice < len(others):
+                game.robber_steal_card(others[choice])
+        elif tag == "troublemaker":
+            if len(others) >= 2 and rng.random() < 0.5:
+                game.troublemaker_switch_cards(*rng.sample(others, 2))
+
+    def vote(self, players, player):
+        """
+        Return the player `player` votes to eliminate.
+        """
+        return self.rng.choice(players)
+
+
+def play_game(players, werewolf_count, roles, rng, policy=None,
+              transition_hook=None):
+    """
+    Play a game without a user interface.  Returns a `GameRecord`.
+    """
+    if policy is None:
+        policy = RandomPolicy(rng)
+    game = WerewolfGame(rng, read_only_views=True)
+    if transition_hook is not None:
+        game.set_transition_hook(transition_hook)
+    game.add_players(players)
+    game.deal_cards(werewolf_count, roles)
+    player_cards = game.query_player_cards()
+    while True:
+        game.advance_phase()
+        role = game.query_active_role()
+        if role is None:
+            break
+        for player in players:
+            if player_cards[player] == role.card:
+                policy.night_action(role.tag, game, players, player)
+    hunter = game.query_hunter()
+    votes = {}
+    for player in players:
+        votes[player] = policy.vote(players, player)
+    eliminated = tally_votes(players, votes, hunter)
+    game.eliminate_players(eliminated)
+    return GameRecord(
+        players=players,
+        votes=votes,
+        eliminated=eliminated,
+        results=game.query_post_game_results())
+
+
+def simulate(count, players, werewolf_count, roles, seed=None, sink=None,
+             phase_histograms=None, metrics=None, checkpoint=None):
+    """
+    Play `count` games.  Each `GameRecord` is passed to `sink.write()` if a
+    sink is given.  If `phase_histograms` is a dict, the time each game
+    spends in each phase is added to its histograms.  Games are reported to
+    `metrics`, a `werewolf.metrics.GameMetrics`, if it is given.  Returns a
+    `collections.Counter` of the `WINNER_XXX` codes.
+
+    If a `werewolf.checkpoints.ShardCheckpoint` is given, play resumes from
+    its saved state, and the state is saved whenever the checkpoint is due
+    and at the end, so an interrupted run picks up exactly where it left
+    off.  The sink must then be a `werewolf.results.ResultWriter` opened
+    with the saved `result_rows`.
+    """
+    rng = random.Random(seed)
+    policy = RandomPolicy(rng)
+    winners = collections.Counter()
+    start = 0
+    if checkpoint is not None:
+        state = checkpoint.load()
+        if state is not None:
+            start = state.games
+            rng.setstate(state.rng_state)
+            winners.update(state.winners)
+            if phase_histograms is not None and state.histograms is not None:
+                for phase, histogram in state.histograms.items():
+                    if phase in phase_histograms:
+                        phase_histograms[phase].merge(histogram)
+                    else:
+                        phase_histograms[phase] = histogram
+            if state.complete and start >= count:
+                return winners
+    for n in range(start, count):
+        hooks = []
+        if phase_histograms is not None:
+            hooks.append(PhaseTimer(phase_histograms))
+        if metrics is not None:
+            hooks.append(metrics.phase_timer())
+            metrics.game_started()
+        hook = None
+        if len(hooks) == 1:
+            hook = hooks[0]
+        elif len(hooks) > 1:
+            hook = HookChain(*hooks)
+        record = play_game(
+            players, werewolf_count, roles, rng, policy, transition_hook=hook)
+        winners[record.results.winner] += 1
+        if metrics is not None:
+            metrics.game_completed(record.results.winner)
+        if sink is not None:
+            sink.write(record)
+        if checkpoint is not None and checkpoint.due():
+            _save_checkpoint(checkpoint, n + 1, rng, winners, phase_histograms, sink)
+    if checkpoint is not None:
+        _save_checkpoint(
+            checkpoint, count, rng, winners, phase_histograms, sink, complete=True)
+    return winners
+
+
+def _save_checkpoint(checkpoint, games, rng, winners, phase_histograms, sink,
+                     complete=False):
+    from werewolf.checkpoints import ShardState
+    result_rows = None
+    if sink is not None:
+        # Rows still buffered would be lost in a crash, so they are written
+        # out before the checkpoint that counts them.
+        sink.flush()
+        result_rows = sink.rows
+    checkpoint.save(ShardState(
+        games=games,
+        rng_state=rng.getstate(),
+        winners=dict(winners),
+        histograms=phase_histograms,
+        result_rows=result_rows,
+        complete=complete))
@@ -0,0 +1,228 @@
+from __future__ import print_function
+import asyncio
+import collections
+import attr
+
+# Spectator event keys.  When a subscriber's buffer is full, a new event
+# replaces any unsent event with the same key, and a subscriber that joins
+# late is sent the latest event for each key, in this order.
+KEY_TABLE = "table"
+KEY_PHASE = "phase"
+KEY_CARDS = "cards"
+KEY_RESULTS = "results"
+_KEY_ORDER = (KEY_TABLE, KEY_PHASE, KEY_CARDS, KEY_RESULTS)
+
+# Events with these keys may be dropped when a subscriber's buffer is full;
+# later phases make up for a lost one.
+_DROPPABLE = frozenset([KEY_PHASE])
+
+
+@attr.attrs(slots=True)
+class SpectatorEvent(object):
+    """
+    A public event at a table.  The message is encoded once per codec, no
+    matter how many spectators receive it.
+    """
+    key = attr.attrib()
+    message = attr.attrib()
+    _encoded = attr.attrib(default=attr.Factory(dict))
+
+    def encode(self, codec):
+        data = self._encoded.get(codec.name)
+        if data is None:
+            data = codec.encode(self.message)
+            self._encoded[codec.name] = data
+        return data
+
+
+class Subscription(object):
+    """
+    A spectator's buffer of up to `maxsize` events.  A spectator that keeps
+    up is sent every event.  Once the buffer is full, a new event replaces
+    an unsent one with the same key, or else the oldest droppable event is
+    discarded, so a slow spectator never holds up the table.  Events that
+    can't be dropped are kept even then, so the buffer never exceeds
+    `maxsize` by more than one event for each of their keys.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.channel = None
+        self.dropped = 0
+        self.closed = False
+        self._events = collections.deque()
+        self._waiter = None
+
+    def put(self, event):
+        events = self._events
+        if len(events) >= self.maxsize and not self._make_room(event):
+            self.dropped += 1
+            return
+        events.append(event)
+        self._wake()
+
+    def _make_room(self, event):
+        """
+        Drop a queued event to make room for `event`.  Returns False if
+        `event` should be dropped instead, and True if it should be queued.
+        """
+        events = self._events
+        for n, queued in enumerate(events):
+            if queued.key == event.key:
+                del events[n]
+                self.dropped += 1
+                return True
+        for n, queued in enumerate(events):
+            if queued.key in _DROPPABLE:
+                del events[n]
+                self.dropped += 1
+                return True
+        return event.key not in _DROPPABLE
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def get(self):
+        """
+        Returns the next event, or None once the subscription is closed and
+        its buffer is empty.
+        """
+        while not self._events:
+            if self.closed:
+                return None
+            self._waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._events.popleft()
+
+
+class Channel(object):
+    """
+    Fans a table's events out to its subscribers.  Publishing never blocks:
+    events are handed to subscribers by a separate task that yields to the
+    event loop after every `batch` subscribers, so players at busy tables
+    are not kept waiting by a large audience.
+    """
+
+    def __init__(self, table_id, batch=256):
+        self.table_id = table_id
+        self.batch = batch
+        self.subscribers = set()
+        self.latest = {}
+        self.closed = False
+        self._pending = collections.deque()
+        self._fanout = None
+
+    def subscribe(self, subscription):
+        subscription.channel = self
+        # Events waiting to be fanned out will reach the new subscriber
+        # with the rest.
+        pending = set(id(event) for event in self._pending)
+        for key in _KEY_ORDER:
+            event = self.latest.get(key)
+            if event is not None and id(event) not in pending:
+                subscription.put(event)
+        if self.closed:
+            subscription.close()
+        else:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, key, message):
+        if self.closed:
+            return
+        event = SpectatorEvent(key, message)
+        self.latest[key] = event
+        self._queue(event)
+
+    def close(self):
+        """
+        Close the subscriptions once the events published so far have been
+        handed out.
+        """
+        if not self.closed:
+            self.closed = True
+            self._queue(None)
+
+    def _queue(self, event):
+        self._pending.append(event)
+        if self._fanout is None:
+            self._fanout = asyncio.ensure_future(self._run_fanout())
+
+    async def _run_fanout(self):
+        pending = self._pending
+        batch = self.batch
+        try:
+            while pending:
+                event = pending.popleft()
+                subscribers = list(self.subscribers)
+                for n, subscription in enumerate(subscribers):
+                    if n and n % batch == 0:
+                        await asyncio.sleep(0)
+                    if event is None:
+                        subscription.close()
+                    else:
+                        subscription.put(event)
+                if event is None:
+                    self.subscribers.clear()
+        finally:
+            self._fanout = None
+
+
+class SpectatorHub(object):
+    """
+    The spectator channels of a server's tables.  A spectator may subscribe
+    to a table by ID, or to the next table to start.
+    """
+
+    def __init__(self, maxsize=32, batch=256):
+        self.maxsize = maxsize
+        self.batch = batch
+        self.channels = {}
+        self._next = []
+
+    def open(self, table_id):
+        channel = Channel(table_id, self.batch)
+        self.channels[table_id] = channel
+        waiting, self._next = self._next, []
+        for subscription in waiting:
+            if not subscription.closed:
+                channel.subscribe(subscription)
+        return channel
+
+    def close(self, table_id):
+        channel = self.channels.pop(table_id, None)
+        if channel is not None:
+            channel.close()
+
+    def subscribe(self, table_id=None):
+        """
+        Returns a `Subscription` to a table's events, or to the next table
+        to start if `table_id` is None, or None if there is no such table.
+        """
+        subscription = Subscription(self.maxsize)
+        if table_id is None:
+            self._next.append(subscription)
+            return subscription
+        channel = self.channels.get(table_id)
+        if channel is None:
+            return None
+        return channel.subscribe(subscription)
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        if subscription.channel is not None:
+            subscription.channel.unsubscribe(subscription)
+        elif subscription in self._next:
+            self._next.remove(subscription)
@@ -0,0 +1,248 @@
+from __future__ import print_function
+import os
+import threading
+import time
+import uuid
+from werewolf.werewolf import WerewolfGame
+
+
+class InvalidInput(Exception):
+    """
+    The table's game does not accept the input in its current state.
+    """
+
+
+class UnknownTable(Exception):
+    """
+    There is no table with the requested ID.
+    """
+
+
+class Overloaded(Exception):
+    """
+    The server is too busy to take a new table or input.
+    """
+
+
+class TableManager(object):
+    """
+    Hosts many games, keyed by table ID.
+
+    If `hibernate_path` is set, `hibernate_idle()` writes the games of
+    tables that have been idle for `idle_timeout` seconds to snapshot files
+    in that directory and drops them from memory.  A hibernating table is
+    restored transparently the next time it receives an input.
+
+    If `metrics` is a `werewolf.metrics.GameMetrics`, the manager reports
+    games started and completed, table counts, phase durations and rejected
+    inputs to it.
+
+    The manager may be used from many threads.  Each table has its own
+    lock, held while an input runs, so a table's inputs never run at once
+    while inputs to other tables run in parallel; a separate lock guards
+    the manager's own bookkeeping.  A game returned by `get_game()` is not
+    protected by the manager: hold `table_lock()` while using it, or send
+    each table's inputs from a single thread, such as with a
+    `werewolf.executors.TableExecutor`.
+    """
+
+    def __init__(self, hibernate_path=None, idle_timeout=300.0, clock=time.time,
+                 metrics=None):
+        self.hibernate_path = hibernate_path
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.metrics = metrics
+        self._games = {}
+        self._last_active = {}
+        self._hibernating = set()
+        self._table_locks = {}
+        # Guards the tables.  A table's lock is always taken before this
+        # one.
+        self._lock = threading.Lock()
+        if hibernate_path is not None:
+            if not os.path.isdir(hibernate_path):
+                os.makedirs(hibernate_path)
+            # Tables left hibernating by a previous manager.
+            for entry in os.listdir(hibernate_path):
+                if entry.endswith(".snap"):
+                    self._hibernating.add(entry[:-len(".snap")])
+
+    def create_table(self, table_id=None, game=None):
+        """
+        Add a table and return its ID.  A new game is created unless `game`
+        is given.
+        """
+        if table_id is None:
+            table_id = uuid.uuid4().hex
+        if game is None:
+            game = WerewolfGame()
+        with self._lock:
+            if table_id in self._games or table_id in self._hibernating:
+                raise Exception("Table '{}' already exists.".format(table_id))
+            self._add_game(table_id, game)
+        return table_id
+
+    def _add_game(self, table_id, game):
+        self._games[table_id] = game
+        self._last_active[table_id] = self.clock()
+        if self.metrics is not None:
+            game.set_transition_hook(self.metrics.phase_timer())
+            self._update_table_metrics()
+
+    def _update_table_metrics(self):
+        if self.metrics is not None:
+            self.metrics.set_tables(len(self._games), len(self._hibernating))
+
+    def table_lock(self, table_id):
+        """
+        Return the lock held while a table's inputs run.  It is reentrant,
+        so a thread holding it may still send inputs to the table.
+        """
+        lock = self._table_locks.get(table_id)
+        if lock is not None:
+            return lock
+        with self._lock:
+            lock = self._table_locks.get(table_id)
+            if lock is None:
+                if table_id not in self._games and table_id not in self._hibernating:
+                    raise UnknownTable(table_id)
+                lock = self._table_locks[table_id] = threading.RLock()
+            return lock
+
+    def remove_table(self, table_id):
+        """
+        Remove a table.  Returns its game.
+        """
+        with self.table_lock(table_id):
+            game = self.get_game(table_id)
+            with self._lock:
+                del self._games[table_id]
+                del self._last_active[table_id]
+                self._table_locks.pop(table_id, None)
+                self._update_table_metrics()
+        return game
+
+    def table_ids(self):
+        """
+        Return a list of the IDs of all tables, including hibernating ones.
+        """
+        with self._lock:
+            return list(self._games) + list(self._hibernating)
+
+    def __contains__(self, table_id):
+        return table_id in self._games or table_id in self._hibernating
+
+    def __len__(self):
+        return len(self._games) + len(self._hibernating)
+
+    @property
+    def active_count(self):
+        return len(self._games)
+
+    @property
+    def hibernating_count(self):
+        return len(self._hibernating)
+
+    def get_game(self, table_id):
+        """
+        Return the game for a table, restoring it if it is hibernating.
+        """
+        game = self._games.get(table_id)
+        if game is not None:
+            return game
+        with self._lock:
+            game = self._games.get(table_id)
+            if game is not None:
+                return game
+            if table_id not in self._hibernating:
+                raise UnknownTable(table_id)
+            path = self._snapshot_path(table_id)
+            with open(path, "rb") as f:
+                game = WerewolfGame.restore(f.read())
+            os.remove(path)
+            self._hibernating.discard(table_id)
+            self._add_game(table_id, game)
+        return game
+
+    def send(self, table_id, input_name, *args, **kwargs):
+        """
+        Send an input to a table's game and return the game's response.
+        Raises `InvalidInput` if the game does not accept the input in its
+        current state.
+        """
+        with self.table_lock(table_id):
+            game = self.get_game(table_id)
+            metrics = self.metrics
+            if not game.can(input_name):
+                if metrics is not None:
+                    metrics.input_rejected(input_name)
+                raise InvalidInput(input_name)
+            # The table's lock covers its entry.
+            self._last_active[table_id] = self.clock()
+            result = getattr(game, input_name)(*args, **kwargs)
+            if metrics is not None:
+                if input_name == "deal_cards":
+                    metrics.game_started()
+                elif input_name == "eliminate_players":
+                    metrics.game_completed(game.query_post_game_results().winner)
+        return result
+
+    def hibernate(self, table_id):
+        """
+        Write a table's game to disk and drop it from memory.
+        """
+        if self.hibernate_path is None:
+            raise Exception("No hibernation path is configured.")
+        with self.table_lock(table_id):
+            self._hibernate(table_id)
+
+    def _hibernate(self, table_id, cutoff=None):
+        # Called with the table's lock held.  With `cutoff`, tables active
+        # since then are left alone.
+        with self._lock:
+            game = self._games.get(table_id)
+            if game is None:
+                if cutoff is not None:
+                    return False
+                raise UnknownTable(table_id)
+            if cutoff is not None and self._last_active[table_id] > cutoff:
+                return False
+        # Other tables keep running while the snapshot is written.
+        path = self._snapshot_path(table_id)
+        tmp_path = "{}.tmp".format(path)
+        with open(tmp_path, "wb") as f:
+            f.write(game.snapshot())
+        os.rename(tmp_path, path)
+        with self._lock:
+            del self._games[table_id]
+            del self._last_active[table_id]
+            self._hibernating.add(table_id)
+            self._update_table_metrics()
+        return True
+
+    def hibernate_idle(self):
+        """
+        Hibernate every table that has been idle for at least
+        `idle_timeout` seconds.  Returns the number of tables hibernated.
+        """
+        if self.hibernate_path is None:
+            return 0
+        cutoff = self.clock() - self.idle_timeout
+        with self._lock:
+            idle = [
+                table_id for table_id, last_active in self._last_active.items()
+                if last_active <= cutoff]
+        hibernated = 0
+        for table_id in idle:
+            try:
+                lock = self.table_lock(table_id)
+            except UnknownTable:
+                continue
+            with lock:
+                # The table may have had an input, or been removed, since.
+                if self._hibernate(table_id, cutoff):
+                    hibernated += 1
+        return hibernated
+
+    def _snapshot_path(self, table_id):
+        return os.path.join(self.hibernate_path, "{}.snap".format(table_id))
@@ -1,22 +1,33 @@
 
 from __future__ import print_function
-import itertools
+import collections
 import random
+import struct
+import threading
 import attr
-from automat import MethodicalMachine
+from automat import MethodicalMachine, NoTransition
+from werewolf import roles
+from werewolf.instrumentation import clock
 
+try:
+    from types import MappingProxyType
+except ImportError:
+    # Python 2 has no public mapping proxy, so fall back to copies.
+    MappingProxyType = dict
 
-@attr.attrs
-class PhaseInfo(object):
-    tag = attr.attrib()
-    phase = attr.attrib()
-    card = attr.attrib()
-    name = attr.attrib()
-    desc = attr.attrib()
 
+class InvalidSnapshot(Exception):
+    """
+    Data passed to `WerewolfGame.restore()` is not a valid snapshot.
+    """
 
-@attr.attrs
+
+@attr.attrs(frozen=True)
 class PostGameInfo(object):
+    """
+    The results of a game.  Games with read-only views share one instance
+    per game, so it is frozen, and its mappings are read-only.
+    """
     winner = attr.attrib()
     player_cards = attr.attrib()
     orig_player_cards = attr.attrib()
@@ -24,29 +35,56 @@ class PostGameInfo(object):
     orig_table_cards = attr.attrib()
 
 
-class WerewolfGame(object):
+def tally_votes(players, votes, hunter=None):
+    """
+    Determine which players are eliminated.  `votes` maps each player in
+    `players` to the player they voted for.  `hunter` is the player holding
+    the hunter card, if any.
+
+    Returns a list of the eliminated players.
+    """
+    counts = collections.Counter()
+    for player in players:
+        counts[votes[player]] += 1
+    most_votes = []
+    top_score = 0
+    for player, count in counts.most_common():
+        if count == 1:
+            break
+        if count < top_score:
+            break
+        top_score = count
+        most_votes.append(player)
+    if hunter in most_votes:
+        most_votes.append(votes[hunter])
+        most_votes = list(set(most_votes))
+        most_votes.sort()
+    return most_votes
 
-    CARD_WEREWOLF = 0
-    CARD_SEER = 1
-    CARD_ROBBER = 2
-    CARD_TROUBLEMAKER = 3
-    CARD_VILLAGER = 4
-    CARD_MINION = 5
-    CARD_INSOMNIAC = 6
-    CARD_HUNTER = 7
-    CARD_TANNER = 8
-
-    _card_names = {
-        CARD_WEREWOLF: "werewolf",
-        CARD_SEER: "seer",
-        CARD_ROBBER: "robber",
-        CARD_TROUBLEMAKER: "troublemaker",
-        CARD_VILLAGER: "villager",
-        CARD_MINION: "minion",
-        CARD_INSOMNIAC: "insomniac",
-        CARD_HUNTER: "hunter",
-        CARD_TANNER: "tanner",
-    }
+
+class WerewolfGame(object):
+    """
+    A game of Werewolves, played by sending it inputs.
+
+    A game is not thread safe: its state machine updates the game on every
+    input, so one game must only be used by one thread at a time.  Separate
+    games may be played on separate threads at once; the state shared by
+    all games is built with the class, or once under a lock for traced
+    games, and only read afterwards.
+    `werewolf.tables.TableManager` locks each table's game for its inputs.
+    """
+
+    CARD_WEREWOLF = roles.WEREWOLF.card
+    CARD_SEER = roles.SEER.card
+    CARD_ROBBER = roles.ROBBER.card
+    CARD_TROUBLEMAKER = roles.TROUBLEMAKER.card
+    CARD_VILLAGER = roles.VILLAGER.card
+    CARD_MINION = roles.MINION.card
+    CARD_INSOMNIAC = roles.INSOMNIAC.card
+    CARD_HUNTER = roles.HUNTER.card
+    CARD_TANNER = roles.TANNER.card
+
+    _card_names = dict((r.card, r.tag) for r in roles.registry.roles())
 
     @classmethod
     def get_card_name(klass, card):
@@ -58,6 +96,22 @@ class WerewolfGame(object):
     WINNER_TANNER = 3
     WINNER_TANNER_AND_VILLAGE = 4
 
+    def __init__(self, rng=None, read_only_views=False):
+        """
+        `rng` is the random number generator used to shuffle the deck.  It
+        may be any object with a `shuffle()` method, such as a
+        `random.Random` instance.  Defaults to the `random` module.
+
+        If `read_only_views` is True, card queries and post-game results
+        return read-only mappings and tuples that share the game's state
+        instead of copying it on every call.
+        """
+        if rng is None:
+            rng = random
+        self._rng = rng
+        self._read_only_views = read_only_views
+        self._post_game_info = None
+
     # ====================
     # Finite state machine
     # ====================
@@ -67,156 +121,60 @@ class WerewolfGame(object):
     # Machine states
     # --------------
 
-    @_machine.state()
+    @_machine.state(serialized="have_players")
     def have_players(self):
         """
         The game has players configured.
         """
 
-    @_machine.state(initial=True)
+    @_machine.state(initial=True, serialized="dont_have_players")
     def dont_have_players(self):
         """
         The game doesn't have any players set.
         """
 
-    @_machine.state()
+    @_machine.state(serialized="cards_dealt")
     def cards_dealt(self):
         """
         Cards have been dealt to players and the table.
         """
 
-    @_machine.state()
-    def werewolf_phase(self):
-        """
-        Werewolves wake up and look for each other.
-        """
-
-    @_machine.state()
-    def minion_phase(self):
-        """
-        The minion wakes up and sees the werewolves, but the werewolves
-        don't know who the minion is.
-        """
-
-    @_machine.state()
-    def seer_phase(self):
-        """
-        The seer may look at one player's card or 2 cards from the table.
-        """
+    # A `XXX_phase` state for each night role, and a `XXX_power_activated`
+    # state for each night role with a power.
+    for role in roles.registry.night_roles():
 
-    @_machine.state()
-    def seer_power_activated(self):
-        """
-        The seer's power has been activated.
-        """
+        def make_state(doc):
 
-    @_machine.state()
-    def robber_phase(self):
-        """
-        The robber *may* exchange his card with another player's card.
-        The robber does *not* perform the night actions of his new card.
-        """
-
-    @_machine.state()
-    def robber_power_activated(self):
-        """
-        The robber's power has been activated.
-        """
-
-    @_machine.state()
-    def troublemaker_phase(self):
-        """
-        The troublemaker *may* exchange the cards of 2 players without looking
-        at them.
-        """
+            def state(self):
+                pass
 
-    @_machine.state()
-    def troublemaker_power_activated(self):
-        """
-        The troublemaker's power has been activated.
-        """
+            state.__doc__ = doc
+            return state
 
-    @_machine.state()
-    def insomniac_phase(self):
-        """
-        The insomniac wakes up after everyone else to see if her card has
-        been changed.
-        """
+        state = make_state(role.desc)
+        state_name = '{}_phase'.format(role.tag)
+        state.__name__ = state_name
+        vars()[state_name] = _machine.state(serialized=state_name)(state)
+        if role.has_power:
+            state = make_state(
+                "The {}'s power has been activated.".format(role.tag))
+            state_name = '{}_power_activated'.format(role.tag)
+            state.__name__ = state_name
+            vars()[state_name] = _machine.state(serialized=state_name)(state)
+    del make_state
 
-    @_machine.state()
+    @_machine.state(serialized="daybreak")
     def daybreak(self):
         """
         Daybreak.
         """
 
-    @_machine.state()
+    @_machine.state(serialized="endgame")
     def endgame(self):
         """
         Votes are tallied, the results are revealed.
         """
 
-    # ----------------------------------------------
-    # Game-specific information for the night phases
-    # ----------------------------------------------
-    night_phases = [
-        PhaseInfo(
-            tag="werewolf",
-            phase=werewolf_phase,
-            card=CARD_WEREWOLF,
-            name="Werewolf Phase",
-            desc="Werewolves open their eyes and look for each other."),
-        PhaseInfo(
-            tag="minion",
-            phase=minion_phase,
-            card=CARD_MINION,
-            name="Minion Phase",
-            desc="Minion, wake up and see the werewolves."),
-        PhaseInfo(
-            tag="seer",
-            phase=seer_phase,
-            card=CARD_SEER,
-            name="Seer Phase",
-            desc="The Seer may look at one player's card or 2 cards on the table."),
-        PhaseInfo(
-            tag="robber",
-            phase=robber_phase,
-            card=CARD_ROBBER,
-            name="Robber Phase",
-            desc="The Robber may exchange his card for another player's card and look at it."),
-        PhaseInfo(
-            tag="troublemaker",
-            phase=troublemaker_phase,
-            card=CARD_TROUBLEMAKER,
-            name="Troublemaker Phase",
-            desc="The Troublemaker may exchange 2 other player's cards without looking at them."),
-        PhaseInfo(
-            tag="insomniac",
-            phase=insomniac_phase,
-            card=CARD_INSOMNIAC,
-            name="Insomniac Phase",
-            desc="The Insomniac wakes up after everyone else to see if her card changed."),
-    ]
-    power_activated_phases = [
-        PhaseInfo(
-            tag="seer_power_activated",
-            phase=seer_power_activated,
-            card=None,
-            name="Seer Phase",
-            desc=None),
-        PhaseInfo(
-            tag="robber_power_activated",
-            phase=robber_power_activated,
-            card=None,
-            name="Robber Phase",
-            desc=None),
-        PhaseInfo(
-            tag="troublemaker_power_activated",
-            phase=troublemaker_power_activated,
-            card=None,
-            name="Troublemaker Phase",
-            desc=None),
-    ]
-
     # --------------
     # Machine inputs
     # --------------
@@ -253,10 +211,26 @@ class WerewolfGame(object):
         Return a list of the table cards.
         """
 
+    # `_enter_XXX_phase` input for each night role, used by `advance_phase()`.
+    for role in roles.registry.night_roles():
+
+        def make_input():
+
+            def enter(self):
+                pass
+
+            return enter
+
+        func = make_input()
+        func_name = '_enter_{}_phase'.format(role.tag)
+        func.__name__ = func_name
+        vars()[func_name] = _machine.input()(func)
+    del make_input
+
     @_machine.input()
-    def advance_phase(self):
+    def _enter_daybreak(self):
         """
-        Advance to the next phase.
+        Night is over.
         """
 
     @_machine.input()
@@ -265,6 +239,13 @@ class WerewolfGame(object):
         Return the name of the current phase.
         """
 
+    @_machine.input()
+    def query_active_role(self):
+        """
+        Return the `Role` that is awake during the current night phase, or
+        None at daybreak.
+        """
+
     @_machine.input()
     def is_role_active(self):
         """
@@ -352,38 +333,36 @@ class WerewolfGame(object):
         Deal a card to each player and 3 to the table.
         """
         players = self._players
-        player_count = len(players)
-        total_cards = player_count + 3
-        deck = []
-        deck.extend([self.CARD_WEREWOLF] * werewolf_count)
-        deck.extend(roles)
-        additional_cards = total_cards - len(deck)
-        if additional_cards > 0:
-            deck.extend([self.CARD_VILLAGER] * additional_cards)
-        deck = deck[:total_cards]
-        random.shuffle(deck)
+        deck = self.build_deck(len(players), werewolf_count, roles)
+        self._rng.shuffle(deck)
         player_cards = {}
         for player, card in zip(players, deck):
             player_cards[player] = card
         self._player_cards = player_cards
-        self._table_cards = deck[-3:]
+        self._table_cards = tuple(deck[-3:])
         self._new_player_cards = dict(player_cards)
         self._new_table_cards = list(self._table_cards)
         self._active_roles = frozenset(deck)
+        self._phase_inputs = self._compile_phase_plan(self._active_roles)
+        self._phase_index = -1
 
     @_machine.output()
     def _query_cards(self):
-        cards = self._player_cards.values()
+        cards = list(self._player_cards.values())
         cards.extend(self._table_cards)
-        random.shuffle(cards)
+        self._rng.shuffle(cards)
         return cards 
 
     @_machine.output()
     def _query_player_cards(self):
+        if self._read_only_views:
+            return MappingProxyType(self._player_cards)
         return dict(self._player_cards)
 
     @_machine.output()
     def _query_table_cards(self):
+        if self._read_only_views:
+            return self._table_cards
         return list(self._table_cards)
 
     @_machine.output()
@@ -429,6 +408,8 @@ class WerewolfGame(object):
             if card == self.CARD_ROBBER:
                 robber_player = p
                 break
+        if robber_player is None:
+            raise Exception("No player was dealt the robber role!")
         player_cards = self._new_player_cards
         stolen_card = player_cards[player]
         player_cards[player] = self.CARD_ROBBER
@@ -480,6 +461,8 @@ class WerewolfGame(object):
 
     @_machine.output()
     def _query_post_game_results(self):
+        if self._post_game_info is not None:
+            return self._post_game_info
         eliminated = set(self._eliminated_cards)
         player_cards = self._new_player_cards.values()
         werewolf_player = self.CARD_WEREWOLF in player_cards
@@ -505,6 +488,17 @@ class WerewolfGame(object):
             winner = self.WINNER_WEREWOLVES
         else:
             winner = self.WINNER_NO_ONE
+        if self._read_only_views:
+            # The cards can't change after the game ends, so the results
+            # are built once and shared.
+            pgi = PostGameInfo(
+                winner=winner,
+                player_cards=MappingProxyType(self._new_player_cards),
+                orig_player_cards=MappingProxyType(self._player_cards),
+                table_cards=tuple(self._new_table_cards),
+                orig_table_cards=self._table_cards)
+            self._post_game_info = pgi
+            return pgi
         pgi = PostGameInfo(
             winner=winner,
             player_cards=dict(self._new_player_cards),
@@ -514,7 +508,7 @@ class WerewolfGame(object):
         return pgi
 
     # `_set_XXX_phase` output for each night phase.
-    for info in night_phases:
+    for role in roles.registry.night_roles():
       
         def make_func(card): 
 
@@ -523,161 +517,488 @@ class WerewolfGame(object):
 
             return func 
 
-        func = make_func(info.card)
-        func_name = '_set_{}_phase'.format(info.tag)
+        func = make_func(role.card)
+        func_name = '_set_{}_phase'.format(role.tag)
         func.__name__ = func_name
         func = _machine.output()(func)
         vars()[func_name] = func
+    del make_func
         
     # -----------
     # Transitions
     # -----------
 
-    dont_have_players.upon(add_players, enter=have_players, outputs=[_set_players]) 
-    have_players.upon(deal_cards, enter=cards_dealt, outputs=[_map_cards])
-    cards_dealt.upon(
-        query_player_cards, 
-        enter=cards_dealt, 
+    # The transitions are noted as they are declared, to tell which inputs
+    # each state accepts.
+    _transitions = []
+
+    def upon(state, input, enter, outputs, collector=list, transitions=_transitions):
+        state.upon(input, enter=enter, outputs=outputs, collector=collector)
+        transitions.append((state, input))
+
+    upon(dont_have_players, add_players, enter=have_players, outputs=[_set_players])
+    upon(have_players, deal_cards, enter=cards_dealt, outputs=[_map_cards])
+    upon(
+        cards_dealt,
+        query_player_cards,
+        enter=cards_dealt,
         outputs=[_query_player_cards],
         collector=lambda x: x[-1])
-    cards_dealt.upon(
-        query_table_cards, 
-        enter=cards_dealt, 
+    upon(
+        cards_dealt,
+        query_table_cards,
+        enter=cards_dealt,
         outputs=[_query_table_cards],
         collector=lambda x: x[-1])
-    cards_dealt.upon(
-        query_cards, 
-        enter=cards_dealt, 
+    upon(
+        cards_dealt,
+        query_cards,
+        enter=cards_dealt,
         outputs=[_query_cards],
         collector=lambda x: x[-1])
-    cards_dealt.upon(
-        advance_phase,
-        enter=werewolf_phase,
-        outputs=[_set_werewolf_phase])
-    werewolf_phase.upon(
-        advance_phase,
-        enter=minion_phase,
-        outputs=[_set_minion_phase])
-    minion_phase.upon(
-        advance_phase,
-        enter=seer_phase,
-        outputs=[_set_seer_phase])
-    seer_phase.upon(
-        advance_phase,
-        enter=robber_phase,
-        outputs=[_set_robber_phase])
-    seer_power_activated.upon(
-        advance_phase,
-        enter=robber_phase,
-        outputs=[_set_robber_phase])
-    robber_phase.upon(
-        advance_phase,
-        enter=troublemaker_phase,
-        outputs=[_set_troublemaker_phase])
-    robber_power_activated.upon(
-        advance_phase,
-        enter=troublemaker_phase,
-        outputs=[_set_troublemaker_phase])
-    troublemaker_phase.upon(
-        advance_phase,
-        enter=insomniac_phase,
-        outputs=[_set_insomniac_phase])
-    troublemaker_power_activated.upon(
-        advance_phase,
-        enter=insomniac_phase,
-        outputs=[_set_insomniac_phase])
-    insomniac_phase.upon(
-        advance_phase,
-        enter=daybreak,
-        outputs=[])
-    werewolf_phase.upon(
-        identify_werewolves,
-        enter=werewolf_phase,
-        outputs=[_identify_werewolves],
-        collector=lambda x: x[-1])
-    minion_phase.upon(
-        identify_werewolves,
-        enter=minion_phase,
-        outputs=[_identify_werewolves],
-        collector=lambda x: x[-1])
-    seer_phase.upon(
-        seer_view_player_card,
-        enter=seer_power_activated,
-        outputs=[_seer_view_player_card],
-        collector=lambda x: x[-1])
-    seer_phase.upon(
-        seer_view_table_cards,
-        enter=seer_power_activated,
-        outputs=[_seer_view_table_cards],
-        collector=lambda x: x[-1])
-    robber_phase.upon(
-        robber_steal_card,
-        enter=robber_power_activated,
-        outputs=[_robber_steal_card],
-        collector=lambda x: x[-1])
-    troublemaker_phase.upon(
-        troublemaker_switch_cards,
-        enter=troublemaker_power_activated,
-        outputs=[_troublemaker_switch_cards])
-    insomniac_phase.upon(
-        insomniac_view_card,
-        enter=insomniac_phase,
-        outputs=[_insomniac_view_card],
-        collector=lambda x: x[-1])
-    daybreak.upon(
+    upon(
+        daybreak,
         query_hunter,
         enter=daybreak,
         outputs=[_query_hunter],
         collector=lambda x: x[-1])
-    daybreak.upon(
+    upon(
+        daybreak,
         eliminate_players,
         enter=endgame,
         outputs=[_eliminate_players])
-    endgame.upon(
+    upon(
+        endgame,
         query_post_game_results,
         enter=endgame,
         outputs=[_query_post_game_results],
         collector=lambda x: x[-1])
-    # Transitions for `query_phase` input for each game phase.
-    for info in night_phases:
-
-        def make_collector(info):
-        
-            def collector(x):
-                return info.name
-
-            return collector
-
-        phase = info.phase
-        phase.upon(
-            query_phase,
-            enter=phase,
-            outputs=[_query_phase],
-            collector=make_collector(info))
-    del make_collector
-    daybreak.upon(
+    upon(
+        daybreak,
         query_phase,
         enter=daybreak,
         outputs=[_query_phase],
         collector=lambda x: "Daybreak")
-    # Transitions for `is_role_active` for each night phase.
-    for info in night_phases:
-        phase = info.phase
-        phase.upon(
+    upon(
+        daybreak,
+        query_active_role,
+        enter=daybreak,
+        outputs=[_query_phase],
+        collector=lambda x: None)
+
+    def make_collector(value):
+
+        def collector(x):
+            return value
+
+        return collector
+
+    # Transitions for each night role.  A night phase may be entered from
+    # any earlier night state, so phases whose roles are not in the deck can
+    # be skipped entirely.
+    earlier_states = [cards_dealt]
+    for role in roles.registry.night_roles():
+        phase = vars()['{}_phase'.format(role.tag)]
+        enter_phase = vars()['_enter_{}_phase'.format(role.tag)]
+        set_phase = vars()['_set_{}_phase'.format(role.tag)]
+        for state in earlier_states:
+            upon(
+                state,
+                enter_phase,
+                enter=phase,
+                outputs=[set_phase])
+        role_states = [phase]
+        power_activated = None
+        if role.has_power:
+            power_activated = vars()['{}_power_activated'.format(role.tag)]
+            role_states.append(power_activated)
+        for action in role.actions:
+            if action.uses_power:
+                enter = power_activated
+            else:
+                enter = phase
+            upon(
+                phase,
+                vars()[action.input],
+                enter=enter,
+                outputs=[vars()['_{}'.format(action.input)]],
+                collector=lambda x: x[-1])
+        upon(
+            phase,
+            query_phase,
+            enter=phase,
+            outputs=[_query_phase],
+            collector=make_collector(role.phase_name))
+        upon(
+            phase,
+            query_active_role,
+            enter=phase,
+            outputs=[_query_phase],
+            collector=make_collector(role))
+        upon(
+            phase,
             is_role_active,
             enter=phase,
             outputs=[_is_role_active],
             collector=lambda x: x[-1])
-    # Transitions for `is_player_active` input for each night phase, and
-    # power-activated phases.
-    for info in itertools.chain(night_phases, power_activated_phases):
-        phase = info.phase
-        phase.upon(
-            is_player_active,
-            enter=phase,
-            outputs=[_is_player_active],
-            collector=lambda x: x[-1])
+        for state in role_states:
+            upon(
+                state,
+                is_player_active,
+                enter=state,
+                outputs=[_is_player_active],
+                collector=lambda x: x[-1])
+        earlier_states.extend(role_states)
+    for state in earlier_states:
+        upon(
+            state,
+            _enter_daybreak,
+            enter=daybreak,
+            outputs=[])
 
     # Remove extra class info.
-    del night_phases
- 
+    del upon, make_collector, earlier_states, role_states, power_activated
+    del role, phase, enter_phase, set_phase, action, enter, state
+    del func, func_name, state_name
+
+    # ---------------
+    # Phase sequencing
+    # ---------------
+
+    _phase_inputs = ()
+    _phase_index = -1
+
+    @classmethod
+    def build_deck(klass, player_count, werewolf_count, roles):
+        """
+        Return the unshuffled deck for a game: the werewolves, the `roles`
+        and enough villagers to deal a card to each player and 3 to the
+        table.
+        """
+        total_cards = player_count + 3
+        deck = []
+        deck.extend([klass.CARD_WEREWOLF] * werewolf_count)
+        deck.extend(roles)
+        additional_cards = total_cards - len(deck)
+        if additional_cards > 0:
+            deck.extend([klass.CARD_VILLAGER] * additional_cards)
+        return deck[:total_cards]
+
+    @classmethod
+    def _compile_phase_plan(klass, deck):
+        """
+        Return a tuple of the names of the inputs that enter each phase of the
+        night for a game dealt from `deck`, ending with daybreak.
+        """
+        plan = roles.registry.compile_phase_plan(deck)
+        inputs = ['_enter_{}_phase'.format(role.tag) for role in plan]
+        inputs.append('_enter_daybreak')
+        return tuple(inputs)
+
+    def advance_phase(self):
+        """
+        Advance to the next phase.  Raises `NoTransition`, as the machine's
+        inputs do, before the cards are dealt and after daybreak.
+        """
+        index = self._phase_index + 1
+        inputs = self._phase_inputs
+        if index >= len(inputs):
+            raise NoTransition(self._query_state(), "advance_phase")
+        getattr(self, inputs[index])()
+        self._phase_index = index
+
+    # ----------------
+    # Input validation
+    # ----------------
+
+    # Names of the inputs each state accepts, keyed by serialized state.
+    _allowed_inputs = {}
+    # States and inputs are named by their attributes, and each state is
+    # serialized as its name.
+    _names = dict((id(value), name) for name, value in list(vars().items()))
+    for state, input in _transitions:
+        input_name = _names[id(input)]
+        if input_name == '_enter_daybreak':
+            input_name = 'advance_phase'
+        elif input_name.startswith('_'):
+            continue
+        _allowed_inputs.setdefault(_names[id(state)], set()).add(input_name)
+    for state in _allowed_inputs:
+        _allowed_inputs[state] = frozenset(_allowed_inputs[state])
+    del _names, _transitions, state, input, input_name
+
+    @_machine.serializer()
+    def _query_state(self, state):
+        """
+        Return the serialized current state.
+        """
+        return state
+
+    def allowed_inputs(self):
+        """
+        Return a frozenset of the names of the inputs the game accepts in
+        its current state.  Calling any other input raises `NoTransition`.
+        """
+        return self._allowed_inputs.get(self._query_state(), frozenset())
+
+    def can(self, input_name):
+        """
+        Return True if the game accepts the input named `input_name` in its
+        current state.
+        """
+        return input_name in self.allowed_inputs()
+
+    @staticmethod
+    def input_names():
+        """
+        Return a sorted tuple of the names of all the game's inputs.
+        """
+        names = set()
+        for state_inputs in WerewolfGame._allowed_inputs.values():
+            names.update(state_inputs)
+        return tuple(sorted(names))
+
+    # ---------
+    # Snapshots
+    # ---------
+
+    # A snapshot starts with a version byte and flags saying which parts
+    # follow.  Cards are single bytes; players are tagged integers or
+    # UTF-8 strings.
+    _SNAPSHOT_VERSION = 2
+    _SNAPSHOT_READ_ONLY_VIEWS = 0x01
+    _SNAPSHOT_PLAYERS = 0x02
+    _SNAPSHOT_CARDS = 0x04
+    _SNAPSHOT_ACTIVE_CARD = 0x08
+    _SNAPSHOT_ELIMINATED = 0x10
+    _snapshot_header = struct.Struct("<BBB")
+    _snapshot_count = struct.Struct("<H")
+    _snapshot_int = struct.Struct("<q")
+
+    @_machine.unserializer()
+    def _restore_state(self, state):
+        """
+        Put the machine in the serialized state `state`.
+        """
+        return state
+
+    def snapshot(self):
+        """
+        Return a compact binary snapshot of the game in its current state.
+        The random number generator is not included.
+        """
+        state = self._query_state().encode("utf-8")
+        players = getattr(self, '_players', None)
+        flags = 0
+        if self._read_only_views:
+            flags |= self._SNAPSHOT_READ_ONLY_VIEWS
+        parts = []
+        if players is not None:
+            flags |= self._SNAPSHOT_PLAYERS
+            parts.append(self._snapshot_count.pack(len(players)))
+            for player in players:
+                if isinstance(player, bool) or not isinstance(player, (int, str)):
+                    raise TypeError(
+                        "Cannot snapshot player {!r}; players must be integers "
+                        "or strings.".format(player))
+                if isinstance(player, int):
+                    parts.append(b"i" + self._snapshot_int.pack(player))
+                else:
+                    name = player.encode("utf-8")
+                    parts.append(b"s" + self._snapshot_count.pack(len(name)) + name)
+        if hasattr(self, '_player_cards'):
+            flags |= self._SNAPSHOT_CARDS
+            parts.append(bytes(bytearray(self._player_cards[p] for p in players)))
+            parts.append(bytes(bytearray(self._new_player_cards[p] for p in players)))
+            for cards in (self._table_cards, self._new_table_cards):
+                parts.append(self._pack_cards(cards))
+            # The phase index is -1 until the first phase.
+            parts.append(self._snapshot_count.pack(self._phase_index + 1))
+            active_card = getattr(self, '_active_card', None)
+            if active_card is not None:
+                flags |= self._SNAPSHOT_ACTIVE_CARD
+                parts.append(bytes(bytearray([active_card])))
+            eliminated_cards = getattr(self, '_eliminated_cards', None)
+            if eliminated_cards is not None:
+                flags |= self._SNAPSHOT_ELIMINATED
+                parts.append(self._pack_cards(eliminated_cards))
+        header = self._snapshot_header.pack(self._SNAPSHOT_VERSION, flags, len(state))
+        return header + state + b"".join(parts)
+
+    @classmethod
+    def _pack_cards(klass, cards):
+        return bytes(bytearray([len(cards)])) + bytes(bytearray(cards))
+
+    @classmethod
+    def restore(klass, data, rng=None):
+        """
+        Create a game from a snapshot made by `snapshot()`.  Raises
+        `InvalidSnapshot` if `data` is not a valid snapshot.
+        """
+        try:
+            return klass._restore(data, rng)
+        except struct.error:
+            raise InvalidSnapshot("The snapshot is truncated.")
+        except UnicodeDecodeError:
+            raise InvalidSnapshot("The snapshot has an invalid name.")
+
+    @classmethod
+    def _restore(klass, data, rng):
+        data = bytes(data)
+        version, flags, size = klass._snapshot_header.unpack_from(data, 0)
+        if version != klass._SNAPSHOT_VERSION:
+            raise InvalidSnapshot("Unknown snapshot version {}.".format(version))
+        offset = klass._snapshot_header.size
+        state = klass._snapshot_bytes(data, offset, size).decode("utf-8")
+        offset += size
+        if state not in klass._allowed_inputs:
+            raise InvalidSnapshot("Unknown state '{}'.".format(state))
+        dealt = state not in ("dont_have_players", "have_players")
+        if (bool(flags & klass._SNAPSHOT_PLAYERS) != (state != "dont_have_players")
+                or bool(flags & klass._SNAPSHOT_CARDS) != dealt
+                or bool(flags & klass._SNAPSHOT_ELIMINATED) != (state == "endgame")):
+            raise InvalidSnapshot("The snapshot does not match its state '{}'.".format(state))
+        game = klass(rng, read_only_views=bool(flags & klass._SNAPSHOT_READ_ONLY_VIEWS))
+        players = None
+        if flags & klass._SNAPSHOT_PLAYERS:
+            count, = klass._snapshot_count.unpack_from(data, offset)
+            offset += klass._snapshot_count.size
+            players = []
+            for n in range(count):
+                tag = data[offset:offset + 1]
+                offset += 1
+                if tag == b"i":
+                    player, = klass._snapshot_int.unpack_from(data, offset)
+                    offset += klass._snapshot_int.size
+                elif tag == b"s":
+                    size, = klass._snapshot_count.unpack_from(data, offset)
+                    offset += klass._snapshot_count.size
+                    player = klass._snapshot_bytes(data, offset, size).decode("utf-8")
+                    offset += size
+                else:
+                    raise InvalidSnapshot("Unknown player tag {!r}.".format(tag))
+                players.append(player)
+            if len(set(players)) != len(players):
+                raise InvalidSnapshot("The snapshot has duplicate players.")
+            game._players = players
+        if flags & klass._SNAPSHOT_CARDS:
+            player_cards = klass._snapshot_cards(data, offset, len(players))
+            offset += len(players)
+            new_player_cards = klass._snapshot_cards(data, offset, len(players))
+            offset += len(players)
+            table_cards, offset = klass._unpack_cards(data, offset)
+            new_table_cards, offset = klass._unpack_cards(data, offset)
+            if sorted(player_cards + table_cards) != sorted(new_player_cards + new_table_cards):
+                raise InvalidSnapshot("The cards in the snapshot do not match its deal.")
+            phase, = klass._snapshot_count.unpack_from(data, offset)
+            offset += klass._snapshot_count.size
+            game._player_cards = dict(zip(players, player_cards))
+            game._table_cards = tuple(table_cards)
+            game._new_player_cards = dict(zip(players, new_player_cards))
+            game._new_table_cards = new_table_cards
+            active_roles = frozenset(player_cards)
+            game._active_roles = active_roles.union(table_cards)
+            game._phase_inputs = klass._compile_phase_plan(game._active_roles)
+            if phase > len(game._phase_inputs):
+                raise InvalidSnapshot("Phase {} is past the end of the night.".format(phase))
+            game._phase_index = phase - 1
+            if flags & klass._SNAPSHOT_ACTIVE_CARD:
+                game._active_card, = klass._snapshot_cards(data, offset, 1)
+                offset += 1
+            if flags & klass._SNAPSHOT_ELIMINATED:
+                game._eliminated_cards, offset = klass._unpack_cards(data, offset)
+        elif flags & klass._SNAPSHOT_ACTIVE_CARD:
+            raise InvalidSnapshot("The snapshot has a night phase but no cards.")
+        if offset != len(data):
+            raise InvalidSnapshot("The snapshot has {} extra bytes.".format(len(data) - offset))
+        game._restore_state(state)
+        return game
+
+    @staticmethod
+    def _snapshot_bytes(data, offset, size):
+        if offset + size > len(data):
+            raise struct.error("truncated")
+        return data[offset:offset + size]
+
+    @classmethod
+    def _snapshot_cards(klass, data, offset, count):
+        cards = list(bytearray(klass._snapshot_bytes(data, offset, count)))
+        for card in cards:
+            if card not in klass._card_names:
+                raise InvalidSnapshot("Unknown card {}.".format(card))
+        return cards
+
+    @classmethod
+    def _unpack_cards(klass, data, offset):
+        count = bytearray(klass._snapshot_bytes(data, offset, 1))[0]
+        offset += 1
+        return klass._snapshot_cards(data, offset, count), offset + count
+
+    # -------
+    # Tracing
+    # -------
+
+    # Traced subclasses, keyed by the class they trace.
+    _traced_classes = {}
+    _traced_lock = threading.Lock()
+    _transition_hook = None
+
+    def set_transition_hook(self, hook):
+        """
+        Call `hook(state, input, next_state, duration)` after every input
+        the game accepts, with the serialized states before and after the
+        input and the time the input took in seconds.  Pass None to remove
+        the hook.
+
+        Tracing swaps the game's class for a subclass whose inputs are
+        wrapped, so games without a hook pay nothing for it.
+        """
+        klass = type(self)
+        base = getattr(klass, '_traced_base', klass)
+        if hook is None:
+            self.__class__ = base
+            self.__dict__.pop('_transition_hook', None)
+            return
+        self._transition_hook = hook
+        self.__class__ = base._make_traced_class()
+
+    @classmethod
+    def _make_traced_class(klass):
+        traced_class = WerewolfGame._traced_classes.get(klass)
+        if traced_class is not None:
+            return traced_class
+        with WerewolfGame._traced_lock:
+            traced_class = WerewolfGame._traced_classes.get(klass)
+            if traced_class is not None:
+                return traced_class
+            attrs = {'_traced_base': klass}
+            input_names = set()
+            for names in klass._allowed_inputs.values():
+                input_names.update(names)
+            for name in input_names:
+                for cls in klass.__mro__:
+                    if name in cls.__dict__:
+                        attrs[name] = _make_traced_input(name, cls.__dict__[name], klass)
+                        break
+            traced_class = type('Traced{}'.format(klass.__name__), (klass,), attrs)
+            WerewolfGame._traced_classes[klass] = traced_class
+        return traced_class
+
+
+def _make_traced_input(name, descriptor, owner):
+    """
+    Wrap the input `descriptor` so it reports each transition to the game's
+    transition hook.
+    """
+
+    def traced(self, *args, **kwargs):
+        state = self._query_state()
+        start = clock()
+        result = descriptor.__get__(self, owner)(*args, **kwargs)
+        duration = clock() - start
+        self._transition_hook(state, name, self._query_state(), duration)
+        return result
+
+    traced.__name__ = name
+    traced.__doc__ = descriptor.__doc__
+    return traced